@@ -1,31 +1,48 @@
-from flask import Flask
-from flask_socketio import SocketIO
+from flask import Flask, request
+from flask_socketio import SocketIO, join_room, leave_room
 from flask_cors import CORS
 from app.controller.arduino_controler import *
 from app.controller.GHI_AI_model import ghi_fun
+from app.controller.telemetry import (
+    ALL_CHANNEL, DeltaBroadcaster, FrameAggregator, SubscriptionRegistry, house_channel, room_channel
+)
+from app.controller import telemetry_store
+from app.controller.frame_parser import FrameError, FrameParser
 import os
 import threading
 from typing import Dict, Type
 from datetime import datetime
-import json
 
 
 
 arduino_thread = None
 thread_lock = threading.Lock()
 socketio = SocketIO()
+broadcaster = DeltaBroadcaster(socketio.emit)
+subscriptions = SubscriptionRegistry()
+aggregator = FrameAggregator()
+frame_parser = FrameParser()
 
 
 def background_thread():
-    """Background thread that reads data from Arduino."""
+    """Background thread that broadcasts the data read from the Arduino."""
+    consumer = ArduinoController.subscribe()
     while True:
-        data= ArduinoController.read_from_arduino()
-        if isinstance(data, str):
-            data_dict = json.loads(data)
-        else:
-            data_dict = data.copy()
-        data_dict['timestamp'] = datetime.now().isoformat()
-        socketio.emit('arduino_data', {'data': data_dict})
+        wait = aggregator.next_flush_in()
+        line = consumer.get(timeout=1.0 if wait is None else wait)
+        if line is not None:
+            try:
+                data_dict = frame_parser.parse(line)
+            except FrameError as e:
+                print(f"Invalid data from Arduino: {e}")
+                data_dict = None
+            if data_dict is not None:
+                data_dict['timestamp'] = datetime.now().isoformat()
+                frame = aggregator.add(data_dict)
+                if frame is not None:
+                    broadcaster.publish_frame(frame, subscriptions)
+        for frame in aggregator.flush_due():
+            broadcaster.publish_frame(frame, subscriptions)
         
 
 class Config:
@@ -37,6 +54,29 @@ class Config:
         'FIREBASE_CREDENTIALS_PATH',
         './firebase-credentials.json'
     )
+    # Load the GHI model and dataset when the app starts instead of on the first forecast
+    GHI_PRELOAD = os.getenv('GHI_PRELOAD', 'false').lower() == 'true'
+    # Arduino connection: 'serial', 'tcp' or 'simulator'
+    ARDUINO_TRANSPORT = os.getenv('ARDUINO_TRANSPORT', 'serial')
+    ARDUINO_PORT = os.getenv('ARDUINO_PORT', 'COM5')
+    ARDUINO_BAUDRATE = int(os.getenv('ARDUINO_BAUDRATE', '9600'))
+    ARDUINO_TCP_HOST = os.getenv('ARDUINO_TCP_HOST', 'localhost')
+    ARDUINO_TCP_PORT = int(os.getenv('ARDUINO_TCP_PORT', '5001'))
+    # Simulator: frames file (defaults to arduino_data_example.json) and frames per second
+    ARDUINO_SIM_FILE = os.getenv('ARDUINO_SIM_FILE')
+    ARDUINO_SIM_RATE = float(os.getenv('ARDUINO_SIM_RATE', '1'))
+    # Make the simulator send the compact binary line format instead of JSON
+    ARDUINO_SIM_BINARY = os.getenv('ARDUINO_SIM_BINARY', 'false').lower() in ('1', 'true', 'yes', 'on')
+    # Seconds between full `arduino_data` frames; patches are sent in between
+    TELEMETRY_KEYFRAME_INTERVAL = float(os.getenv('TELEMETRY_KEYFRAME_INTERVAL', '30'))
+    # Maximum frames per second sent for each house (0 sends every frame); alarms are never delayed
+    TELEMETRY_MAX_RATE = float(os.getenv('TELEMETRY_MAX_RATE', '10'))
+    # SQLite file keeping the history of every frame (disabled when empty)
+    TELEMETRY_DB_PATH = os.getenv('TELEMETRY_DB_PATH', '')
+    TELEMETRY_RETENTION_DAYS = float(os.getenv('TELEMETRY_RETENTION_DAYS', '30'))
+    # Rows older than this are averaged into TELEMETRY_COMPACT_BUCKET-second buckets
+    TELEMETRY_COMPACT_AFTER_HOURS = float(os.getenv('TELEMETRY_COMPACT_AFTER_HOURS', '24'))
+    TELEMETRY_COMPACT_BUCKET = float(os.getenv('TELEMETRY_COMPACT_BUCKET', '60'))
 
 class DevelopmentConfig(Config):
     """Development configuration."""
@@ -47,6 +87,7 @@ class TestingConfig(Config):
     DEBUG = True
     TESTING = True
     FIREBASE_CREDENTIALS_PATH = './tests/firebase-credentials-test.json'
+    ARDUINO_TRANSPORT = 'simulator'
 
 class ProductionConfig(Config):
     """Production configuration."""
@@ -70,6 +111,16 @@ def create_app(config_class=Config):
     # Initialize extensions
     CORS(app)
     socketio.init_app(app, cors_allowed_origins="*")
+    ArduinoController.init_app(app)
+    broadcaster.keyframe_interval = app.config['TELEMETRY_KEYFRAME_INTERVAL']
+    aggregator.max_rate = app.config['TELEMETRY_MAX_RATE']
+    telemetry_store.init_app(app)
+
+    if app.config.get('GHI_PRELOAD'):
+        try:
+            ghi_fun.forecaster.load()
+        except Exception as e:
+            app.logger.error(f"Failed to preload GHI model: {str(e)}")
     
     # Register blueprints
     from .api.routes import bp as api_bp
@@ -84,7 +135,57 @@ def create_app(config_class=Config):
                 arduino_thread = threading.Thread(target=background_thread)
                 arduino_thread.daemon = True
                 arduino_thread.start()
+        _join(ALL_CHANNEL)
         print('Client connected')
+
+    def _join(channel):
+        join_room(channel)
+        subscriptions.add(request.sid, channel)
+        broadcaster.send_snapshot(request.sid, channel)
+
+    def _leave(channel):
+        leave_room(channel)
+        if subscriptions.remove(request.sid, channel):
+            broadcaster.forget(channel)
+
+    def _requested_channels(data):
+        house_id = data.get('house_id')
+        if not house_id:
+            return None
+        return [house_channel(house_id)] + [room_channel(house_id, room) for room in data.get('rooms', [])]
+
+    @socketio.on('subscribe')
+    def subscribe(data):
+        """Receive only the house-level data and the given rooms of a house."""
+        channels = _requested_channels(data or {})
+        if channels is None:
+            return {"status": "error", "message": "No house_id provided."}
+        _leave(ALL_CHANNEL)
+        for channel in channels:
+            _join(channel)
+        return {"status": "success", "channels": sorted(subscriptions.channels_of(request.sid))}
+
+    @socketio.on('unsubscribe')
+    def unsubscribe(data):
+        channels = _requested_channels(data or {})
+        if channels is None:
+            return {"status": "error", "message": "No house_id provided."}
+        for channel in channels:
+            _leave(channel)
+        return {"status": "success", "channels": sorted(subscriptions.channels_of(request.sid))}
+
+    @socketio.on('subscribe_all')
+    def subscribe_all():
+        """Go back to receiving whole frames."""
+        for channel in subscriptions.channels_of(request.sid):
+            _leave(channel)
+        _join(ALL_CHANNEL)
+        return {"status": "success", "channels": [ALL_CHANNEL]}
+
+    @socketio.on('request_snapshot')
+    def send_snapshot():
+        for channel in subscriptions.channels_of(request.sid):
+            broadcaster.send_snapshot(request.sid, channel)
         
     @socketio.on("command")
     def send_command(data):
@@ -99,6 +200,8 @@ def create_app(config_class=Config):
     
     @socketio.on('disconnect')
     def handle_disconnect():
+        for channel in subscriptions.drop(request.sid):
+            broadcaster.forget(channel)
         print('Client disconnected')
     
     return app
\ No newline at end of file
@@ -1,5 +1,5 @@
 from flask import jsonify, request
-from ..controller import device_controller,arduino_controler
+from ..controller import device_controller,arduino_controler,telemetry_store
 from ..models import Light, Door, AC_Fan, FireDetector
 from flask import Blueprint
 
@@ -51,3 +51,31 @@ def control_ac(room_id):
         return jsonify({'error': 'Invalid action'}), 400
         
     return jsonify(result)
+
+def _time_arg(name):
+    value = request.args.get(name)
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return telemetry_store.parse_timestamp(value)
+
+@bp.route('/telemetry/<house_id>', methods=['GET'])
+def telemetry_history(house_id):
+    store = telemetry_store.get_store()
+    if store is None:
+        return jsonify({'error': 'Telemetry history is disabled'}), 404
+
+    metric = request.args.get('metric')
+    if not metric:
+        return jsonify({'metrics': [{'room': room, 'metric': name} for room, name in store.metrics(house_id)]})
+
+    room = request.args.get('room', telemetry_store.HOUSE_LEVEL)
+    start, end = _time_arg('start'), _time_arg('end')
+    bucket = request.args.get('bucket', type=float)
+    if bucket:
+        return jsonify({'samples': store.downsample(house_id, metric, bucket, room, start, end)})
+    limit = request.args.get('limit', type=int)
+    samples = store.query(house_id, metric, room, start, end, limit)
+    return jsonify({'samples': [{'ts': ts, 'value': value} for ts, value in samples]})
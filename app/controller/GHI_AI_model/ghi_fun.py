@@ -1,30 +1,44 @@
 
+import os
+import json
+import threading
 import pandas as pd
 import numpy as np
 from tensorflow.keras.models import load_model
-from numpy import split, array
+from numpy import array
 
-def process_solar_data(dataset_path):
-    """
-    Load and preprocess the solar radiation dataset
+MODEL_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_PATH = os.getenv('GHI_MODEL_PATH', os.path.join(MODEL_DIR, 'my_model.h5'))
+DATASET_PATH = os.getenv('GHI_DATASET_PATH', os.path.join(MODEL_DIR, '2019_TUN.json'))
+
+# Number of forecast days and the base look-back of the day-1 input window
+FORECAST_DAYS = 7
+WINDOW_OFFSET = 110
+
+DROPPED_COLUMNS = ["DHI", "DNI", "Clearsky DHI", "Clearsky DNI",
+                   "Clearsky GHI", "Fill Flag", "Cloud Type"]
+DATETIME_COLUMNS = ["Year", "Month", "Day", "Hour", "Minute"]
+
+# Bump when the layout of the on-disk dataset cache changes
+CACHE_VERSION = 1
+
+def prepare_solar_data(df):
     """
-    # Read the JSON file
-    df = pd.read_json(dataset_path)
+    Preprocess a raw NSRDB DataFrame into the model's feature frame
 
+    The datetime index is assembled directly from the integer
+    Year/Month/Day/Hour/Minute columns and the remaining feature columns are
+    downcast to float32.
+    """
     # Drop unnecessary columns
-    columns_to_drop = ["DHI", "DNI", "Clearsky DHI", "Clearsky DNI",
-                      "Clearsky GHI", "Fill Flag", "Cloud Type"]
-    df = df.drop(columns_to_drop, axis=1)
+    df = df.drop(DROPPED_COLUMNS, axis=1)
 
     # Create datetime index
-    datetime_cols = ["Year", "Month", "Day", "Hour", "Minute"]
-    df["date_time"] = df[datetime_cols].apply(
-        lambda row: "-".join(row.values.astype(str)), axis=1)
-    df['date_time'] = pd.to_datetime(df['date_time'], format='%Y-%m-%d-%H-%M')
+    date_time = pd.to_datetime(df[DATETIME_COLUMNS].rename(columns=str.lower))
 
     # Drop the individual date/time columns and set datetime as index
-    df = df.drop(datetime_cols, axis=1)
-    df = df.set_index('date_time')
+    df = df.drop(DATETIME_COLUMNS, axis=1).astype(np.float32)
+    df.index = pd.DatetimeIndex(date_time, name='date_time')
 
     # Ensure GHI is the last column
     ghi = df.pop('GHI')
@@ -32,6 +46,84 @@ def process_solar_data(dataset_path):
 
     return df
 
+def _cache_dir(dataset_path):
+    return dataset_path + '.cache'
+
+def _source_signature(dataset_path):
+    stat = os.stat(dataset_path)
+    return {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+
+def write_solar_cache(df, dataset_path):
+    """
+    Store a processed frame next to its source as memory-mappable .npy files
+
+    The cache directory holds `values.npy` (float32 features), `index.npy`
+    (int64 nanosecond timestamps) and `meta.json`, which records the
+    columns and the signature of the source file it was built from.
+    """
+    cache_dir = _cache_dir(dataset_path)
+    os.makedirs(cache_dir, exist_ok=True)
+    arrays = {
+        'values': np.ascontiguousarray(df.to_numpy(dtype=np.float32)),
+        'index': df.index.as_unit('ns').asi8,
+    }
+    for name, data in arrays.items():
+        tmp_path = os.path.join(cache_dir, f'{name}.tmp.npy')
+        np.save(tmp_path, data)
+        os.replace(tmp_path, os.path.join(cache_dir, f'{name}.npy'))
+
+    meta = {
+        "version": CACHE_VERSION,
+        "source": _source_signature(dataset_path),
+        "columns": list(df.columns),
+    }
+    tmp_path = os.path.join(cache_dir, 'meta.tmp.json')
+    with open(tmp_path, 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, os.path.join(cache_dir, 'meta.json'))
+
+def read_solar_cache(dataset_path):
+    """
+    Load a processed frame from the cache without copying it into memory
+
+    Returns None when there is no cache or it was built from another
+    version of the source file.
+    """
+    cache_dir = _cache_dir(dataset_path)
+    try:
+        with open(os.path.join(cache_dir, 'meta.json')) as f:
+            meta = json.load(f)
+        if meta.get("version") != CACHE_VERSION or meta.get("source") != _source_signature(dataset_path):
+            return None
+        values = np.load(os.path.join(cache_dir, 'values.npy'), mmap_mode='r')
+        index = np.load(os.path.join(cache_dir, 'index.npy'), mmap_mode='r')
+    except (OSError, ValueError):
+        return None
+
+    date_time = pd.DatetimeIndex(np.asarray(index).view('datetime64[ns]'), name='date_time')
+    return pd.DataFrame(values, index=date_time, columns=meta["columns"], copy=False)
+
+def process_solar_data(dataset_path, use_cache=True):
+    """
+    Load and preprocess the solar radiation dataset
+
+    The processed frame is served from the binary cache when it is up to
+    date; otherwise the JSON file is parsed and the cache rebuilt.
+    """
+    if use_cache:
+        df = read_solar_cache(dataset_path)
+        if df is not None:
+            return df
+
+    # Read the JSON file
+    df = prepare_solar_data(pd.read_json(dataset_path))
+    if use_cache:
+        try:
+            write_solar_cache(df, dataset_path)
+        except OSError as e:
+            print(f"Error writing solar dataset cache: {e}")
+    return df
+
 def forecast(model, history, n_input):
     """
     Make a single forecast using the given model and history
@@ -51,11 +143,58 @@ def predict_model(model, test, n_input, n_predict=1):
     history = [x for x in test]
     predictions = list()
     for i in range(n_predict):
-        yhat_sequence = forecast(model, history, n_input+110)
+        yhat_sequence = forecast(model, history, n_input+WINDOW_OFFSET)
         predictions.append(yhat_sequence)
     predictions = array(predictions)
     return predictions
 
+def build_forecast_windows(data, n_days=FORECAST_DAYS):
+    """
+    Input windows of every forecast day, day 1 first
+
+    Day i looks at the last `WINDOW_OFFSET + i` observations, exactly as
+    `predict_model` does; the windows are not padded to a common length
+    because the model has no masking and padding would change its output.
+    """
+    values = np.asarray(data, dtype=np.float32)
+    return [values[-(WINDOW_OFFSET + i):] for i in range(1, n_days + 1)]
+
+def predict_solar_radiation_batch(model, datasets, n_days=FORECAST_DAYS):
+    """
+    Make the multi-day forecast for several houses with one model call per day
+
+    The windows of the same day have the same length for every house, so
+    each day is predicted for all houses in a single `predict_on_batch`
+    call: `n_days` calls in total instead of `n_days` per house.
+
+    Parameters:
+    model: Loaded Keras model
+    datasets (list): Processed DataFrames (or 2D arrays), one per house
+    n_days (int): Number of days to forecast
+
+    Returns:
+    list: One dictionary of predictions per dataset, keyed "Day 1".."Day n"
+    """
+    windows = [build_forecast_windows(data, n_days) for data in datasets]
+    predictions = [{} for _ in datasets]
+    for day in range(n_days):
+        # houses with less history than the window get shorter windows
+        by_shape = {}
+        for house, house_windows in enumerate(windows):
+            by_shape.setdefault(house_windows[day].shape, []).append(house)
+        for houses in by_shape.values():
+            batch = np.stack([windows[house][day] for house in houses])
+            yhat = np.asarray(model.predict_on_batch(batch)).reshape(len(houses), -1)
+            for house, day_mean in zip(houses, yhat.mean(axis=1)):
+                predictions[house][f"Day {day + 1}"] = float(day_mean)
+    return predictions
+
+def _run_predictions(model, df):
+    """
+    Run the 7-day forecast on an already loaded model and processed dataset
+    """
+    return predict_solar_radiation_batch(model, [df])[0]
+
 def predict_solar_radiation(model_path, dataset_path):
     """
     Main function to load data and model, and make predictions for multiple days
@@ -74,19 +213,10 @@ def predict_solar_radiation(model_path, dataset_path):
         # Load model
         model = load_model(model_path)
         print("model loded")
-        
-        # Prepare test data
-        test = array(split(df, len(df)/4))
-
-        # Make predictions for 7 days
-        predictions = {}
-        for i in range(1, 8):
-            prediction = predict_model(model, test, i)
-            predictions[f"Day {i}"] = float(prediction.mean())  # Convert to float for JSON serialization
 
         return {
             "status": "success",
-            "predictions": predictions
+            "predictions": _run_predictions(model, df)
         }
 
     except Exception as e:
@@ -95,7 +225,59 @@ def predict_solar_radiation(model_path, dataset_path):
             "message": str(e)
         }
 
-def main():        
-    model_path = r"C:\Users\saif\OneDrive - SUPCOM\SupCom1\Projects\challenge CAS\Back end\app\controller\GHI_AI_model\my_model.h5"
-    dataset_path = r"C:\Users\saif\OneDrive - SUPCOM\SupCom1\Projects\challenge CAS\Back end\app\controller\GHI_AI_model\2019_TUN.json"
-    return(predict_solar_radiation(model_path, dataset_path))
\ No newline at end of file
+class GHIForecaster:
+    """
+    Keeps the Keras model and the processed dataset in memory between forecasts.
+
+    Both are loaded lazily on the first forecast (or eagerly through `load()`)
+    and are only reloaded when the mtime of the model or dataset file changes.
+    """
+    def __init__(self, model_path=MODEL_PATH, dataset_path=DATASET_PATH):
+        self.model_path = model_path
+        self.dataset_path = dataset_path
+        self.model = None
+        self.df = None
+        self._model_mtime = None
+        self._dataset_mtime = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """
+        Load (or reload) whatever is missing or stale on disk
+        """
+        with self._lock:
+            model_mtime = os.path.getmtime(self.model_path)
+            if self.model is None or model_mtime != self._model_mtime:
+                self.model = load_model(self.model_path)
+                self._model_mtime = model_mtime
+                print("model loded")
+
+            dataset_mtime = os.path.getmtime(self.dataset_path)
+            if self.df is None or dataset_mtime != self._dataset_mtime:
+                self.df = process_solar_data(self.dataset_path)
+                self._dataset_mtime = dataset_mtime
+            return self.model, self.df
+
+    def predict(self):
+        """
+        Make the 7-day forecast using the cached model and dataset
+
+        Returns:
+        dict: Same structure as `predict_solar_radiation`
+        """
+        try:
+            model, df = self.load()
+            return {
+                "status": "success",
+                "predictions": _run_predictions(model, df)
+            }
+        except Exception as e:
+            return {
+                "status": "error",
+                "message": str(e)
+            }
+
+forecaster = GHIForecaster()
+
+def main():
+    return forecaster.predict()
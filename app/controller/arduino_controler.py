@@ -1,38 +1,132 @@
-from flask_socketio import SocketIO
-import serial
-import time
-from contextlib import contextmanager
-# Initialize serial connection to Arduino
+import os
+import threading
+import re
+from concurrent.futures import Future
+from .serial_io import CommandWriter, FrameRing, SerialReader
+from .transports import Transport, _flag, create_transport
 
-arduino = serial.Serial(
-            port="COM5",
-            baudrate=9600,
-            timeout=0.05,
-            write_timeout=1
-        )
+# Connection to the Arduino, selected from the app config by ArduinoController.init_app
+arduino = None
+_transport_lock = threading.Lock()
 
-print(arduino.is_open)
+# Lines received from the Arduino, shared by every consumer (Socket.IO, sinks, ...)
+frame_ring = FrameRing(capacity=int(os.getenv('ARDUINO_BUFFER_SIZE', '1024')))
+serial_reader = None
+_reader_lock = threading.Lock()
+_default_consumer = None
 
-time.sleep(2)  # Wait for the connection to stabilize
+command_writer = None
+_writer_lock = threading.Lock()
 
+# Commands that must reach the Arduino before comfort commands (lights, AC, ...)
+SAFETY_PRIORITY = 0
+DEFAULT_PRIORITY = 1
+_SAFETY_WORDS = frozenset({'door', 'fire', 'alarm', 'lock', 'unlock'})
+
+# Maps a command to the (device, room) it controls; commands for the same key are coalesced
+_COMMAND_PATTERNS = [
+    (re.compile(r'^make_light_(?:on|off)_(?P<room>.+)$'), 'light'),
+    (re.compile(r'^schedule_duration_\d+_for_room_(?P<room>.+)$'), 'light_schedule'),
+    (re.compile(r'^(?:open|close)_door_(?P<room>.+)$'), 'door'),
+    (re.compile(r'^(?:activate|disactivate)_AC_(?P<room>.+)$'), 'ac'),
+]
+
+def command_priority(message):
+    """
+    Priority of a command, lower values are written first. Safety commands
+    are recognized by their device (from `command_key`) or, for commands
+    without a key, by their leading verb and device words (`lock_door_x`,
+    `fire_alarm_on`), so room names such as "indoor" do not count.
+    """
+    key = command_key(message)
+    words = (key[0],) if key is not None else message.lower().split('_')[:2]
+    if any(word in _SAFETY_WORDS for word in words):
+        return SAFETY_PRIORITY
+    return DEFAULT_PRIORITY
+
+def command_key(message):
+    """(device, room) targeted by a command, or None if it must not be coalesced."""
+    for pattern, device in _COMMAND_PATTERNS:
+        match = pattern.match(message)
+        if match:
+            return device, match.group('room')
+    return None
 
 
 
 class ArduinoController:
 
     @staticmethod
-    def send_to_arduino(message):
+    def init_app(app):
+        """
+        Create the Arduino transport selected by the app configuration.
+        """
+        ArduinoController.set_transport(create_transport(app.config))
+
+    @staticmethod
+    def set_transport(transport: Transport):
+        """
+        Use `transport` for the Arduino; it is opened when first needed.
+        """
+        global arduino
+        with _transport_lock:
+            if serial_reader is not None or command_writer is not None:
+                raise RuntimeError("Arduino transport is already in use")
+            arduino = transport
+
+    @staticmethod
+    def get_transport():
+        """
+        Return the opened Arduino transport, creating a serial one from the
+        environment if the app did not configure any.
+        """
+        global arduino
+        with _transport_lock:
+            if arduino is None:
+                arduino = create_transport(os.environ)
+            if not arduino.is_open:
+                arduino.open()
+            return arduino
+
+    @staticmethod
+    def start_writer():
+        """
+        Start the command writer thread if it is not running yet.
+        """
+        global command_writer
+        with _writer_lock:
+            if command_writer is None:
+                command_writer = CommandWriter(
+                    ArduinoController.get_transport(), command_priority, command_key,
+                    flush_window=float(os.getenv('ARDUINO_FLUSH_WINDOW', '0.02')),
+                    terminator=b'\n' if _flag(os.getenv('ARDUINO_COMMAND_NEWLINE', 'false')) else b''
+                )
+                command_writer.start()
+        return command_writer
+
+    @staticmethod
+    def submit(message):
+        """
+        Queue a message for the Arduino and return a Future of its write result.
+        """
+        if not isinstance(message, str):
+            future = Future()
+            future.set_result({"status": "error", "message": "Message must be a string."})
+            return future
+        return ArduinoController.start_writer().submit(message)
+
+    @staticmethod
+    def send_to_arduino(message, wait=False, timeout=None):
         """
         Send a string message to the Arduino via serial communication.
+
+        The message is queued for the writer thread; pass `wait=True` to block
+        until it has actually been written.
         """
-        try:
-            # Send the string to the Arduino
-            arduino.write(message.encode('utf-8'))
-            print(f"Message sent to Arduino: {message}")
-            return {"status": "success", "message": "Message sent to Arduino."}
-        except Exception as e:
-            print(f"Error: {e}")
-            return {"status": "error", "message": str(e)}
+        future = ArduinoController.submit(message)
+        if wait or future.done():
+            return future.result(timeout)
+        return {"status": "queued", "message": "Message queued for Arduino."}
 
     @staticmethod
     def handle_socket_event(data):
@@ -47,19 +141,41 @@ class ArduinoController:
         return ArduinoController.send_to_arduino(message)
     
     @staticmethod
-    def read_from_arduino():
-        """
-        Background thread to read data from Arduino and send it to connected clients.
-        """
-        while True:
-            try:
-                # Read data from the Arduino
-                data = arduino.readline().decode('utf-8').strip()
-                if data:  # If valid data is received
-                    #print(f"Data received from Arduino: {data}")
-                    # Emit the data to connected clients via Socket.IO
-                    #socketio.emit('arduino_data', {'data': data})
-                    return data
-            except Exception as e:
-                print(f"Error reading from Arduino: {e}")  
-                return {}
\ No newline at end of file
+    def start_reader():
+        """
+        Start the serial reader thread if it is not running yet.
+        """
+        global serial_reader
+        with _reader_lock:
+            if serial_reader is None:
+                serial_reader = SerialReader(ArduinoController.get_transport(), frame_ring)
+                serial_reader.start()
+        return serial_reader
+
+    @staticmethod
+    def subscribe(from_latest=True):
+        """
+        Get an independent consumer of the lines received from the Arduino.
+        """
+        ArduinoController.start_reader()
+        return frame_ring.subscribe(from_latest)
+
+    @staticmethod
+    def reader_stats():
+        """
+        Counters of the serial reader and its ring buffer.
+        """
+        if serial_reader is None:
+            return {}
+        return serial_reader.stats()
+
+    @staticmethod
+    def read_from_arduino(timeout=None):
+        """
+        Return the next line received from the Arduino as a string.
+        """
+        global _default_consumer
+        if _default_consumer is None:
+            _default_consumer = ArduinoController.subscribe()
+        line = _default_consumer.get(timeout)
+        return line.decode('utf-8', errors='replace') if line is not None else ""
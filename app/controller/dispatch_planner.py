@@ -0,0 +1,242 @@
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Sequence, Tuple, Union
+import numpy as np
+from ..models.device import Battery, SolarPanel
+from .energy_controller import STATIONARY_RESERVE, EnergyManagementSystem
+from .energy_market import DEFAULT_GRID_PRICE
+
+DEFAULT_EXPORT_PRICE = 0.05  # per kWh paid for energy exported to the grid
+DEFAULT_CYCLE_COST = 0.01  # per kWh moved through a battery, so it is not cycled for nothing
+DEFAULT_SOC_LEVELS = 41  # states of charge the optimizer considers per battery
+DEFAULT_RATE = 0.5  # charge/discharge power as a fraction of capacity, when the battery has no discharge_rate
+
+# Solar day of the hourly GHI profile built from the forecast's daily means
+SUNRISE_HOUR = 6
+SUNSET_HOUR = 18
+
+Prices = Union[float, np.ndarray]
+
+
+def _as_utc(at: datetime) -> datetime:
+    """Aware datetime for `at`; naive datetimes are taken to be UTC"""
+    return at.replace(tzinfo=timezone.utc) if at.tzinfo is None else at
+
+
+def hourly_ghi(daily_means: Sequence[float], step_hours: float = 1.0) -> np.ndarray:
+    """
+    Spread daily mean GHI values (W/m2, as predicted by
+    `ghi_fun.predict_solar_radiation`) over the day as a half sine between
+    sunrise and sunset, keeping each day's mean
+    """
+    steps_per_day = int(round(24 / step_hours))
+    hours = (np.arange(steps_per_day) + 0.5) * step_hours
+    shape = np.clip(np.sin((hours - SUNRISE_HOUR) / (SUNSET_HOUR - SUNRISE_HOUR) * np.pi), 0, None)
+    shape[(hours < SUNRISE_HOUR) | (hours > SUNSET_HOUR)] = 0
+    shape /= shape.mean()
+    return (np.asarray(daily_means, dtype=float)[:, None] * shape).ravel()
+
+
+def forecast_means(forecast: Dict) -> np.ndarray:
+    """Daily means of a `predict_solar_radiation` result (or of its `predictions`), Day 1 first"""
+    if forecast.get('status') == 'error':
+        raise ValueError(f"GHI forecast failed: {forecast.get('message')}")
+    predictions = forecast.get('predictions', forecast)
+    days = sorted(predictions, key=lambda day: int(day.split()[-1]))
+    return np.array([predictions[day] for day in days], dtype=float)
+
+
+def solar_energy(panel: SolarPanel, ghi: np.ndarray, step_hours: float = 1.0) -> np.ndarray:
+    """kWh the panel produces per step under `ghi` W/m2 (rated power is given at 1000 W/m2)"""
+    if panel.rated_power:
+        kw_per_ghi = panel.rated_power / 1000 / 1000
+    else:
+        kw_per_ghi = panel.area * panel.efficiency / 100 / 1000
+    return np.clip(ghi, 0, None) * kw_per_ghi * step_hours
+
+
+def optimize_battery(net: np.ndarray, battery: Battery, reserve: float, step_hours: float = 1.0,
+                     import_price: Prices = DEFAULT_GRID_PRICE, export_price: Prices = DEFAULT_EXPORT_PRICE,
+                     cycle_cost: float = DEFAULT_CYCLE_COST, levels: int = DEFAULT_SOC_LEVELS,
+                     allow_discharge: bool = True) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Cheapest charge schedule of one battery for a net load (`net` kWh per
+    step, negative for surplus), by dynamic programming over its state of
+    charge. Like `manage_energy`, the battery only charges from surplus and
+    only discharges into a deficit: it never buys from or sells to the grid.
+
+    The cost to go is kept on `levels` charges and interpolated in between,
+    so moves need not land on a level: from each charge the candidates are
+    the moves to every level, clipped to what the step allows, and staying
+    put. Every (step, level, move) cost is computed in one array operation;
+    the backward pass then takes one minimum per step.
+
+    Returns the energy drawn (> 0, before charging losses) or supplied (< 0)
+    by the battery per step, and its charge (kWh) after each step.
+    """
+    steps = len(net)
+    capacity = battery.capacity
+    if capacity <= 0:
+        return np.zeros(steps), np.zeros(steps)
+    efficiency = (battery.efficiency or 100.0) / 100.0
+    max_step = (battery.discharge_rate or capacity * DEFAULT_RATE) * step_hours
+    soc = np.linspace(0.0, capacity, levels)
+    floor = capacity * reserve
+    import_price = np.broadcast_to(np.asarray(import_price, dtype=float), (steps,))
+    export_price = np.broadcast_to(np.asarray(export_price, dtype=float), (steps,))
+    surplus = np.clip(-net, 0.0, None)
+    deficit = np.clip(net, 0.0, None) if allow_discharge else np.zeros(steps)
+
+    def costs(delta: np.ndarray, net, buy, sell) -> Tuple[np.ndarray, np.ndarray]:
+        """Energy drawn by each charge change and its cost"""
+        flow = np.where(delta > 0, delta / efficiency, delta)
+        grid = net + flow
+        return flow, np.where(grid > 0, grid * buy, grid * sell) + np.abs(flow) * cycle_cost
+
+    # moves from every level during every step: to each level within the limits of the step, or none
+    up = np.minimum(np.clip(capacity - soc, 0.0, max_step)[None, :], surplus[:, None] * efficiency)
+    down = np.minimum(np.clip(soc - floor, 0.0, max_step)[None, :], deficit[:, None])
+    delta = np.zeros((steps, levels, levels + 1))
+    np.clip(soc[None, None, :] - soc[None, :, None], -down[..., None], up[..., None], out=delta[..., :levels])
+    _, step_cost = costs(delta, net[:, None, None], import_price[:, None, None], export_price[:, None, None])
+    position = np.clip((soc[None, :, None] + delta) / capacity * (levels - 1), 0, levels - 1)
+    lower = np.minimum(position.astype(np.intp), levels - 2)
+    weight = position - lower
+
+    # value of the stored energy left at the end of the horizon
+    value = np.empty((steps + 1, levels))
+    value[steps] = -soc * export_price[-1]
+    for t in range(steps - 1, -1, -1):
+        after = value[t + 1][lower[t]] * (1 - weight[t]) + value[t + 1][lower[t] + 1] * weight[t]
+        value[t] = (step_cost[t] + after).min(axis=1)
+
+    # forward from the actual charge, which is rarely on a level
+    charge = float(battery.current_charge)
+    path = np.empty(steps)
+    drawn = np.empty(steps)
+    delta = np.zeros(levels + 1)
+    for t in range(steps):
+        up = max(min(capacity - charge, max_step, surplus[t] * efficiency), 0.0)
+        down = max(min(charge - floor, max_step, deficit[t]), 0.0)
+        np.clip(soc - charge, -down, up, out=delta[:levels])
+        flow, cost = costs(delta, net[t], import_price[t], export_price[t])
+        best = int((cost + np.interp(charge + delta, soc, value[t + 1])).argmin())
+        charge += delta[best]
+        drawn[t], path[t] = flow[best], charge
+    return drawn, path
+
+
+@dataclass
+class DispatchPlan:
+    """
+    Battery schedule over a horizon: energy drawn (> 0) or supplied (< 0)
+    per hour by each battery and the charge it leaves them with. While it
+    covers the current time, `manage_energy` charges and discharges the
+    batteries by the planned flows.
+    """
+    start: datetime  # naive start and lookup times are taken to be UTC
+    step_hours: float
+    stationary: np.ndarray  # kW (kWh per hour)
+    ev: np.ndarray
+    stationary_charge: np.ndarray  # kWh after each step
+    ev_charge: np.ndarray
+    expected_grid: np.ndarray  # kWh imported (> 0) or exported (< 0) per step
+    expected_cost: float
+
+    @property
+    def end(self) -> datetime:
+        return self.start + timedelta(hours=self.step_hours * len(self.stationary))
+
+    def _index(self, at: datetime) -> Optional[int]:
+        index = int((_as_utc(at) - _as_utc(self.start)).total_seconds() // (self.step_hours * 3600))
+        return index if 0 <= index < len(self.stationary) else None
+
+    def targets(self, at: datetime) -> Optional[Tuple[float, float]]:
+        """Planned (stationary, ev) charge in kWh at the end of the step covering `at`, None outside the plan"""
+        index = self._index(at)
+        if index is None:
+            return None
+        return float(self.stationary_charge[index]), float(self.ev_charge[index])
+
+    def flows(self, at: datetime) -> Optional[Tuple[float, float]]:
+        """Planned (stationary, ev) kW drawn (> 0) or supplied (< 0) during the step covering `at`, None outside the plan"""
+        index = self._index(at)
+        if index is None:
+            return None
+        return float(self.stationary[index]), float(self.ev[index])
+
+    def to_dict(self) -> Dict:
+        return {
+            'start': self.start.isoformat(),
+            'step_hours': self.step_hours,
+            'stationary': self.stationary.tolist(),
+            'ev': self.ev.tolist(),
+            'stationary_charge': self.stationary_charge.tolist(),
+            'ev_charge': self.ev_charge.tolist(),
+            'expected_grid': self.expected_grid.tolist(),
+            'expected_cost': self.expected_cost,
+        }
+
+
+class DispatchPlanner:
+    """
+    Plans the batteries of an `EnergyManagementSystem` from the GHI forecast.
+
+    The EV is planned first (it comes first in the surplus priorities),
+    then the stationary battery against the net load left by the EV plan.
+    Each is a dynamic program over its own state of charge; planning them
+    one after the other keeps a 7-day hourly plan around 60 ms.
+    `manage_energy` only charges the batteries from solar surplus, so the
+    plan does too: with time-of-use prices it decides how much surplus to
+    store and when to use it, not when to buy energy.
+    """
+
+    def __init__(self, import_price: Prices = DEFAULT_GRID_PRICE, export_price: Prices = DEFAULT_EXPORT_PRICE,
+                 cycle_cost: float = DEFAULT_CYCLE_COST, levels: int = DEFAULT_SOC_LEVELS):
+        self.import_price = import_price
+        self.export_price = export_price
+        self.cycle_cost = cycle_cost
+        self.levels = levels
+
+    def plan(self, system: EnergyManagementSystem, forecast: Union[Dict, Sequence[float]],
+             consumption: Optional[np.ndarray] = None, start: Optional[datetime] = None,
+             step_hours: float = 1.0) -> DispatchPlan:
+        """
+        `forecast` is a `predict_solar_radiation` result or daily mean GHI
+        values; `consumption` gives kWh per step (default: the devices'
+        current draw). Time-of-use prices may be arrays of one price per step.
+        """
+        daily = forecast_means(forecast) if isinstance(forecast, dict) else np.asarray(forecast, dtype=float)
+        produced = solar_energy(system.solar_panel, hourly_ghi(daily, step_hours), step_hours)
+        steps = len(produced)
+        if consumption is None:
+            consumption = np.full(steps, system.calculate_consumed_energy(step_hours))
+        consumption = np.asarray(consumption, dtype=float)
+        if consumption.shape != (steps,):
+            raise ValueError(f"Expected {steps} consumption values, got {consumption.shape}")
+        net = consumption - produced
+        options = dict(step_hours=step_hours, import_price=self.import_price, export_price=self.export_price,
+                       cycle_cost=self.cycle_cost, levels=self.levels)
+
+        ev = np.zeros(steps)
+        ev_charge = np.zeros(steps)
+        if system.ev_battery:
+            ev, ev_charge = optimize_battery(net, system.ev_battery, system.v2h_controller.min_soc,
+                                             allow_discharge=system.v2h_enabled, **options)
+        stationary, stationary_charge = optimize_battery(net + ev, system.stationary_battery,
+                                                         STATIONARY_RESERVE, **options)
+
+        grid = net + ev + stationary
+        buy = np.broadcast_to(np.asarray(self.import_price, dtype=float), (steps,))
+        sell = np.broadcast_to(np.asarray(self.export_price, dtype=float), (steps,))
+        cost = float(np.where(grid > 0, grid * buy, grid * sell).sum())
+        return DispatchPlan(
+            start=start or datetime.now(timezone.utc),
+            step_hours=step_hours,
+            stationary=stationary / step_hours,
+            ev=ev / step_hours,
+            stationary_charge=stationary_charge,
+            ev_charge=ev_charge,
+            expected_grid=grid,
+            expected_cost=cost,
+        )
@@ -1,7 +1,20 @@
-from dataclasses import dataclass
-from typing import List, Dict, Callable, Optional
-from datetime import datetime
-from ..device import Device, Battery, SolarPanel, DeviceStatus
+from collections import OrderedDict, defaultdict, deque
+from typing import Any, Iterator, List, Dict, Callable, Optional
+from datetime import datetime, timezone
+import json
+import os
+from ..models.device import Device, Battery, SolarPanel, DeviceStatus
+from ..models.history import bucket_key
+
+# Number of buckets kept per rollup granularity
+ROLLUP_WINDOWS = {'hour': 7 * 24, 'day': 366}
+
+# Battery thresholds of manage_energy (state of charge as a fraction of capacity)
+CHARGE_BELOW_SOC = 0.8  # batteries are charged from surplus while below this
+DISCHARGE_ABOVE_SOC = 0.2  # the stationary battery covers a deficit while above this
+STATIONARY_RESERVE = 0.2  # part of the stationary battery never discharged
+DEFAULT_V2H_MIN_SOC = 0.5  # part of the EV battery kept for driving
+NEIGHBOR_CAPACITY = 5.0  # kWh neighbors take per step when no market allocates it
 
 class EnergyDistribution:
     """Class to handle energy distribution priorities and neighbor interactions"""
@@ -12,14 +25,16 @@ class EnergyDistribution:
         self.grid_energy_provided = 0
         self.energy_shared_to_neighbors = 0
         self.energy_exported_to_grid = 0
+        self.max_neighbor_capacity = NEIGHBOR_CAPACITY
+        # kWh sold to neighbors for the current step, set by `EnergyMarket`
+        self.neighbor_allocation: Optional[float] = None
         
     def share_to_neighbor(self, available_energy: float) -> float:
         """Share surplus energy with neighbors"""
         if not self.neighbor_sharing_enabled:
             return 0
-        # Simulate neighbor capacity (could be replaced with actual neighbor system integration)
-        max_neighbor_capacity = 5.0  # kWh
-        shared_energy = min(available_energy, max_neighbor_capacity)
+        capacity = self.max_neighbor_capacity if self.neighbor_allocation is None else self.neighbor_allocation
+        shared_energy = min(available_energy, capacity)
         self.energy_shared_to_neighbors += shared_energy
         return shared_energy
 
@@ -30,42 +45,325 @@ class EnergyDistribution:
         self.energy_exported_to_grid += available_energy
         return available_energy
 
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+class EnergyHistory:
+    """
+    Management records kept in a ring of `maxlen` entries.
+
+    When `spill_path` is set, records leaving the ring are appended to it as
+    JSON lines (datetimes as ISO strings) instead of being dropped, and
+    `iter_all()` reads them back, with `timestamp` as a datetime again,
+    before the in-memory ones.
+    """
+    def __init__(self, maxlen: int = 1000, spill_path: Optional[str] = None):
+        self.records = deque(maxlen=maxlen)
+        self.spill_path = spill_path
+        self.spilled = 0
+        self._spill_file = None
+
+    def append(self, record: Dict):
+        if len(self.records) == self.records.maxlen and self.spill_path:
+            self._spill(self.records[0])
+        self.records.append(record)
+
+    def _spill(self, record: Dict):
+        try:
+            if self._spill_file is None:
+                directory = os.path.dirname(self.spill_path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                self._spill_file = open(self.spill_path, 'a', encoding='utf-8')
+            self._spill_file.write(json.dumps(record, default=_json_default) + '\n')
+            self.spilled += 1
+        except OSError as e:
+            print(f"Error spilling energy history: {e}")
+
+    def iter_all(self) -> Iterator[Dict]:
+        """Spilled records, then the ones in memory, oldest first"""
+        if self.spill_path and os.path.exists(self.spill_path):
+            self.flush()
+            with open(self.spill_path, encoding='utf-8') as f:
+                for line in f:
+                    record = json.loads(line)
+                    if isinstance(record.get('timestamp'), str):
+                        record['timestamp'] = datetime.fromisoformat(record['timestamp'])
+                    yield record
+        yield from self.records
+
+    def flush(self):
+        if self._spill_file is not None:
+            self._spill_file.flush()
+
+    def close(self):
+        if self._spill_file is not None:
+            self._spill_file.close()
+            self._spill_file = None
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, index):
+        return self.records[index]
+
+class EnergyTotals:
+    """
+    Running totals of the energy moved by each action, updated as records
+    are added so that reading them does not depend on the history length.
+    With `rollups`, the same totals (plus produced/consumed energy) are kept
+    per hour and per day for the last `ROLLUP_WINDOWS` buckets.
+    """
+    def __init__(self, rollups: bool = True):
+        self.totals: Dict[str, float] = defaultdict(float)
+        self.counts: Dict[str, int] = defaultdict(int)
+        self.rollups: Optional[Dict[str, OrderedDict]] = (
+            {granularity: OrderedDict() for granularity in ROLLUP_WINDOWS} if rollups else None
+        )
+
+    def add(self, record: Dict):
+        for action in record['actions']:
+            self.totals[action['action']] += action['amount']
+            self.counts[action['action']] += 1
+        if self.rollups is not None:
+            for granularity, buckets in self.rollups.items():
+                self._add_to_bucket(buckets, bucket_key(record['timestamp'], granularity), record)
+                while len(buckets) > ROLLUP_WINDOWS[granularity]:
+                    buckets.popitem(last=False)
+
+    @staticmethod
+    def _add_to_bucket(buckets: OrderedDict, key: str, record: Dict):
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = {'produced_energy': 0.0, 'consumed_energy': 0.0, 'records': 0,
+                                     'actions': defaultdict(float)}
+        bucket['produced_energy'] += record['produced_energy']
+        bucket['consumed_energy'] += record['consumed_energy']
+        bucket['records'] += 1
+        for action in record['actions']:
+            bucket['actions'][action['action']] += action['amount']
+
+    def total(self, action: str) -> float:
+        return self.totals.get(action, 0.0)
+
+    def get_rollups(self, granularity: str = 'hour', start: Optional[str] = None,
+                    end: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Buckets of one granularity, oldest first; `start`/`end` are bucket keys (inclusive)"""
+        if self.rollups is None:
+            return []
+        if granularity not in self.rollups:
+            raise ValueError(f"Unknown rollup granularity: {granularity}")
+        return [
+            {'bucket': key, 'produced_energy': bucket['produced_energy'],
+             'consumed_energy': bucket['consumed_energy'], 'records': bucket['records'],
+             'actions': dict(bucket['actions'])}
+            for key, bucket in self.rollups[granularity].items()
+            if (start is None or key >= start) and (end is None or key <= end)
+        ]
+
+class V2HController:
+    """Safety rules for powering the house from the EV battery (Vehicle-to-Home)"""
+    def __init__(self, min_soc: float = DEFAULT_V2H_MIN_SOC):
+        self.min_soc = min_soc
+
+    def check_safety_conditions(self, ev_battery: Battery) -> bool:
+        """True while the EV is above the charge it keeps for driving"""
+        return ev_battery.capacity > 0 and ev_battery.current_charge / ev_battery.capacity > self.min_soc
+
+def _device_power(device: Device) -> float:
+    """Watts drawn by a device, 0 unless it is on"""
+    # FireDetector overrides status with a bool
+    if device.power_consumption and (device.status == DeviceStatus.ACTIVE or device.status is True):
+        return device.power_consumption
+    return 0.0
+
 class EnergyManagementSystem:
+    """
+    Energy management of one house.
+
+    Consumption comes from an index of the watts each device draws, keyed
+    by `device.id` (IDs must be unique). The index is a snapshot: after
+    changing a device's `status` or `power_consumption`, call
+    `update_device(device)`; after replacing `devices`, call
+    `rebuild_power_index()`. Otherwise consumption stays stale.
+    """
     def __init__(self, 
                  devices: List[Device],
                  stationary_battery: Battery,
                  ev_battery: Optional[Battery],
-                 solar_panel: SolarPanel):
+                 solar_panel: SolarPanel,
+                 history_size: int = 1000,
+                 history_spill_path: Optional[str] = None,
+                 rollups: bool = True):
         self.devices = devices
         self.stationary_battery = stationary_battery
         self.ev_battery = ev_battery
         self.solar_panel = solar_panel
-        self.energy_history: List[Dict] = []
+        self.energy_history = EnergyHistory(history_size, history_spill_path)
+        self.energy_totals = EnergyTotals(rollups)
         self.v2h_controller = V2HController()
         self.v2h_enabled = False
         self.energy_distributor = EnergyDistribution()
-        
-    # ... (previous methods remain the same until manage_energy)
+        self.dispatch_plan = None  # dispatch_planner.DispatchPlan followed while it covers the current time
+        self.rebuild_power_index()
+
+    def rebuild_power_index(self):
+        """Index the power drawn by every device; call after replacing `devices`"""
+        index: Dict[str, float] = {}
+        by_id: Dict[str, Device] = {}
+        for device in self.devices:
+            if device.id in index:
+                raise ValueError(f"Duplicate device ID: {device.id!r}")
+            index[device.id] = _device_power(device)
+            by_id[device.id] = device
+        self._device_power = index
+        self._devices_by_id = by_id
+        self._active_power: Optional[float] = None
+
+    def _position(self, device_id: str) -> int:
+        return next(i for i, device in enumerate(self.devices) if device.id == device_id)
+
+    def update_device(self, device: Device):
+        """
+        Re-index a device after its status or power changed. A device with a
+        new ID is added; one with a known ID replaces the device with that ID.
+        """
+        known = self._devices_by_id.get(device.id)
+        if known is None:
+            self.devices.append(device)
+        elif known is not device:
+            self.devices[self._position(device.id)] = device
+        self._devices_by_id[device.id] = device
+        power = _device_power(device)
+        previous = self._device_power.get(device.id, 0.0)
+        self._device_power[device.id] = power
+        if self._active_power is not None:
+            self._active_power += power - previous
+
+    def remove_device(self, device: Device):
+        """Remove the device with `device.id` and its power from the index"""
+        previous = self._device_power.pop(device.id, None)
+        if previous is not None:
+            del self.devices[self._position(device.id)]
+            del self._devices_by_id[device.id]
+            if self._active_power is not None:
+                self._active_power -= previous
+
+    @property
+    def active_power(self) -> float:
+        """Watts drawn by all devices, kept up to date by `update_device`/`remove_device`"""
+        if self._active_power is None:
+            self._active_power = sum(self._device_power.values())
+        return self._active_power
+
+    def calculate_produced_energy(self, duration_hours: float) -> float:
+        """kWh produced by the solar panel over `duration_hours` at its current output"""
+        if self.solar_panel is None or self.solar_panel.status != DeviceStatus.ACTIVE:
+            return 0.0
+        return self.solar_panel.current_power_output / 1000 * duration_hours
+
+    def calculate_consumed_energy(self, duration_hours: float) -> float:
+        """kWh consumed by the active devices over `duration_hours`"""
+        return self.active_power / 1000 * duration_hours
+
+    def charge_battery(self, battery: Battery, energy: float) -> float:
+        """
+        Charge a battery with up to `energy` kWh, until it is full.
+        Returns the energy taken; with an efficiency set, less than that is stored.
+        """
+        accepted = self._charge_amount(battery, energy)
+        if accepted > 0:
+            efficiency = (battery.efficiency or 100.0) / 100.0
+            battery.current_charge = min(battery.capacity, battery.current_charge + accepted * efficiency)
+        return accepted
+
+    @staticmethod
+    def _charge_amount(battery: Battery, energy: float) -> float:
+        room = battery.capacity - battery.current_charge
+        if room <= 0 or energy <= 0:
+            return 0.0
+        return min(energy, room / ((battery.efficiency or 100.0) / 100.0))
+
+    def discharge_battery(self, battery: Battery, energy: float, is_ev: bool = False) -> float:
+        """
+        Draw up to `energy` kWh from a battery without going below its reserve
+        (20% for the stationary battery, the V2H minimum for the EV).
+        Returns the energy provided.
+        """
+        provided = self._discharge_amount(battery, energy, is_ev)
+        battery.current_charge -= provided
+        return provided
+
+    def _discharge_amount(self, battery: Battery, energy: float, is_ev: bool = False) -> float:
+        reserve = self.v2h_controller.min_soc if is_ev else STATIONARY_RESERVE
+        provided = min(energy, battery.current_charge - battery.capacity * reserve)
+        return provided if provided > 0 else 0.0
+
+    def neighbor_balance(self, duration_hours: float, timestamp: Optional[datetime] = None) -> float:
+        """
+        Energy `manage_energy` would hand to neighbors (> 0) or ask them for (< 0)
+        over the next `duration_hours` at `timestamp` (default now), once its own
+        batteries have been used, following `dispatch_plan` while it covers that time.
+        Nothing is charged or discharged.
+        """
+        balance = self.calculate_produced_energy(duration_hours) - self.calculate_consumed_energy(duration_hours)
+        flows = self.dispatch_plan.flows(timestamp or datetime.now(timezone.utc)) if self.dispatch_plan is not None else None
+        if flows is not None:
+            stationary_amount, ev_amount = self._planned_amounts(flows, balance, duration_hours)
+            return balance - stationary_amount - ev_amount
+        stationary, ev = self.stationary_battery, self.ev_battery
+        if balance > 0:
+            surplus = balance
+            if ev and ev.current_charge / ev.capacity < CHARGE_BELOW_SOC:
+                surplus -= self._charge_amount(ev, surplus)
+            if surplus > 0 and stationary.current_charge / stationary.capacity < CHARGE_BELOW_SOC:
+                surplus -= self._charge_amount(stationary, surplus)
+            return surplus
+        deficit = abs(balance)
+        if stationary.current_charge / stationary.capacity > DISCHARGE_ABOVE_SOC:
+            deficit -= self._discharge_amount(stationary, deficit)
+        if deficit > 0 and self.v2h_enabled and ev and self.v2h_controller.check_safety_conditions(ev):
+            deficit -= self._discharge_amount(ev, deficit, is_ev=True)
+        return -deficit
+
+    def get_v2h_status(self) -> str:
+        """'disabled', 'no_ev', 'available' or 'reserve' (EV at its minimum charge)"""
+        if not self.v2h_enabled:
+            return 'disabled'
+        if not self.ev_battery:
+            return 'no_ev'
+        return 'available' if self.v2h_controller.check_safety_conditions(self.ev_battery) else 'reserve'
 
     def manage_energy(self, 
                      duration_hours: float,
                      weather_data: Dict,
-                     request_energy_from_neighbor: Optional[Callable] = None) -> Dict:
+                     request_energy_from_neighbor: Optional[Callable] = None,
+                     timestamp: Optional[datetime] = None) -> Dict:
         """
         Enhanced energy management with strict priority rules for surplus and deficit scenarios.
         Priority for surplus: VE -> Stationary Battery -> Dynamic Charging -> Neighbors -> Grid
         Priority for deficit: Stationary Battery -> V2H -> Neighbors -> Grid
+        While `dispatch_plan` covers `timestamp` (default now), the batteries follow its flows instead.
         """
+        timestamp = timestamp or datetime.now(timezone.utc)
         produced_energy = self.calculate_produced_energy(duration_hours)
         consumed_energy = self.calculate_consumed_energy(duration_hours)
         energy_balance = produced_energy - consumed_energy
         actions_taken = []
+        flows = self.dispatch_plan.flows(timestamp) if self.dispatch_plan is not None else None
         
-        if energy_balance > 0:  # Surplus energy handling
+        if flows is not None:
+            actions_taken = self._follow_plan(flows, energy_balance, duration_hours, request_energy_from_neighbor)
+        elif energy_balance > 0:  # Surplus energy handling
             surplus = energy_balance
             
             # 1. Priority: Charge Electric Vehicle (VE)
-            if self.ev_battery and self.ev_battery.current_charge / self.ev_battery.capacity < 0.8:
+            if self.ev_battery and self.ev_battery.current_charge / self.ev_battery.capacity < CHARGE_BELOW_SOC:
                 charged = self.charge_battery(self.ev_battery, surplus)
                 if charged > 0:
                     surplus -= charged
@@ -77,7 +375,7 @@ class EnergyManagementSystem:
                     })
             
             # 2. Priority: Charge Stationary Battery
-            if surplus > 0 and self.stationary_battery.current_charge / self.stationary_battery.capacity < 0.8:
+            if surplus > 0 and self.stationary_battery.current_charge / self.stationary_battery.capacity < CHARGE_BELOW_SOC:
                 charged = self.charge_battery(self.stationary_battery, surplus)
                 if charged > 0:
                     surplus -= charged
@@ -119,7 +417,7 @@ class EnergyManagementSystem:
             deficit = abs(energy_balance)
             
             # 1. Priority: Discharge Stationary Battery
-            if self.stationary_battery.current_charge / self.stationary_battery.capacity > 0.2:
+            if self.stationary_battery.current_charge / self.stationary_battery.capacity > DISCHARGE_ABOVE_SOC:
                 discharged = self.discharge_battery(self.stationary_battery, deficit)
                 if discharged > 0:
                     deficit -= discharged
@@ -166,7 +464,7 @@ class EnergyManagementSystem:
         
         # Record management history with priority information
         management_record = {
-            'timestamp': datetime.utcnow(),
+            'timestamp': timestamp,
             'produced_energy': produced_energy,
             'consumed_energy': consumed_energy,
             'energy_balance': energy_balance,
@@ -178,29 +476,105 @@ class EnergyManagementSystem:
             'grid_energy_exported': self.energy_distributor.energy_exported_to_grid
         }
         self.energy_history.append(management_record)
+        self.energy_totals.add(management_record)
         
         return management_record
 
+    def _planned_amounts(self, flows, energy_balance: float, duration_hours: float):
+        """
+        kWh the (stationary, ev) batteries take (> 0) or give (< 0) over
+        `duration_hours` by the dispatch plan's flows: charged only from the
+        surplus (EV first), discharged only into the deficit (stationary
+        first), and within what each battery can take or give.
+        """
+        stationary_flow, ev_flow = (flow * duration_hours for flow in flows)
+        stationary, ev = self.stationary_battery, self.ev_battery
+        if energy_balance > 0:
+            ev_amount = self._charge_amount(ev, min(energy_balance, ev_flow)) if ev else 0.0
+            stationary_amount = self._charge_amount(stationary, min(energy_balance - ev_amount, stationary_flow))
+            return stationary_amount, ev_amount
+        deficit = -energy_balance
+        stationary_amount = self._discharge_amount(stationary, min(deficit, -stationary_flow))
+        ev_amount = 0.0
+        if self.v2h_enabled and ev and self.v2h_controller.check_safety_conditions(ev):
+            ev_amount = self._discharge_amount(ev, min(deficit - stationary_amount, -ev_flow), is_ev=True)
+        return -stationary_amount, -ev_amount
+
+    def _follow_plan(self, flows, energy_balance: float, duration_hours: float,
+                     request_energy_from_neighbor: Optional[Callable]) -> List[Dict]:
+        """
+        Actions of a step following the dispatch plan's (stationary, ev) flows.
+        The batteries charge and discharge by the planned amounts only, so
+        surplus the plan exports is not stored and energy it keeps for later
+        hours is not used now. The rest goes to neighbors and the grid as usual.
+        """
+        stationary_amount, ev_amount = self._planned_amounts(flows, energy_balance, duration_hours)
+        ev = self.ev_battery
+        actions = []
+        surplus = max(energy_balance, 0.0)
+        deficit = max(-energy_balance, 0.0)
+
+        if ev_amount > 0:
+            charged = self.charge_battery(ev, ev_amount)
+            surplus -= charged
+            actions.append({'action': 'charge_ev', 'amount': charged, 'priority': 1,
+                            'message': f"Charged EV with {charged:.2f} kWh (planned)"})
+        if stationary_amount > 0:
+            charged = self.charge_battery(self.stationary_battery, stationary_amount)
+            surplus -= charged
+            actions.append({'action': 'charge_stationary', 'amount': charged, 'priority': 2,
+                            'message': f"Charged stationary battery with {charged:.2f} kWh (planned)"})
+        if stationary_amount < 0:
+            discharged = self.discharge_battery(self.stationary_battery, -stationary_amount)
+            deficit -= discharged
+            actions.append({'action': 'discharge_stationary', 'amount': discharged, 'priority': 1,
+                            'message': f"Discharged stationary battery providing {discharged:.2f} kWh (planned)"})
+        if ev_amount < 0:
+            discharged = self.discharge_battery(ev, -ev_amount, is_ev=True)
+            deficit -= discharged
+            actions.append({'action': 'v2h', 'amount': discharged, 'priority': 2,
+                            'message': f"V2H provided {discharged:.2f} kWh (planned)"})
+
+        if surplus > 0:
+            shared = self.energy_distributor.share_to_neighbor(surplus)
+            if shared > 0:
+                surplus -= shared
+                actions.append({'action': 'share_neighbors', 'amount': shared, 'priority': 4,
+                                'message': f"Shared {shared:.2f} kWh with neighbors"})
+            if surplus > 0:
+                exported = self.energy_distributor.export_to_grid(surplus)
+                actions.append({'action': 'export_grid', 'amount': exported, 'priority': 5,
+                                'message': f"Exported {exported:.2f} kWh to grid"})
+        if deficit > 0 and request_energy_from_neighbor:
+            borrowed = request_energy_from_neighbor(deficit)
+            if borrowed > 0:
+                deficit -= borrowed
+                actions.append({'action': 'borrow_neighbors', 'amount': borrowed, 'priority': 3,
+                                'message': f"Borrowed {borrowed:.2f} kWh from neighbors"})
+        if deficit > 0:
+            actions.append({'action': 'grid_supply', 'amount': deficit, 'priority': 4,
+                            'message': f"Drew {deficit:.2f} kWh from grid"})
+        return actions
+
     def get_priority_stats(self) -> Dict:
         """Get statistics about energy distribution priorities"""
+        totals = self.energy_totals
         return {
             'surplus_distribution': {
-                'ev_charging_total': sum(action['amount'] for record in self.energy_history 
-                                       for action in record['actions'] if action['action'] == 'charge_ev'),
-                'stationary_charging_total': sum(action['amount'] for record in self.energy_history 
-                                               for action in record['actions'] if action['action'] == 'charge_stationary'),
+                'ev_charging_total': totals.total('charge_ev'),
+                'stationary_charging_total': totals.total('charge_stationary'),
                 'neighbor_sharing_total': self.energy_distributor.energy_shared_to_neighbors,
                 'grid_export_total': self.energy_distributor.energy_exported_to_grid
             },
             'deficit_handling': {
-                'stationary_discharge_total': sum(action['amount'] for record in self.energy_history 
-                                                for action in record['actions'] if action['action'] == 'discharge_stationary'),
-                'v2h_total': sum(action['amount'] for record in self.energy_history 
-                                for action in record['actions'] if action['action'] == 'v2h'),
-                'neighbor_borrowed_total': sum(action['amount'] for record in self.energy_history 
-                                             for action in record['actions'] if action['action'] == 'borrow_neighbors'),
-                'grid_supply_total': sum(action['amount'] for record in self.energy_history 
-                                       for action in record['actions'] if action['action'] == 'grid_supply')
+                'stationary_discharge_total': totals.total('discharge_stationary'),
+                'v2h_total': totals.total('v2h'),
+                'neighbor_borrowed_total': totals.total('borrow_neighbors'),
+                'grid_supply_total': totals.total('grid_supply')
             }
         }
-    
\ No newline at end of file
+
+    def get_energy_rollups(self, granularity: str = 'hour', start: Optional[str] = None,
+                           end: Optional[str] = None) -> List[Dict]:
+        """Per-hour or per-day energy totals (see `EnergyTotals.get_rollups`)"""
+        return self.energy_totals.get_rollups(granularity, start, end)
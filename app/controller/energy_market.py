@@ -0,0 +1,208 @@
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+import heapq
+from ..models import EnergyTransaction, EnergyTransactionType, FirebaseManager, User, WriteOp, WriteResult
+from .energy_controller import EnergyManagementSystem
+
+# Prices in currency units per kWh
+DEFAULT_GRID_PRICE = 0.25  # what a buyer pays the grid, so the most it bids to a neighbor
+DEFAULT_SHARING_PRICE = 0.10  # ask of users without an `energy_sharing_price`
+
+TRANSACTIONS_COLLECTION = 'energy_transactions'
+
+
+@dataclass
+class MarketMember:
+    """A house taking part in the neighborhood market, and the user trading for it"""
+    user: User
+    system: EnergyManagementSystem
+
+
+@dataclass
+class Trade:
+    seller: int  # index in EnergyMarket.members
+    buyer: int
+    amount: float  # kWh
+    price: float  # per kWh
+
+
+@dataclass
+class MarketStep:
+    trades: List[Trade]
+    transactions: List[EnergyTransaction]
+    records: List[Dict]  # manage_energy record of every member
+    offered: float = 0.0  # kWh offered by sellers
+    requested: float = 0.0  # kWh requested by buyers
+    cleared: float = 0.0  # kWh traded
+
+    @property
+    def volume(self) -> float:
+        return sum(trade.amount * trade.price for trade in self.trades)
+
+
+def clear_orders(asks: List[Tuple[float, int, float]], bids: List[Tuple[float, int, float]]) -> List[Trade]:
+    """
+    Heap-based double auction. `asks` are (price, member, kWh) offers and
+    `bids` (price, member, kWh) requests. The cheapest ask is matched with the
+    highest bid as long as the ask does not exceed the bid; trades are made
+    at the seller's price. Partially filled orders stay at the top of their
+    heap, so clearing n orders takes O(n log n).
+    """
+    ask_heap = [(price, member) for price, member, amount in asks if amount > 0]
+    bid_heap = [(-price, member) for price, member, amount in bids if amount > 0]
+    left = {member: amount for _, member, amount in asks}
+    wanted = {member: amount for _, member, amount in bids}
+    heapq.heapify(ask_heap)
+    heapq.heapify(bid_heap)
+
+    trades = []
+    while ask_heap and bid_heap:
+        ask_price, seller = ask_heap[0]
+        bid_price, buyer = bid_heap[0]
+        if ask_price > -bid_price:
+            break
+        amount = min(left[seller], wanted[buyer])
+        trades.append(Trade(seller, buyer, amount, ask_price))
+        left[seller] -= amount
+        wanted[buyer] -= amount
+        if left[seller] <= 0:
+            heapq.heappop(ask_heap)
+        if wanted[buyer] <= 0:
+            heapq.heappop(bid_heap)
+    return trades
+
+
+@dataclass
+class EnergyMarket:
+    """
+    Neighborhood market clearing the surplus and deficit of many houses each step.
+
+    `step` asks every house what it would share or need once its own
+    batteries are used (`EnergyManagementSystem.neighbor_balance`), clears
+    the orders with `clear_orders` and then runs `manage_energy` for every
+    house with the cleared amounts as its neighbor allocation, so the
+    battery -> neighbors -> grid priorities still apply.
+
+    Sellers honor their user's settings: no more than `max_energy_share` kWh
+    per step, nothing while the stationary battery is below
+    `min_battery_reserve` percent, and an ask of `energy_sharing_price`.
+    Buyers bid the grid price. Houses with neighbor sharing disabled only buy.
+    """
+    members: List[MarketMember]
+    grid_price: float = DEFAULT_GRID_PRICE
+    default_sharing_price: float = DEFAULT_SHARING_PRICE
+    history: List[MarketStep] = field(default_factory=list)
+    keep_history: bool = False
+
+    def add_member(self, user: User, system: EnergyManagementSystem):
+        self.members.append(MarketMember(user, system))
+
+    def _ask(self, member: MarketMember, surplus: float) -> float:
+        user, system = member.user, member.system
+        if not system.energy_distributor.neighbor_sharing_enabled:
+            return 0.0
+        if user.min_battery_reserve is not None:
+            battery = system.stationary_battery
+            if battery.capacity <= 0 or battery.current_charge / battery.capacity * 100 < user.min_battery_reserve:
+                return 0.0
+        if user.max_energy_share is not None:
+            surplus = min(surplus, user.max_energy_share)
+        return surplus
+
+    def collect_orders(self, duration_hours: float,
+                       timestamp: Optional[datetime] = None) -> Tuple[List[Tuple[float, int, float]], List[Tuple[float, int, float]]]:
+        """(asks, bids) of every member for the next `duration_hours` from `timestamp` (default now)"""
+        asks, bids = [], []
+        default_price = self.default_sharing_price
+        for i, member in enumerate(self.members):
+            balance = member.system.neighbor_balance(duration_hours, timestamp)
+            if balance > 0:
+                amount = self._ask(member, balance)
+                if amount > 0:
+                    price = member.user.energy_sharing_price
+                    asks.append((default_price if price is None else price, i, amount))
+            elif balance < 0:
+                bids.append((self.grid_price, i, -balance))
+        return asks, bids
+
+    def step(self, duration_hours: float, weather_data: Optional[Dict] = None,
+             timestamp: Optional[datetime] = None) -> MarketStep:
+        """
+        Clear one step and run `manage_energy` for every member. Sellers run
+        first; if one hands over less than it sold, its trades are scaled down
+        so that buyers are only credited the energy actually delivered.
+        """
+        timestamp = timestamp or datetime.now(timezone.utc)
+        weather_data = weather_data or {}
+        asks, bids = self.collect_orders(duration_hours, timestamp)
+        trades = clear_orders(asks, bids)
+
+        sold = [0.0] * len(self.members)
+        for trade in trades:
+            sold[trade.seller] += trade.amount
+
+        records: List[Optional[Dict]] = [None] * len(self.members)
+        delivered = [0.0] * len(self.members)
+        for i in (i for i, amount in enumerate(sold) if amount > 0):
+            records[i] = self._manage(self.members[i], duration_hours, weather_data, timestamp, allocation=sold[i])
+            delivered[i] = sum(a['amount'] for a in records[i]['actions'] if a['action'] == 'share_neighbors')
+        trades = [
+            Trade(trade.seller, trade.buyer, trade.amount * delivered[trade.seller] / sold[trade.seller], trade.price)
+            for trade in trades if delivered[trade.seller] > 0
+        ]
+
+        bought = [0.0] * len(self.members)
+        for trade in trades:
+            bought[trade.buyer] += trade.amount
+        for i, member in enumerate(self.members):
+            if records[i] is None:
+                records[i] = self._manage(member, duration_hours, weather_data, timestamp, credit=bought[i])
+
+        result = MarketStep(
+            trades=trades,
+            transactions=self.transactions(trades, timestamp),
+            records=records,
+            offered=sum(amount for _, _, amount in asks),
+            requested=sum(amount for _, _, amount in bids),
+            cleared=sum(delivered),
+        )
+        if self.keep_history:
+            self.history.append(result)
+        return result
+
+    @staticmethod
+    def _manage(member: MarketMember, duration_hours: float, weather_data: Dict, timestamp: datetime,
+                allocation: float = 0.0, credit: float = 0.0) -> Dict:
+        """`manage_energy` of one member selling `allocation` kWh or buying up to `credit` kWh"""
+        distributor = member.system.energy_distributor
+        distributor.neighbor_allocation = allocation
+        try:
+            return member.system.manage_energy(duration_hours, weather_data,
+                                               lambda deficit: min(deficit, credit), timestamp)
+        finally:
+            distributor.neighbor_allocation = None
+
+    def transactions(self, trades: List[Trade], timestamp: datetime) -> List[EnergyTransaction]:
+        """One NEIGHBOR_TO_HOUSE transaction per trade, all with the same timestamp"""
+        users = [member.user.id for member in self.members]
+        return [
+            EnergyTransaction(
+                timestamp=timestamp,
+                transaction_type=EnergyTransactionType.NEIGHBOR_TO_HOUSE,
+                amount=trade.amount,
+                source_id=users[trade.seller],
+                destination_id=users[trade.buyer],
+                cost=trade.amount * trade.price,
+            )
+            for trade in trades
+        ]
+
+    @staticmethod
+    def save_transactions(transactions: List[EnergyTransaction],
+                          manager: Optional[FirebaseManager] = None) -> List[WriteResult]:
+        """Write transactions to Firestore in batched commits"""
+        manager = manager or FirebaseManager()
+        ops = [WriteOp('create', TRANSACTIONS_COLLECTION, data=transaction.to_dict())
+               for transaction in transactions]
+        return manager.bulk_write(ops)
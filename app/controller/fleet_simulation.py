@@ -0,0 +1,209 @@
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Sequence
+import numpy as np
+from .energy_controller import (
+    CHARGE_BELOW_SOC, DISCHARGE_ABOVE_SOC, STATIONARY_RESERVE, DEFAULT_V2H_MIN_SOC, NEIGHBOR_CAPACITY
+)
+
+SURPLUS_ACTIONS = ('charge_ev', 'charge_stationary', 'share_neighbors', 'export_grid')
+DEFICIT_ACTIONS = ('discharge_stationary', 'v2h', 'borrow_neighbors', 'grid_supply')
+ACTIONS = SURPLUS_ACTIONS + DEFICIT_ACTIONS
+
+
+def _efficiency(values: Sequence[Optional[float]]) -> np.ndarray:
+    """Charging efficiency as a fraction; unset (None/0) means lossless"""
+    return np.array([(value or 100.0) / 100.0 for value in values], dtype=float)
+
+
+@dataclass
+class FleetResult:
+    """Per-house totals of a `FleetSimulation.run`, and the SOC traces when recorded"""
+    steps: int
+    totals: Dict[str, np.ndarray]
+    battery_soc: Optional[np.ndarray] = None  # (steps, houses), fraction after each step
+    ev_soc: Optional[np.ndarray] = None
+
+    def fleet_totals(self) -> Dict[str, float]:
+        return {action: float(amounts.sum()) for action, amounts in self.totals.items()}
+
+
+@dataclass
+class FleetSimulation:
+    """
+    `EnergyManagementSystem.manage_energy` for many houses at once.
+
+    Battery state is held in arrays indexed by house, and every step applies
+    the same priority rules as the scalar controller as masked array
+    operations: surplus goes to the EV, the stationary battery, the
+    neighbors and then the grid; a deficit is covered by the stationary
+    battery, V2H, the neighbors and then the grid. Houses without an EV have
+    `ev_capacity` 0.
+    """
+    battery_capacity: np.ndarray
+    battery_charge: np.ndarray
+    ev_capacity: np.ndarray
+    ev_charge: np.ndarray
+    battery_efficiency: Optional[np.ndarray] = None
+    ev_efficiency: Optional[np.ndarray] = None
+    v2h_enabled: Optional[np.ndarray] = None
+    v2h_min_soc: Optional[np.ndarray] = None
+    neighbor_sharing: Optional[np.ndarray] = None
+    grid_connection: Optional[np.ndarray] = None
+    neighbor_capacity: float = NEIGHBOR_CAPACITY
+    totals: Dict[str, np.ndarray] = field(init=False)
+
+    def __post_init__(self):
+        self.battery_capacity = np.asarray(self.battery_capacity, dtype=float)
+        self.battery_charge = np.array(self.battery_charge, dtype=float)
+        self.ev_capacity = np.asarray(self.ev_capacity, dtype=float)
+        self.ev_charge = np.array(self.ev_charge, dtype=float)
+        n = self.houses
+        self.battery_efficiency = self._default(self.battery_efficiency, 1.0, float)
+        self.ev_efficiency = self._default(self.ev_efficiency, 1.0, float)
+        self.v2h_enabled = self._default(self.v2h_enabled, False, bool)
+        self.v2h_min_soc = self._default(self.v2h_min_soc, DEFAULT_V2H_MIN_SOC, float)
+        self.neighbor_sharing = self._default(self.neighbor_sharing, False, bool)
+        self.grid_connection = self._default(self.grid_connection, True, bool)
+        self.has_battery = self.battery_capacity > 0
+        self.has_ev = self.ev_capacity > 0
+        # capacities of 0 are replaced by 1 where they are only used as divisors
+        self._battery_divisor = np.where(self.has_battery, self.battery_capacity, 1.0)
+        self._ev_divisor = np.where(self.has_ev, self.ev_capacity, 1.0)
+        # gates that do not change between steps
+        self._ev_v2h = self.has_ev & self.v2h_enabled
+        self._totals = np.zeros((len(ACTIONS), n))
+        self.totals = dict(zip(ACTIONS, self._totals))  # views on the rows of _totals
+
+    def _default(self, values, default, dtype) -> np.ndarray:
+        if values is None:
+            return np.full(self.houses, default, dtype=dtype)
+        return np.asarray(values, dtype=dtype)
+
+    @property
+    def houses(self) -> int:
+        return len(self.battery_capacity)
+
+    @classmethod
+    def from_systems(cls, systems: List) -> 'FleetSimulation':
+        """Fleet holding the batteries and settings of `EnergyManagementSystem` instances"""
+        evs = [system.ev_battery for system in systems]
+        distributors = [system.energy_distributor for system in systems]
+        return cls(
+            battery_capacity=[system.stationary_battery.capacity for system in systems],
+            battery_charge=[system.stationary_battery.current_charge for system in systems],
+            ev_capacity=[ev.capacity if ev else 0.0 for ev in evs],
+            ev_charge=[ev.current_charge if ev else 0.0 for ev in evs],
+            battery_efficiency=_efficiency([system.stationary_battery.efficiency for system in systems]),
+            ev_efficiency=_efficiency([ev.efficiency if ev else None for ev in evs]),
+            v2h_enabled=[system.v2h_enabled for system in systems],
+            v2h_min_soc=[system.v2h_controller.min_soc for system in systems],
+            neighbor_sharing=[d.neighbor_sharing_enabled for d in distributors],
+            grid_connection=[d.grid_connection_enabled for d in distributors],
+        )
+
+    def write_back(self, systems: List):
+        """Copy battery charges and neighbor/grid totals back to the systems the fleet was built from"""
+        shared, exported = self.totals['share_neighbors'], self.totals['export_grid']
+        for i, system in enumerate(systems):
+            system.stationary_battery.current_charge = float(self.battery_charge[i])
+            if system.ev_battery:
+                system.ev_battery.current_charge = float(self.ev_charge[i])
+            system.energy_distributor.energy_shared_to_neighbors += float(shared[i])
+            system.energy_distributor.energy_exported_to_grid += float(exported[i])
+
+    @staticmethod
+    def _charge(capacity, charge, efficiency, energy, mask, out):
+        """Energy taken from `energy` to charge the masked batteries (charge is updated in place)"""
+        np.minimum(energy, (capacity - charge) / efficiency, out=out)
+        out *= mask & (out > 0)
+        charge += out * efficiency
+        np.minimum(charge, capacity, out=charge)
+
+    @staticmethod
+    def _discharge(capacity, charge, reserve, energy, mask, out):
+        """Energy the masked batteries provide toward `energy`, down to `reserve` of their capacity"""
+        np.minimum(energy, charge - capacity * reserve, out=out)
+        out *= mask & (out > 0)
+        charge -= out
+
+    def step(self, produced: np.ndarray, consumed: np.ndarray,
+             request_energy_from_neighbor: Optional[Callable[[np.ndarray], np.ndarray]] = None
+             ) -> Dict[str, np.ndarray]:
+        """
+        One time step for every house; `produced`/`consumed` are kWh per house.
+        `request_energy_from_neighbor` gets the deficit left per house (0 for
+        houses without one) and returns the kWh each house borrowed.
+        Returns the kWh moved by each action, per house.
+        """
+        moved = np.empty_like(self._totals)
+        charge_ev, charge_stationary, share, export, discharge_stationary, v2h, borrow, grid_supply = moved
+        balance = np.subtract(produced, consumed)
+        in_surplus = balance > 0
+        surplus = balance * in_surplus
+        deficit = balance * ~in_surplus
+        np.negative(deficit, out=deficit)
+
+        battery_soc = self.battery_charge / self._battery_divisor
+        self._charge(self.ev_capacity, self.ev_charge, self.ev_efficiency, surplus,
+                     in_surplus & self.has_ev & (self.ev_charge / self._ev_divisor < CHARGE_BELOW_SOC), charge_ev)
+        surplus -= charge_ev
+        self._charge(self.battery_capacity, self.battery_charge, self.battery_efficiency, surplus,
+                     (surplus > 0) & self.has_battery & (battery_soc < CHARGE_BELOW_SOC), charge_stationary)
+        surplus -= charge_stationary
+        np.minimum(surplus, self.neighbor_capacity, out=share)
+        share *= (surplus > 0) & self.neighbor_sharing
+        surplus -= share
+        np.multiply(surplus, (surplus > 0) & self.grid_connection, out=export)
+
+        self._discharge(self.battery_capacity, self.battery_charge, STATIONARY_RESERVE, deficit,
+                        ~in_surplus & self.has_battery & (battery_soc > DISCHARGE_ABOVE_SOC), discharge_stationary)
+        deficit -= discharge_stationary
+        self._discharge(self.ev_capacity, self.ev_charge, self.v2h_min_soc, deficit,
+                        (deficit > 0) & self._ev_v2h & (self.ev_charge / self._ev_divisor > self.v2h_min_soc), v2h)
+        deficit -= v2h
+
+        borrow.fill(0.0)
+        if request_energy_from_neighbor is not None:
+            needed = deficit > 0
+            if needed.any():
+                borrowed = np.asarray(request_energy_from_neighbor(deficit * needed), dtype=float)
+                np.multiply(borrowed, needed & (borrowed > 0), out=borrow)
+                deficit -= borrow
+        np.maximum(deficit, 0.0, out=grid_supply)
+
+        self._totals += moved
+        return dict(zip(ACTIONS, moved))
+
+    def soc(self) -> Dict[str, np.ndarray]:
+        """Current state of charge (fraction) of the stationary and EV batteries"""
+        return {
+            'battery': np.where(self.has_battery, self.battery_charge / self._battery_divisor, 0.0),
+            'ev': np.where(self.has_ev, self.ev_charge / self._ev_divisor, 0.0),
+        }
+
+    def run(self, produced: np.ndarray, consumed: np.ndarray, record_soc: bool = False,
+            request_energy_from_neighbor: Optional[Callable[[np.ndarray], np.ndarray]] = None
+            ) -> FleetResult:
+        """
+        Simulate `steps` time steps from (steps, houses) arrays of produced and
+        consumed kWh. With `record_soc`, the SOC after every step is kept as
+        float32 (4 bytes per house and step per battery).
+        """
+        produced = np.asarray(produced, dtype=float)
+        consumed = np.asarray(consumed, dtype=float)
+        if produced.shape != consumed.shape or produced.ndim != 2 or produced.shape[1] != self.houses:
+            raise ValueError(f"Expected (steps, {self.houses}) arrays, got {produced.shape} and {consumed.shape}")
+        steps = produced.shape[0]
+        start = {action: amounts.copy() for action, amounts in self.totals.items()}
+        battery_soc = np.empty((steps, self.houses), dtype=np.float32) if record_soc else None
+        ev_soc = np.empty((steps, self.houses), dtype=np.float32) if record_soc else None
+
+        for t in range(steps):
+            self.step(produced[t], consumed[t], request_energy_from_neighbor)
+            if record_soc:
+                soc = self.soc()
+                battery_soc[t] = soc['battery']
+                ev_soc[t] = soc['ev']
+
+        totals = {action: self.totals[action] - start[action] for action in ACTIONS}
+        return FleetResult(steps, totals, battery_soc, ev_soc)
@@ -0,0 +1,437 @@
+import base64
+import binascii
+import json
+import os
+import struct
+from dataclasses import dataclass, field
+from enum import IntEnum
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:  # orjson is optional, json.loads also takes bytes
+    orjson = None
+    _loads = json.loads
+
+EXAMPLE_FRAME_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'arduino_data_example.json')
+PATH_SEPARATOR = '/'
+
+# Lines starting with this byte carry a base64 binary frame instead of JSON
+BINARY_PREFIX = b'#'
+BINARY_VERSION = 1
+_HEADER = struct.Struct('<BB')  # version, length of house_id
+_COUNT = struct.Struct('<H')
+_ENTRY = struct.Struct('<Hi')  # field id, value
+# Decimal fields travel as integers in hundredths (22.5 -> 2250)
+FLOAT_SCALE = 100
+
+
+class FrameError(ValueError):
+    """A line that is not a valid Arduino frame"""
+
+
+class State(IntEnum):
+    """Device and system states reported as strings in the frames"""
+    UNKNOWN = 0
+    ACTIVE = 1
+    INACTIVE = 2
+    OPEN = 3
+    CLOSED = 4
+    CHARGING = 5
+    DISCHARGING = 6
+    IDLE = 7
+
+
+_STATES = {state.name: state for state in State}
+
+# Fields of the binary format, in field-id order. Ids are part of the
+# format shared with the firmware: append new fields, never reorder.
+BINARY_FIELDS: List[Tuple[str, str]] = [
+    ('/rooms/room1/temperature', 'float'),
+    ('/rooms/room1/humidity', 'float'),
+    ('/rooms/room1/fire_detected', 'bool'),
+    ('/rooms/room1/devices/light1/status', 'state'),
+    ('/rooms/room1/devices/light1/temporsation', 'state'),
+    ('/rooms/room1/devices/light1/temporsation_duration_left', 'int'),
+    ('/rooms/room1/devices/fire_detector1/is_alarming', 'bool'),
+    ('/rooms/room1/devices/door/status', 'state'),
+    ('/rooms/room1/devices/AC/status', 'state'),
+    ('/rooms/room1/devices/AC/temporsation', 'state'),
+    ('/rooms/room1/devices/AC/temporsation_duration_left', 'int'),
+    ('/rooms/kitchen1/temperature', 'float'),
+    ('/rooms/kitchen1/humidity', 'float'),
+    ('/rooms/kitchen1/motion_detected', 'bool'),
+    ('/rooms/kitchen1/fire_detected', 'bool'),
+    ('/rooms/kitchen1/devices/light3/status', 'state'),
+    ('/rooms/kitchen1/devices/light3/power_consumption', 'int'),
+    ('/rooms/kitchen1/devices/light3/brightness_level', 'int'),
+    ('/rooms/kitchen1/devices/fire_detector2/status', 'state'),
+    ('/rooms/kitchen1/devices/fire_detector2/is_alarming', 'bool'),
+    ('/solar_system/solar1/voltage', 'float'),
+    ('/solar_system/battery1/current_charge_per_cent', 'int'),
+    ('/solar_system/battery1/charging_status', 'state'),
+    ('/total_power_consumption', 'float'),
+    ('/grid_power_usage', 'float'),
+    ('/V2H_battery', 'int'),
+]
+_FIELD_IDS = {path: (i, kind) for i, (path, kind) in enumerate(BINARY_FIELDS)}
+
+
+# Python types accepted for each kind of field
+_KIND_TYPES = {
+    'bool': frozenset({bool}),
+    'number': frozenset({int, float}),
+    'string': frozenset({str}),
+    'object': frozenset({dict}),
+}
+
+
+def _kind(value) -> str:
+    if isinstance(value, bool):
+        return 'bool'
+    if isinstance(value, (int, float)):
+        return 'number'
+    if isinstance(value, str):
+        return 'string'
+    if isinstance(value, dict):
+        return 'object'
+    return 'other'
+
+
+class FrameSchema:
+    """
+    Shape of a frame, learnt from `arduino_data_example.json`.
+
+    A frame must be an object with a string `house_id` and an object
+    `rooms` of objects (with an optional `devices` object of objects). Any
+    field present in the example must keep its type (number, bool, string
+    or object) wherever it appears; fields unknown to the example are
+    accepted as they are.
+    """
+
+    def __init__(self, kinds: Dict[str, str]):
+        self.kinds = kinds
+        self._types = {key: _KIND_TYPES[kind] for key, kind in kinds.items() if kind in _KIND_TYPES}
+
+    @classmethod
+    def from_example(cls, path: str = EXAMPLE_FRAME_PATH) -> 'FrameSchema':
+        with open(path) as f:
+            example = json.load(f)
+        kinds: Dict[str, str] = {}
+
+        def walk(node):
+            for key, value in node.items():
+                kinds.setdefault(key, _kind(value))
+                if isinstance(value, dict):
+                    walk(value)
+        # Room and device names are free, their content is what is checked
+        walk({k: v for k, v in example.items() if k != 'rooms'})
+        for room in example.get('rooms', {}).values():
+            walk({k: v for k, v in room.items() if k != 'devices'})
+            for device in room.get('devices', {}).values():
+                walk(device)
+        return cls(kinds)
+
+    def errors(self, frame: Any) -> List[str]:
+        """Problems found in a decoded frame, empty when it is valid"""
+        if not isinstance(frame, dict):
+            return ['frame is not an object']
+        errors = []
+        if 'house_id' not in frame:
+            errors.append('house_id is required')
+        rooms = frame.get('rooms')
+        if not isinstance(rooms, dict):
+            errors.append('rooms must be an object')
+            rooms = {}
+        self._check(frame, '', errors, skip='rooms')
+        for name, room in rooms.items():
+            path = f'/rooms/{name}'
+            if not isinstance(room, dict):
+                errors.append(f'{path} must be an object')
+                continue
+            self._check(room, path, errors, skip='devices')
+            devices = room.get('devices', {})
+            if not isinstance(devices, dict):
+                errors.append(f'{path}/devices must be an object')
+                continue
+            for device_name, device in devices.items():
+                if not isinstance(device, dict):
+                    errors.append(f'{path}/devices/{device_name} must be an object')
+                else:
+                    self._check(device, f'{path}/devices/{device_name}', errors)
+        return errors
+
+    def _check(self, node: Dict[str, Any], path: str, errors: List[str], skip: Optional[str] = None):
+        types = self._types
+        for key, value in node.items():
+            allowed = types.get(key)
+            if allowed is None or key == skip:
+                continue
+            cls = value.__class__
+            if cls is dict:
+                if cls in allowed:
+                    self._check(value, f'{path}/{key}', errors)
+                else:
+                    errors.append(f'{path}/{key} must be a {self.kinds[key]}')
+            elif cls not in allowed and value is not None:
+                errors.append(f'{path}/{key} must be a {self.kinds[key]}')
+
+
+DEFAULT_SCHEMA = FrameSchema.from_example()
+
+
+@lru_cache(maxsize=4096)
+def _path_keys(path: str) -> Tuple[str, ...]:
+    return tuple(path.split(PATH_SEPARATOR)[1:])
+
+
+@dataclass
+class FrameRecord:
+    """
+    Flat, typed view of a frame
+
+    `values` holds the numeric sensor readings and `flags` the booleans,
+    `states` the state strings mapped to `State`, `text` any other string,
+    all keyed by path ('/rooms/room1/temperature').
+    """
+    house_id: str
+    values: Dict[str, float] = field(default_factory=dict)
+    flags: Dict[str, bool] = field(default_factory=dict)
+    states: Dict[str, State] = field(default_factory=dict)
+    text: Dict[str, str] = field(default_factory=dict)
+    timestamp: Optional[str] = None
+
+    @classmethod
+    def from_frame(cls, frame: Dict[str, Any]) -> 'FrameRecord':
+        record = cls(house_id=frame.get('house_id', ''), timestamp=frame.get('timestamp'))
+        values, flags, states, text = record.values, record.flags, record.states, record.text
+
+        def walk(node, prefix):
+            for key, value in node.items():
+                path = f'{prefix}{PATH_SEPARATOR}{key}'
+                if isinstance(value, dict):
+                    walk(value, path)
+                elif isinstance(value, bool):
+                    flags[path] = value
+                elif isinstance(value, (int, float)):
+                    values[path] = value
+                elif isinstance(value, str):
+                    state = _STATES.get(value.upper())
+                    if state is not None:
+                        states[path] = state
+                    else:
+                        text[path] = value
+
+        walk({k: v for k, v in frame.items() if k not in ('house_id', 'timestamp')}, '')
+        return record
+
+    def to_frame(self) -> Dict[str, Any]:
+        """Nested frame in the `arduino_data_example.json` layout"""
+        frame: Dict[str, Any] = {'house_id': self.house_id}
+        if self.timestamp is not None:
+            frame['timestamp'] = self.timestamp
+        for items in (self.values.items(), self.flags.items(), self.text.items(),
+                      ((path, state.name) for path, state in self.states.items())):
+            for path, value in items:
+                keys = _path_keys(path)
+                node = frame
+                for key in keys[:-1]:
+                    node = node.setdefault(key, {})
+                node[keys[-1]] = value
+        return frame
+
+
+def encode_binary(record: FrameRecord) -> bytes:
+    """
+    Binary line for a record: `#` + base64(version, house_id, (field id, int32)...)
+
+    Integers, booleans (0/1) and states (`State` values) are sent as they
+    are, decimal fields as hundredths.
+
+    Only fields of `BINARY_FIELDS` are encoded; this is the reference for
+    the firmware side and for the simulator.
+    """
+    house_id = record.house_id.encode('utf-8')
+    entries = []
+    for path, value in record.values.items():
+        known = _FIELD_IDS.get(path)
+        if known is not None:
+            field_id, kind = known
+            entries.append(_ENTRY.pack(field_id, round(value * FLOAT_SCALE) if kind == 'float' else int(value)))
+    for path, flag in record.flags.items():
+        known = _FIELD_IDS.get(path)
+        if known is not None:
+            entries.append(_ENTRY.pack(known[0], int(flag)))
+    for path, state in record.states.items():
+        known = _FIELD_IDS.get(path)
+        if known is not None:
+            entries.append(_ENTRY.pack(known[0], int(state)))
+    payload = _HEADER.pack(BINARY_VERSION, len(house_id)) + house_id + _COUNT.pack(len(entries)) + b''.join(entries)
+    return BINARY_PREFIX + base64.b64encode(payload)
+
+
+_STATE_LIST = list(State)
+_STATE_NAMES = [state.name for state in _STATE_LIST]
+
+
+def _as_state(value: int) -> State:
+    return _STATE_LIST[value] if 0 <= value < len(_STATE_LIST) else State.UNKNOWN
+
+
+def _as_state_name(value: int) -> str:
+    return _STATE_NAMES[value] if 0 <= value < len(_STATE_NAMES) else State.UNKNOWN.name
+
+
+_RECORD_ATTRS = {'float': 'values', 'int': 'values', 'bool': 'flags', 'state': 'states'}
+
+# Decoders compiled per layout (sequence of field ids) seen on the wire;
+# a firmware sends the same layout in every frame
+_layouts: Dict[bytes, Tuple[Any, Any, Any]] = {}
+MAX_LAYOUTS = 64
+
+
+def _literal(node: Dict[str, Any]) -> str:
+    items = (f'{key!r}: {_literal(value) if isinstance(value, dict) else value}' for key, value in node.items())
+    return '{' + ', '.join(items) + '}'
+
+
+def _compile_layout(field_ids: List[int]):
+    """
+    (unpack, build_frame, build_record) for binary frames carrying these
+    fields in this order, generated as single dict literals
+    """
+    tree: Dict[str, Any] = {'house_id': 'house_id'}
+    record = {'values': [], 'flags': [], 'states': []}
+    for position, field_id in enumerate(field_ids):
+        if field_id >= len(BINARY_FIELDS):
+            continue  # field from a newer firmware
+        path, kind = BINARY_FIELDS[field_id]
+        value = f'v[{2 * position + 1}]'
+        if kind == 'float':
+            value = f'{value} / {FLOAT_SCALE}'
+        elif kind == 'bool':
+            value = f'{value} != 0'
+        keys = _path_keys(path)
+        node = tree
+        for key in keys[:-1]:
+            node = node.setdefault(key, {})
+        node[keys[-1]] = f'_state_name({value})' if kind == 'state' else value
+        record[_RECORD_ATTRS[kind]].append(f'{path!r}: ' + (f'_state({value})' if kind == 'state' else value))
+
+    source = (
+        'def build_frame(house_id, v):\n'
+        f'    return {_literal(tree)}\n'
+        'def build_record(house_id, v):\n'
+        f"    return _Record(house_id, {{{', '.join(record['values'])}}}, "
+        f"{{{', '.join(record['flags'])}}}, {{{', '.join(record['states'])}}})\n"
+    )
+    namespace = {'_state': _as_state, '_state_name': _as_state_name, '_Record': FrameRecord}
+    exec(source, namespace)
+    unpack = struct.Struct('<' + 'Hi' * len(field_ids)).unpack
+    return unpack, namespace['build_frame'], namespace['build_record']
+
+
+def _layout(body: bytes):
+    signature = body[0::_ENTRY.size] + body[1::_ENTRY.size]
+    layout = _layouts.get(signature)
+    if layout is None:
+        field_ids = [field_id for field_id, _ in _ENTRY.iter_unpack(body)]
+        layout = _compile_layout(field_ids)
+        if len(_layouts) < MAX_LAYOUTS:
+            _layouts[signature] = layout
+    return layout
+
+
+def _decode_payload(line: bytes) -> Tuple[str, bytes]:
+    """house_id and the (field id, value) entries of a binary line"""
+    try:
+        payload = base64.b64decode(line[len(BINARY_PREFIX):], validate=True)
+        version, id_length = _HEADER.unpack_from(payload)
+        if version != BINARY_VERSION:
+            raise FrameError(f'unsupported binary frame version {version}')
+        offset = _HEADER.size
+        house_id = payload[offset:offset + id_length].decode('utf-8')
+        offset += id_length
+        count, = _COUNT.unpack_from(payload, offset)
+        offset += _COUNT.size
+        body = payload[offset:offset + count * _ENTRY.size]
+        if len(body) != count * _ENTRY.size:
+            raise FrameError('truncated binary frame')
+    except (binascii.Error, struct.error, UnicodeDecodeError) as e:
+        raise FrameError(f'invalid binary frame: {e}') from e
+    return house_id, body
+
+
+def decode_binary(line: bytes) -> FrameRecord:
+    house_id, body = _decode_payload(line)
+    unpack, _, build_record = _layout(body)
+    return build_record(house_id, unpack(body))
+
+
+def decode_binary_frame(line: bytes) -> Dict[str, Any]:
+    """Nested frame of a binary line, built without going through a `FrameRecord`"""
+    house_id, body = _decode_payload(line)
+    unpack, build_frame, _ = _layout(body)
+    return build_frame(house_id, unpack(body))
+
+
+class FrameParser:
+    """
+    Turns raw lines from the Arduino into frames.
+
+    JSON lines are decoded straight from bytes (with orjson when it is
+    installed) and checked against `schema`; lines starting with `#` use
+    the compact binary format. Invalid lines raise `FrameError` and are
+    counted.
+    """
+
+    def __init__(self, schema: Optional[FrameSchema] = DEFAULT_SCHEMA):
+        self.schema = schema
+        self.json_frames = 0
+        self.binary_frames = 0
+        self.invalid_frames = 0
+
+    def parse(self, line: bytes) -> Dict[str, Any]:
+        """Frame as a nested dict, like the JSON lines"""
+        if line[:1] == BINARY_PREFIX:
+            try:
+                frame = decode_binary_frame(line)
+            except FrameError:
+                self.invalid_frames += 1
+                raise
+            self.binary_frames += 1
+            return frame
+        try:
+            frame = _loads(line)
+        except ValueError as e:
+            self.invalid_frames += 1
+            raise FrameError(f'invalid JSON: {e}') from e
+        if self.schema is not None:
+            errors = self.schema.errors(frame)
+            if errors:
+                self.invalid_frames += 1
+                raise FrameError('; '.join(errors))
+        self.json_frames += 1
+        return frame
+
+    def parse_record(self, line: bytes) -> FrameRecord:
+        """Frame as a flat `FrameRecord`"""
+        if line[:1] == BINARY_PREFIX:
+            try:
+                record = decode_binary(line)
+            except FrameError:
+                self.invalid_frames += 1
+                raise
+            self.binary_frames += 1
+            return record
+        return FrameRecord.from_frame(self.parse(line))
+
+    def stats(self) -> dict:
+        return {
+            'json_frames': self.json_frames,
+            'binary_frames': self.binary_frames,
+            'invalid_frames': self.invalid_frames,
+            'orjson': orjson is not None,
+        }
@@ -0,0 +1,292 @@
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Hashable, List, Optional
+
+
+class FrameRing:
+    """
+    Bounded ring buffer of raw lines received from the Arduino.
+
+    The ring never blocks its writer: once it is full the oldest line is
+    overwritten. Every consumer reads through its own cursor, so a slow
+    consumer only loses the lines it did not read in time and never holds
+    up the reader thread or the other consumers.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+        self._frames: List[Optional[bytes]] = [None] * capacity
+        self._next_seq = 0
+        self._cond = threading.Condition()
+        self.overwritten = 0  # lines evicted because the ring was full
+
+    @property
+    def next_seq(self) -> int:
+        """Sequence number the next appended line will get"""
+        return self._next_seq
+
+    def append(self, frame: bytes) -> int:
+        """Store a line and wake up the waiting consumers"""
+        with self._cond:
+            seq = self._next_seq
+            if seq >= self.capacity:
+                self.overwritten += 1
+            self._frames[seq % self.capacity] = frame
+            self._next_seq = seq + 1
+            self._cond.notify_all()
+            return seq
+
+    def read(self, cursor: int, max_items: int, timeout: Optional[float] = None):
+        """
+        Read up to `max_items` lines starting at `cursor`
+
+        Waits up to `timeout` seconds when there is nothing new.
+        Returns (lines, next_cursor, dropped) where `dropped` is the number
+        of lines that were overwritten before this cursor reached them.
+        """
+        with self._cond:
+            if cursor >= self._next_seq and timeout != 0:
+                self._cond.wait_for(lambda: cursor < self._next_seq, timeout)
+
+            oldest = max(0, self._next_seq - self.capacity)
+            dropped = 0
+            if cursor < oldest:
+                dropped = oldest - cursor
+                cursor = oldest
+
+            end = min(self._next_seq, cursor + max_items)
+            frames = [self._frames[seq % self.capacity] for seq in range(cursor, end)]
+            return frames, end, dropped
+
+    def subscribe(self, from_latest: bool = True) -> 'RingConsumer':
+        """Create an independent consumer, by default starting at new lines only"""
+        with self._cond:
+            start = self._next_seq if from_latest else max(0, self._next_seq - self.capacity)
+        return RingConsumer(self, start)
+
+
+class RingConsumer:
+    """Independent read cursor over a `FrameRing`"""
+
+    def __init__(self, ring: FrameRing, cursor: int = 0):
+        self.ring = ring
+        self.cursor = cursor
+        self.received = 0
+        self.dropped = 0  # lines lost because this consumer fell behind
+
+    def get_batch(self, max_items: int = 64, timeout: Optional[float] = None) -> List[bytes]:
+        """Return the next pending lines, waiting up to `timeout` for the first one"""
+        frames, self.cursor, dropped = self.ring.read(self.cursor, max_items, timeout)
+        self.dropped += dropped
+        self.received += len(frames)
+        return frames
+
+    def get(self, timeout: Optional[float] = None) -> Optional[bytes]:
+        """Return the next line, or None if nothing arrived within `timeout`"""
+        frames = self.get_batch(1, timeout)
+        return frames[0] if frames else None
+
+    def stats(self) -> dict:
+        return {
+            'received': self.received,
+            'dropped': self.dropped,
+            'lag': self.ring.next_seq - self.cursor,
+        }
+
+
+class SerialReader(threading.Thread):
+    """
+    Dedicated thread that frames the bytes coming from the Arduino into lines.
+
+    It blocks in the transport's `read_chunk` until data arrives (bounded
+    by the transport timeout) instead of polling `readline`, splits the
+    stream on newlines and appends every non-empty line to the ring buffer.
+    """
+
+    def __init__(self, port, ring: FrameRing, max_line_length: int = 4096):
+        super().__init__(name='arduino-serial-reader', daemon=True)
+        self.port = port
+        self.ring = ring
+        self.max_line_length = max_line_length
+        self._stop_event = threading.Event()
+        self.lines_read = 0
+        self.bytes_read = 0
+        self.oversized_dropped = 0  # lines dropped for exceeding max_line_length
+        self.read_errors = 0
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        pending = bytearray()
+        while not self._stop_event.is_set():
+            try:
+                chunk = self.port.read_chunk()
+            except Exception as e:
+                self.read_errors += 1
+                print(f"Error reading from Arduino: {e}")
+                time.sleep(0.5)
+                continue
+            if not chunk:
+                continue
+
+            self.bytes_read += len(chunk)
+            pending += chunk
+            start = 0
+            while True:
+                end = pending.find(b'\n', start)
+                if end < 0:
+                    break
+                line = bytes(pending[start:end]).strip()
+                start = end + 1
+                if len(line) > self.max_line_length:
+                    self.oversized_dropped += 1
+                elif line:
+                    self.lines_read += 1
+                    self.ring.append(line)
+            del pending[:start]
+
+            if len(pending) > self.max_line_length:
+                # No newline in sight: discard the runaway partial line
+                self.oversized_dropped += 1
+                pending.clear()
+
+    def stats(self) -> dict:
+        return {
+            'lines_read': self.lines_read,
+            'bytes_read': self.bytes_read,
+            'oversized_dropped': self.oversized_dropped,
+            'read_errors': self.read_errors,
+            'ring_capacity': self.ring.capacity,
+            'ring_overwritten': self.ring.overwritten,
+        }
+
+
+class _PendingCommand:
+    __slots__ = ('priority', 'seq', 'key', 'message', 'futures')
+
+    def __init__(self, priority: int, seq: int, key: Optional[Hashable], message: str, future: Future):
+        self.priority = priority
+        self.seq = seq
+        self.key = key
+        self.message = message
+        self.futures = [future]
+
+    def __lt__(self, other: '_PendingCommand') -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class CommandWriter(threading.Thread):
+    """
+    Single writer thread that owns the serial line for outgoing commands.
+
+    Commands are written one at a time, lowest priority value first and in
+    submission order within a priority. A command that targets the same key
+    (device and room) as one still waiting in the queue replaces it, so an
+    on/off/on burst inside one flush window reaches the Arduino as a single
+    write. With a `terminator` such as a newline, every command is followed
+    by it so the Arduino can tell back-to-back commands apart; by default
+    commands are sent as they are. Callers get a `Future` resolving to the
+    usual status dictionary.
+    """
+
+    def __init__(self, port,
+                 priority_of: Callable[[str], int],
+                 key_of: Callable[[str], Optional[Hashable]],
+                 flush_window: float = 0.02,
+                 terminator: bytes = b''):
+        super().__init__(name='arduino-command-writer', daemon=True)
+        self.port = port
+        self.priority_of = priority_of
+        self.key_of = key_of
+        self.flush_window = flush_window
+        self.terminator = terminator
+        self._heap: List[_PendingCommand] = []
+        self._by_key = {}
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._stop_event = threading.Event()
+        self.written = 0
+        self.coalesced = 0
+        self.write_errors = 0
+
+    def submit(self, message: str) -> Future:
+        """Queue a command and return a future for its write result"""
+        future = Future()
+        key = self.key_of(message)
+        with self._cond:
+            pending = self._by_key.get(key) if key is not None else None
+            if pending is not None:
+                pending.message = message
+                pending.futures.append(future)
+                self.coalesced += 1
+            else:
+                pending = _PendingCommand(self.priority_of(message), next(self._seq), key, message, future)
+                heapq.heappush(self._heap, pending)
+                if key is not None:
+                    self._by_key[key] = pending
+                self._cond.notify()
+        return future
+
+    def stop(self):
+        self._stop_event.set()
+        with self._cond:
+            self._cond.notify()
+
+    def _next_command(self) -> Optional[_PendingCommand]:
+        with self._cond:
+            if not self._heap:
+                return None
+            command = heapq.heappop(self._heap)
+            if command.key is not None:
+                del self._by_key[command.key]
+            return command
+
+    def run(self):
+        while not self._stop_event.is_set():
+            with self._cond:
+                self._cond.wait_for(lambda: self._heap or self._stop_event.is_set())
+            if self._stop_event.is_set():
+                break
+            # Let a burst of commands accumulate so it can be coalesced
+            if self.flush_window:
+                time.sleep(self.flush_window)
+
+            command = self._next_command()
+            while command is not None:
+                self._write(command)
+                command = self._next_command()
+
+    def _write(self, command: _PendingCommand):
+        try:
+            data = command.message.encode('utf-8')
+            if self.terminator and not data.endswith(self.terminator):
+                data += self.terminator
+            self.port.write(data)
+            self.written += 1
+            print(f"Message sent to Arduino: {command.message}")
+            result = {"status": "success", "message": "Message sent to Arduino."}
+        except Exception as e:
+            self.write_errors += 1
+            print(f"Error: {e}")
+            result = {"status": "error", "message": str(e)}
+
+        *superseded, latest = command.futures
+        for future in superseded:
+            future.set_result(dict(result, superseded_by=command.message))
+        latest.set_result(result)
+
+    def stats(self) -> dict:
+        with self._cond:
+            queued = len(self._heap)
+        return {
+            'queued': queued,
+            'written': self.written,
+            'coalesced': self.coalesced,
+            'write_errors': self.write_errors,
+        }
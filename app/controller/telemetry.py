@@ -0,0 +1,369 @@
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Set
+
+PATH_SEPARATOR = '/'
+_MISSING = object()
+
+# Socket.IO room every client joins on connect; it receives whole frames
+ALL_CHANNEL = 'arduino:all'
+
+
+def house_channel(house_id: str) -> str:
+    """Socket.IO room for the house-level part of a frame (solar system, totals, ...)"""
+    return f"house:{house_id}"
+
+
+def room_channel(house_id: str, room: str) -> str:
+    """Socket.IO room for one entry of a frame's `rooms` map"""
+    return f"room:{house_id}/{room}"
+
+
+def split_frame(frame: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """
+    Split a frame into its subscription channels
+
+    The house channel gets every top-level field except `rooms`; each room
+    channel gets a frame with the same shape restricted to that room, so
+    clients can merge any of them the same way.
+    """
+    house_id = frame.get('house_id', '')
+    rooms = frame.get('rooms') or {}
+    channels = {house_channel(house_id): {key: value for key, value in frame.items() if key != 'rooms'}}
+    for room, data in rooms.items():
+        channels[room_channel(house_id, room)] = {
+            'house_id': house_id,
+            'timestamp': frame.get('timestamp'),
+            'rooms': {room: data},
+        }
+    return channels
+
+
+class SubscriptionRegistry:
+    """
+    Tracks which client (sid) is subscribed to which channel, so frames are
+    only split and serialized for channels that somebody listens to.
+    """
+
+    def __init__(self):
+        self._by_sid: Dict[str, Set[str]] = {}
+        self._counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def add(self, sid: str, channel: str) -> bool:
+        """Subscribe `sid`; returns False if it already was"""
+        with self._lock:
+            channels = self._by_sid.setdefault(sid, set())
+            if channel in channels:
+                return False
+            channels.add(channel)
+            self._counts[channel] = self._counts.get(channel, 0) + 1
+            return True
+
+    def remove(self, sid: str, channel: str) -> bool:
+        """Unsubscribe `sid`; returns True if the channel has no subscriber left"""
+        with self._lock:
+            channels = self._by_sid.get(sid)
+            if not channels or channel not in channels:
+                return False
+            channels.discard(channel)
+            return self._release(channel)
+
+    def drop(self, sid: str) -> List[str]:
+        """Forget a disconnected client; returns the channels left without subscribers"""
+        with self._lock:
+            return [channel for channel in self._by_sid.pop(sid, ()) if self._release(channel)]
+
+    def _release(self, channel: str) -> bool:
+        count = self._counts[channel] - 1
+        if count:
+            self._counts[channel] = count
+            return False
+        del self._counts[channel]
+        return True
+
+    def channels_of(self, sid: str) -> Set[str]:
+        with self._lock:
+            return set(self._by_sid.get(sid, ()))
+
+    def has_subscribers(self, channel: str) -> bool:
+        return channel in self._counts
+
+    def has_partial_subscribers(self) -> bool:
+        """Whether any client listens to a house or room channel"""
+        counts = self._counts
+        return len(counts) > (ALL_CHANNEL in counts)
+
+
+def flatten(tree: Dict[str, Any], prefix: str = '') -> Dict[str, Any]:
+    """
+    Flatten a nested frame into {'/rooms/room1/temperature': 22.5, ...}
+
+    Dictionaries are walked, every other value (including lists) is a leaf.
+    """
+    flat = {}
+    for key, value in tree.items():
+        path = f"{prefix}{PATH_SEPARATOR}{key}"
+        if isinstance(value, dict) and value:
+            flat.update(flatten(value, path))
+        else:
+            flat[path] = value
+    return flat
+
+
+def diff(old: Dict[str, Any], new: Dict[str, Any]):
+    """
+    Compare two flattened frames
+
+    Returns (changed, removed): the paths whose value is new or different,
+    and the paths that disappeared.
+    """
+    changed = {path: value for path, value in new.items() if old.get(path, _MISSING) != value}
+    removed = [path for path in old if path not in new]
+    return changed, removed
+
+
+class _ChannelState:
+    __slots__ = ('frame', 'flat', 'seq', 'keyframe_at')
+
+    def __init__(self):
+        self.frame = None
+        self.flat = {}
+        self.seq = 0
+        self.keyframe_at = 0.0
+
+
+class DeltaBroadcaster:
+    """
+    Broadcasts Arduino frames as patches against the last known state.
+
+    The first frame of a channel, and then one frame every
+    `keyframe_interval` seconds, is sent in full as `arduino_data`
+    (`{'data': frame, 'seq': n, 'channel': c}`). Every other frame only sends
+    what changed as `arduino_patch`
+    (`{'seq': n, 'channel': c, 'set': {path: value}, 'unset': [path]}`);
+    frames identical to the previous one are not sent at all. `seq` counts
+    per channel, clients that see a gap can ask for a snapshot.
+    """
+
+    def __init__(self, emit: Callable[..., Any], keyframe_interval: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.emit = emit
+        self.keyframe_interval = keyframe_interval
+        self.clock = clock
+        self._channels: Dict[Optional[str], _ChannelState] = {}
+        self._lock = threading.Lock()
+        self.keyframes_sent = 0
+        self.patches_sent = 0
+        self.frames_skipped = 0
+
+    def publish(self, frame: Dict[str, Any], channel: Optional[str] = None):
+        """Send `frame` to `channel` (all clients when None) as a keyframe or a patch"""
+        flat = flatten(frame)
+        now = self.clock()
+        with self._lock:
+            state = self._channels.get(channel)
+            if state is None:
+                state = self._channels[channel] = _ChannelState()
+
+            if state.frame is None or now - state.keyframe_at >= self.keyframe_interval:
+                state.seq += 1
+                state.keyframe_at = now
+                event, payload = 'arduino_data', {'data': frame, 'seq': state.seq, 'channel': channel}
+                self.keyframes_sent += 1
+            else:
+                changed, removed = diff(state.flat, flat)
+                if not changed and not removed:
+                    self.frames_skipped += 1
+                    state.frame = frame
+                    return
+                state.seq += 1
+                event, payload = 'arduino_patch', {
+                    'seq': state.seq, 'channel': channel, 'set': changed, 'unset': removed
+                }
+                self.patches_sent += 1
+
+            state.frame = frame
+            state.flat = flat
+        self.emit(event, payload, to=channel)
+
+    def publish_frame(self, frame: Dict[str, Any], subscriptions: SubscriptionRegistry):
+        """
+        Send a frame to every channel that has subscribers
+
+        Each channel is diffed and serialized once, whatever its number of
+        subscribers; channels nobody listens to cost nothing.
+        """
+        if subscriptions.has_subscribers(ALL_CHANNEL):
+            self.publish(frame, ALL_CHANNEL)
+        if subscriptions.has_partial_subscribers():
+            for channel, part in split_frame(frame).items():
+                if subscriptions.has_subscribers(channel):
+                    self.publish(part, channel)
+
+    def forget(self, channel: Optional[str]):
+        """Drop the state of a channel, its next frame will be a keyframe"""
+        with self._lock:
+            self._channels.pop(channel, None)
+
+    def snapshot(self, channel: Optional[str] = None):
+        """Last full frame of `channel` with its sequence number, or None"""
+        with self._lock:
+            state = self._channels.get(channel)
+            if state is None or state.frame is None:
+                return None
+            return {'data': state.frame, 'seq': state.seq, 'channel': channel}
+
+    def send_snapshot(self, sid: str, channel: Optional[str] = None) -> bool:
+        """Send the current state of `channel` to a single client"""
+        snapshot = self.snapshot(channel)
+        if snapshot is None:
+            return False
+        self.emit('arduino_data', snapshot, to=sid)
+        return True
+
+    def stats(self) -> dict:
+        return {
+            'keyframes_sent': self.keyframes_sent,
+            'patches_sent': self.patches_sent,
+            'frames_skipped': self.frames_skipped,
+        }
+
+
+# Fields that must reach the clients as soon as they change or are raised
+ALARM_FIELDS = frozenset({'fire_detected', 'is_alarming'})
+STATS_KEY = '_stats'
+
+
+def _numeric_leaves(tree: Dict[str, Any], prefix: tuple = ()):
+    for key, value in tree.items():
+        if isinstance(value, dict):
+            yield from _numeric_leaves(value, prefix + (key,))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield prefix + (key,), value
+
+
+def _alarm_values(tree: Dict[str, Any], prefix: tuple = ()):
+    for key, value in tree.items():
+        if isinstance(value, dict):
+            yield from _alarm_values(value, prefix + (key,))
+        elif key in ALARM_FIELDS:
+            yield prefix + (key,), value
+
+
+class _Window:
+    __slots__ = ('frame', 'stats', 'last_emit_at', 'alarms')
+
+    def __init__(self):
+        self.frame = None
+        self.stats = {}
+        self.last_emit_at = float('-inf')
+        self.alarms = {}
+
+
+class FrameAggregator:
+    """
+    Limits telemetry to `max_rate` frames per second per house.
+
+    A frame arriving after a quiet period goes out immediately; frames
+    arriving faster are folded into a window that is flushed once
+    1/max_rate seconds have passed since the last emit. The flushed frame
+    holds the latest value of every field, plus a `_stats` entry next to
+    the numeric sensors that changed within the window
+    (`{'temperature': {'min', 'max', 'mean', 'count'}}`). A frame raising
+    or clearing an alarm (`fire_detected`, `is_alarming`) flushes at once.
+    A `max_rate` of 0 disables aggregation.
+    """
+
+    def __init__(self, max_rate: float = 0.0, clock: Callable[[], float] = time.monotonic):
+        self.max_rate = max_rate
+        self.clock = clock
+        self._windows: Dict[str, _Window] = {}
+        self.frames_in = 0
+        self.frames_out = 0
+        self.alarm_flushes = 0
+
+    @property
+    def period(self) -> float:
+        return 1.0 / self.max_rate if self.max_rate > 0 else 0.0
+
+    def add(self, frame: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Fold a frame into its window; returns a frame to emit now, if any"""
+        self.frames_in += 1
+        if self.max_rate <= 0:
+            self.frames_out += 1
+            return frame
+
+        now = self.clock()
+        window = self._windows.get(frame.get('house_id', ''))
+        if window is None:
+            window = self._windows[frame.get('house_id', '')] = _Window()
+
+        window.frame = frame
+        for path, value in _numeric_leaves(frame):
+            stats = window.stats.get(path)
+            if stats is None:
+                window.stats[path] = [value, value, value, 1]
+            else:
+                if value < stats[0]:
+                    stats[0] = value
+                if value > stats[1]:
+                    stats[1] = value
+                stats[2] += value
+                stats[3] += 1
+
+        alarm_changed = False
+        for path, value in _alarm_values(frame):
+            # an alarm seen for the first time counts as changed from "off"
+            if window.alarms.get(path, False) != value:
+                alarm_changed = True
+            window.alarms[path] = value
+
+        if alarm_changed:
+            self.alarm_flushes += 1
+            return self._flush(window, now)
+        if now - window.last_emit_at >= self.period:
+            return self._flush(window, now)
+        return None
+
+    def flush_due(self) -> List[Dict[str, Any]]:
+        """Flush every window whose period has elapsed"""
+        now = self.clock()
+        return [
+            self._flush(window, now) for window in self._windows.values()
+            if window.frame is not None and now - window.last_emit_at >= self.period
+        ]
+
+    def next_flush_in(self) -> Optional[float]:
+        """Seconds until the next pending window is due, None if nothing is pending"""
+        pending = [window.last_emit_at for window in self._windows.values() if window.frame is not None]
+        if not pending:
+            return None
+        return max(0.0, min(pending) + self.period - self.clock())
+
+    def _flush(self, window: _Window, now: float) -> Dict[str, Any]:
+        frame = window.frame
+        for path, (low, high, total, count) in window.stats.items():
+            if count < 2 or low == high:
+                continue
+            node = frame
+            for key in path[:-1]:
+                node = node.get(key)
+                if not isinstance(node, dict):
+                    break
+            else:
+                node.setdefault(STATS_KEY, {})[path[-1]] = {
+                    'min': low, 'max': high, 'mean': total / count, 'count': count
+                }
+        window.frame = None
+        window.stats = {}
+        window.last_emit_at = now
+        self.frames_out += 1
+        return frame
+
+    def stats(self) -> dict:
+        return {
+            'frames_in': self.frames_in,
+            'frames_out': self.frames_out,
+            'alarm_flushes': self.alarm_flushes,
+        }
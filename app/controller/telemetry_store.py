@@ -0,0 +1,328 @@
+import math
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from .frame_parser import FrameError, FrameParser
+
+# Metric names are the paths of the numeric leaves below a room (or below the
+# frame root for house-level values, stored with room '')
+METRIC_SEPARATOR = '/'
+HOUSE_LEVEL = ''
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS samples (
+    house_id TEXT NOT NULL,
+    room TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    ts REAL NOT NULL,
+    value REAL NOT NULL,
+    PRIMARY KEY (house_id, room, metric, ts)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS samples_ts ON samples (ts);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value REAL NOT NULL
+);
+"""
+
+
+def parse_timestamp(value) -> Optional[float]:
+    """Epoch seconds of an ISO timestamp (a trailing Z is accepted), None if unparsable"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, datetime):
+        return value.timestamp()
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+        except ValueError:
+            return None
+    return None
+
+
+def _numeric_leaves(tree: Dict[str, Any], prefix: str = ''):
+    for key, value in tree.items():
+        path = f"{prefix}{METRIC_SEPARATOR}{key}" if prefix else key
+        if isinstance(value, dict):
+            yield from _numeric_leaves(value, path)
+        elif isinstance(value, (int, float)):
+            # booleans (fire_detected, is_alarming, ...) are stored as 0/1
+            yield path, float(value)
+
+
+def frame_rows(frame: Dict[str, Any], ts: float) -> List[Tuple[str, str, str, float, float]]:
+    """(house_id, room, metric, ts, value) rows for every numeric value of a frame"""
+    house_id = str(frame.get('house_id', ''))
+    rows = []
+    for key, value in frame.items():
+        if key == 'rooms' and isinstance(value, dict):
+            for room, data in value.items():
+                if isinstance(data, dict):
+                    rows.extend((house_id, room, metric, ts, v) for metric, v in _numeric_leaves(data))
+        elif isinstance(value, dict):
+            rows.extend((house_id, HOUSE_LEVEL, metric, ts, v) for metric, v in _numeric_leaves(value, key))
+        elif isinstance(value, (int, float)):
+            rows.append((house_id, HOUSE_LEVEL, key, ts, float(value)))
+    return rows
+
+
+class TelemetryStore:
+    """
+    Local time-series store of Arduino telemetry, in SQLite (WAL mode).
+
+    One row per numeric value of a frame, keyed by
+    (house_id, room, metric, ts); house-level values (totals, solar system)
+    use room ''. Rows are written in batches, one transaction per batch.
+    Readers use their own connection per thread and are not blocked by the
+    writer. `maintain` drops rows past the retention period and replaces
+    raw rows older than `compact_after` with per-bucket averages.
+    """
+
+    def __init__(self, path: str, retention: Optional[float] = 30 * 86400.0,
+                 compact_after: Optional[float] = 86400.0, compact_bucket: float = 60.0):
+        self.path = path
+        self.retention = retention
+        self.compact_after = compact_after
+        self.compact_bucket = compact_bucket
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self.rows_written = 0
+        self.rows_compacted = 0
+        self.rows_expired = 0
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._connection().executescript(_SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30.0)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    # Writing
+
+    def write_rows(self, rows: Iterable[Tuple[str, str, str, float, float]]) -> int:
+        rows = list(rows)
+        if not rows:
+            return 0
+        conn = self._connection()
+        with self._write_lock, conn:
+            conn.executemany('INSERT OR REPLACE INTO samples VALUES (?, ?, ?, ?, ?)', rows)
+        self.rows_written += len(rows)
+        return len(rows)
+
+    def write_frames(self, frames: Iterable[Tuple[float, Dict[str, Any]]]) -> int:
+        """Store (ts, frame) pairs in one transaction; returns the number of rows"""
+        rows = []
+        for ts, frame in frames:
+            rows.extend(frame_rows(frame, ts))
+        return self.write_rows(rows)
+
+    # Reading
+
+    def query(self, house_id: str, metric: str, room: str = HOUSE_LEVEL, start: Optional[float] = None,
+              end: Optional[float] = None, limit: Optional[int] = None) -> List[Tuple[float, float]]:
+        """(ts, value) samples of one metric between `start` and `end` (epoch seconds), oldest first"""
+        sql = 'SELECT ts, value FROM samples WHERE house_id = ? AND room = ? AND metric = ? AND ts >= ? AND ts <= ? ORDER BY ts'
+        params = [house_id, room, metric, start if start is not None else float('-inf'),
+                  end if end is not None else float('inf')]
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit)
+        return self._connection().execute(sql, params).fetchall()
+
+    def downsample(self, house_id: str, metric: str, bucket: float, room: str = HOUSE_LEVEL,
+                   start: Optional[float] = None, end: Optional[float] = None) -> List[Dict[str, float]]:
+        """Per-bucket min/max/mean/count of one metric, buckets aligned on multiples of `bucket` seconds"""
+        rows = self._connection().execute(
+            'SELECT CAST(ts / ? AS INTEGER) * ? AS bucket, MIN(value), MAX(value), AVG(value), COUNT(*) '
+            'FROM samples WHERE house_id = ? AND room = ? AND metric = ? AND ts >= ? AND ts <= ? '
+            'GROUP BY bucket ORDER BY bucket',
+            (bucket, bucket, house_id, room, metric,
+             start if start is not None else float('-inf'), end if end is not None else float('inf')),
+        ).fetchall()
+        return [{'ts': ts, 'min': low, 'max': high, 'mean': mean, 'count': count}
+                for ts, low, high, mean, count in rows]
+
+    def latest(self, house_id: str, metric: str, room: str = HOUSE_LEVEL) -> Optional[Tuple[float, float]]:
+        return self._connection().execute(
+            'SELECT ts, value FROM samples WHERE house_id = ? AND room = ? AND metric = ? ORDER BY ts DESC LIMIT 1',
+            (house_id, room, metric),
+        ).fetchone()
+
+    def metrics(self, house_id: str) -> List[Tuple[str, str]]:
+        """(room, metric) pairs stored for a house"""
+        return self._connection().execute(
+            'SELECT DISTINCT room, metric FROM samples WHERE house_id = ? ORDER BY room, metric', (house_id,)
+        ).fetchall()
+
+    # Retention and compaction
+
+    def _meta(self, conn, key: str, default: float) -> float:
+        row = conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else default
+
+    def maintain(self, now: Optional[float] = None) -> Dict[str, int]:
+        """Apply retention and compaction; returns the number of rows removed by each"""
+        now = time.time() if now is None else now
+        conn = self._connection()
+        expired = compacted = 0
+        with self._write_lock, conn:
+            if self.retention:
+                expired = conn.execute('DELETE FROM samples WHERE ts < ?', (now - self.retention,)).rowcount
+            if self.compact_after:
+                bucket = self.compact_bucket
+                # Only whole buckets, starting where the previous compaction stopped
+                cutoff = (now - self.compact_after) // bucket * bucket
+                since = self._meta(conn, 'compacted_until', float('-inf'))
+                if cutoff > since:
+                    conn.execute('CREATE TEMP TABLE IF NOT EXISTS compacted AS SELECT * FROM samples WHERE 0')
+                    conn.execute(
+                        'INSERT INTO temp.compacted SELECT house_id, room, metric, CAST(ts / ? AS INTEGER) * ?, AVG(value) '
+                        'FROM samples WHERE ts >= ? AND ts < ? GROUP BY house_id, room, metric, CAST(ts / ? AS INTEGER)',
+                        (bucket, bucket, since, cutoff, bucket),
+                    )
+                    removed = conn.execute('DELETE FROM samples WHERE ts >= ? AND ts < ?', (since, cutoff)).rowcount
+                    inserted = conn.execute('INSERT OR REPLACE INTO samples SELECT * FROM temp.compacted').rowcount
+                    conn.execute('DELETE FROM temp.compacted')
+                    conn.execute('INSERT OR REPLACE INTO meta VALUES (?, ?)', ('compacted_until', cutoff))
+                    compacted = removed - inserted
+        self.rows_expired += expired
+        self.rows_compacted += compacted
+        return {'expired': expired, 'compacted': compacted}
+
+    def stats(self) -> dict:
+        return {
+            'rows_written': self.rows_written,
+            'rows_compacted': self.rows_compacted,
+            'rows_expired': self.rows_expired,
+        }
+
+
+class TelemetrySink(threading.Thread):
+    """
+    Pipeline stage storing every frame received from the Arduino.
+
+    It reads the ring buffer through its own consumer, so it sees the full
+    frame rate whatever the Socket.IO side does, and writes what it has
+    gathered every `flush_interval` seconds or `batch_size` frames.
+    Maintenance runs every `maintenance_interval` seconds.
+    """
+
+    def __init__(self, store: TelemetryStore, consumer, batch_size: int = 256,
+                 flush_interval: float = 1.0, maintenance_interval: float = 3600.0):
+        super().__init__(name='telemetry-sink', daemon=True)
+        self.store = store
+        self.consumer = consumer
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.maintenance_interval = maintenance_interval
+        self.parser = FrameParser()
+        self._stop_event = threading.Event()
+        self.frames_stored = 0
+        self.invalid_frames = 0
+        self.write_errors = 0
+        self._last_ts: Dict[str, float] = {}
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _frame_time(self, frame: Dict[str, Any]) -> float:
+        """
+        Timestamp the frame's rows are stored under: its own `timestamp`, or the
+        time it was received when it has none or repeats an earlier one (the
+        simulator replays the same frames). Rows of one house are keyed by it,
+        so it must increase from frame to frame or rows would be replaced.
+        """
+        house_id = str(frame.get('house_id', ''))
+        last = self._last_ts.get(house_id)
+        ts = parse_timestamp(frame.get('timestamp'))
+        if ts is None or (last is not None and ts <= last):
+            ts = time.time()
+            if last is not None and ts <= last:
+                ts = math.nextafter(last, math.inf)
+        self._last_ts[house_id] = ts
+        return ts
+
+    def run(self):
+        pending: List[Tuple[float, Dict[str, Any]]] = []
+        flush_at = time.monotonic() + self.flush_interval
+        maintain_at = time.monotonic() + self.maintenance_interval
+        while not self._stop_event.is_set():
+            lines = self.consumer.get_batch(self.batch_size, timeout=max(0.0, flush_at - time.monotonic()))
+            for line in lines:
+                try:
+                    frame = self.parser.parse(line)
+                except FrameError:
+                    self.invalid_frames += 1
+                    continue
+                pending.append((self._frame_time(frame), frame))
+
+            now = time.monotonic()
+            if pending and (len(pending) >= self.batch_size or now >= flush_at):
+                try:
+                    self.store.write_frames(pending)
+                    self.frames_stored += len(pending)
+                except sqlite3.Error as e:
+                    self.write_errors += 1
+                    print(f"Error storing telemetry: {e}")
+                pending = []
+            if now >= flush_at:
+                flush_at = now + self.flush_interval
+            if now >= maintain_at:
+                try:
+                    self.store.maintain()
+                except sqlite3.Error as e:
+                    print(f"Error compacting telemetry: {e}")
+                maintain_at = now + self.maintenance_interval
+
+    def stats(self) -> dict:
+        return {
+            'frames_stored': self.frames_stored,
+            'invalid_frames': self.invalid_frames,
+            'write_errors': self.write_errors,
+            **self.consumer.stats(),
+            **self.store.stats(),
+        }
+
+
+# Store and sink of the running app, set up by `init_app` when TELEMETRY_DB_PATH is configured
+telemetry_store: Optional[TelemetryStore] = None
+telemetry_sink: Optional[TelemetrySink] = None
+
+
+def init_app(app) -> Optional[TelemetryStore]:
+    """Open the telemetry store and start storing Arduino frames, if enabled in the config"""
+    global telemetry_store, telemetry_sink
+    path = app.config.get('TELEMETRY_DB_PATH')
+    if not path or telemetry_sink is not None:
+        return telemetry_store
+
+    from .arduino_controler import ArduinoController
+
+    telemetry_store = TelemetryStore(
+        path,
+        retention=app.config.get('TELEMETRY_RETENTION_DAYS', 30) * 86400.0,
+        compact_after=app.config.get('TELEMETRY_COMPACT_AFTER_HOURS', 24) * 3600.0,
+        compact_bucket=app.config.get('TELEMETRY_COMPACT_BUCKET', 60.0),
+    )
+    telemetry_sink = TelemetrySink(telemetry_store, ArduinoController.subscribe())
+    telemetry_sink.start()
+    return telemetry_store
+
+
+def get_store() -> Optional[TelemetryStore]:
+    """The app's telemetry store, None when history is not recorded"""
+    return telemetry_store
@@ -0,0 +1,306 @@
+import copy
+import json
+import os
+import random
+import socket
+import threading
+import time
+from collections import deque
+from typing import List, Mapping, Optional
+
+from .frame_parser import FrameRecord, encode_binary
+
+DEFAULT_SIMULATOR_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'arduino_data_example.json')
+
+# Strings accepted as true for boolean settings read from the environment
+_TRUE_VALUES = ('1', 'true', 'yes', 'on')
+
+
+class Transport:
+    """
+    Byte stream between the server and the Arduino.
+
+    `read_chunk` blocks until some bytes are available or the transport's
+    timeout expires (then it returns b''), which lets the serial reader
+    thread wait for data without polling.
+    """
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def read_chunk(self) -> bytes:
+        raise NotImplementedError
+
+    def write(self, data: bytes) -> int:
+        raise NotImplementedError
+
+    @property
+    def is_open(self) -> bool:
+        return True
+
+
+class SerialTransport(Transport):
+    """
+    Serial port (USB cable, or a pty path such as /dev/pts/3 for a
+    software Arduino).
+    """
+
+    def __init__(self, port: str, baudrate: int = 9600, timeout: float = 1.0,
+                 write_timeout: float = 1.0, settle_time: float = 2.0):
+        self.port = port
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.write_timeout = write_timeout
+        self.settle_time = settle_time
+        self.serial = None
+
+    def open(self):
+        import serial
+
+        self.serial = serial.Serial(
+            port=self.port,
+            baudrate=self.baudrate,
+            timeout=self.timeout,
+            write_timeout=self.write_timeout
+        )
+        time.sleep(self.settle_time)  # Wait for the connection to stabilize
+
+    def close(self):
+        if self.serial is not None:
+            self.serial.close()
+
+    def read_chunk(self) -> bytes:
+        return self.serial.read(max(1, self.serial.in_waiting))
+
+    def write(self, data: bytes) -> int:
+        return self.serial.write(data)
+
+    @property
+    def is_open(self) -> bool:
+        return self.serial is not None and self.serial.is_open
+
+
+class TcpTransport(Transport):
+    """
+    Arduino (or serial-to-network bridge) reachable over TCP.
+
+    When the peer closes the connection or it fails, `read_chunk` reconnects
+    with exponential backoff (`reconnect_delay` doubling up to
+    `max_reconnect_delay`) and returns b'' until it is back, so the reader
+    thread keeps running. Writes fail while the connection is down.
+    """
+
+    def __init__(self, host: str, port: int, timeout: float = 1.0, chunk_size: int = 4096,
+                 reconnect_delay: float = 0.5, max_reconnect_delay: float = 30.0):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.reconnects = 0
+        self.sock: Optional[socket.socket] = None
+        self._closed = True
+        self._delay = reconnect_delay
+        self._next_attempt = 0.0
+
+    def open(self):
+        self._connect()
+        self._closed = False
+        self._delay = self.reconnect_delay
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.settimeout(self.timeout)
+        self.sock = sock
+
+    def close(self):
+        self._closed = True
+        self._drop()
+
+    def _drop(self):
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+            self.sock = None
+
+    def _reconnect(self) -> bool:
+        """Try to reconnect once the backoff delay has passed; waits at most `timeout`"""
+        now = time.monotonic()
+        if now < self._next_attempt:
+            time.sleep(min(self._next_attempt - now, self.timeout))
+            return False
+        try:
+            self._connect()
+        except OSError as e:
+            print(f"Error reconnecting to {self.host}:{self.port}, retrying in {self._delay:.1f}s: {e}")
+            self._next_attempt = time.monotonic() + self._delay
+            self._delay = min(self._delay * 2, self.max_reconnect_delay)
+            return False
+        self.reconnects += 1
+        return True
+
+    def read_chunk(self) -> bytes:
+        if self._closed:
+            raise ConnectionError(f"Connection to {self.host}:{self.port} is closed")
+        if self.sock is None and not self._reconnect():
+            return b''
+        try:
+            data = self.sock.recv(self.chunk_size)
+        except socket.timeout:
+            return b''
+        except OSError as e:
+            print(f"Error reading from {self.host}:{self.port}: {e}")
+            data = b''
+        if not data:
+            # Closed by the peer: reconnect after the backoff delay, which only
+            # resets once data flows again so a flapping peer is not hammered
+            self._drop()
+            self._next_attempt = time.monotonic() + self._delay
+            self._delay = min(self._delay * 2, self.max_reconnect_delay)
+            return b''
+        self._delay = self.reconnect_delay
+        return data
+
+    def write(self, data: bytes) -> int:
+        sock = self.sock
+        if sock is None:
+            raise ConnectionError(f"Not connected to {self.host}:{self.port}")
+        try:
+            sock.sendall(data)
+        except OSError:
+            if sock is self.sock:
+                self._drop()
+            raise
+        return len(data)
+
+    @property
+    def is_open(self) -> bool:
+        return not self._closed
+
+
+class SimulatedTransport(Transport):
+    """
+    In-process Arduino replaying `arduino_data_example.json`-shaped frames.
+
+    Frames are produced at `rate` frames per second (in bursts when the
+    rate is higher than the reader can wake up for), with the numeric
+    sensor values jittered so consecutive frames differ like real ones.
+    Written commands are kept in `written` for inspection.
+    """
+
+    def __init__(self, frames_path: str = DEFAULT_SIMULATOR_FILE, rate: float = 1.0,
+                 timeout: float = 1.0, jitter: float = 0.05, variants: int = 64,
+                 max_burst: int = 1024, seed: Optional[int] = None, binary: bool = False):
+        if not rate > 0:
+            raise ValueError(f"Simulator rate must be positive, got {rate}")
+        self.frames_path = frames_path
+        self.rate = rate
+        self.timeout = timeout
+        self.jitter = jitter
+        self.variants = variants
+        self.max_burst = max_burst
+        self.seed = seed
+        self.binary = binary  # send the compact binary line format instead of JSON
+        self.written = deque(maxlen=1000)
+        self.frames_sent = 0
+        self._lines: List[bytes] = []
+        self._started_at = None
+        self._closed = threading.Event()
+
+    def open(self):
+        with open(self.frames_path) as f:
+            data = json.load(f)
+        frames = data if isinstance(data, list) else [data]
+        rng = random.Random(self.seed)
+        self._lines = [
+            self._encode(self._jittered(frames[i % len(frames)], rng)) + b'\n'
+            for i in range(max(self.variants, len(frames)))
+        ]
+        self._started_at = time.monotonic()
+        self.frames_sent = 0
+        self._closed.clear()
+
+    def close(self):
+        self._closed.set()
+        self._started_at = None
+
+    def _jittered(self, frame, rng: random.Random):
+        frame = copy.deepcopy(frame)
+
+        def walk(node):
+            for key, value in node.items():
+                if isinstance(value, dict):
+                    walk(value)
+                elif isinstance(value, float):
+                    node[key] = round(value * (1 + rng.uniform(-self.jitter, self.jitter)), 2)
+
+        walk(frame)
+        return frame
+
+    def _encode(self, frame) -> bytes:
+        if self.binary:
+            return encode_binary(FrameRecord.from_frame(frame))
+        return json.dumps(frame, separators=(',', ':')).encode('utf-8')
+
+    def read_chunk(self) -> bytes:
+        deadline = time.monotonic() + self.timeout
+        while not self._closed.is_set():
+            now = time.monotonic()
+            due = int((now - self._started_at) * self.rate) - self.frames_sent
+            if due > 0:
+                due = min(due, self.max_burst)
+                start = self.frames_sent
+                self.frames_sent += due
+                count = len(self._lines)
+                return b''.join(self._lines[i % count] for i in range(start, start + due))
+            if now >= deadline:
+                return b''
+            next_due = self._started_at + (self.frames_sent + 1) / self.rate
+            self._closed.wait(min(next_due, deadline) - now)
+        return b''
+
+    def write(self, data: bytes) -> int:
+        self.written.append(data)
+        return len(data)
+
+    @property
+    def is_open(self) -> bool:
+        return self._started_at is not None and not self._closed.is_set()
+
+
+def _flag(value) -> bool:
+    """Boolean setting given as a bool (app config) or a string (environment)"""
+    if isinstance(value, str):
+        return value.strip().lower() in _TRUE_VALUES
+    return bool(value)
+
+
+def create_transport(config: Mapping) -> Transport:
+    """
+    Build the transport selected by `ARDUINO_TRANSPORT` in the app config
+    ('serial', 'tcp' or 'simulator').
+    """
+    kind = config.get('ARDUINO_TRANSPORT', 'serial')
+    if kind == 'serial':
+        return SerialTransport(
+            port=config.get('ARDUINO_PORT', 'COM5'),
+            baudrate=int(config.get('ARDUINO_BAUDRATE', 9600)),
+        )
+    if kind == 'tcp':
+        return TcpTransport(
+            host=config.get('ARDUINO_TCP_HOST', 'localhost'),
+            port=int(config.get('ARDUINO_TCP_PORT', 5001)),
+        )
+    if kind == 'simulator':
+        return SimulatedTransport(
+            frames_path=config.get('ARDUINO_SIM_FILE') or DEFAULT_SIMULATOR_FILE,
+            rate=float(config.get('ARDUINO_SIM_RATE', 1.0)),
+            binary=_flag(config.get('ARDUINO_SIM_BINARY', False)),
+        )
+    raise ValueError(f"Unknown Arduino transport: {kind}")
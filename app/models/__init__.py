@@ -5,13 +5,35 @@ from .base import (
     DeviceStatus,
     EnergyTransactionType
 )
+from .batch import BatchWriter, WriteOp, WriteResult
+from .cache import DocumentCache
+from .mirror import FirestoreMirror
+from .async_base import AsyncFirebaseManager, BlockingFirebaseManager
 from .device import Device, Light, Window, Door, CleaningRobot, FireDetector, Battery,AC_Fan
 from .room import Room, Garage, Bathroom, Kitchen, Toilet
 from .user import User, House, Notification, EnergyTransaction
+from .compact import (
+    CompactModel,
+    compact_class,
+    CompactDevice,
+    CompactLight,
+    CompactWindow,
+    CompactDoor,
+    CompactFireDetector,
+    CompactAC_Fan,
+    CompactRoom
+)
 
 __all__ = [
     'FirebaseModel',
     'FirebaseManager',
+    'BatchWriter',
+    'WriteOp',
+    'WriteResult',
+    'DocumentCache',
+    'FirestoreMirror',
+    'AsyncFirebaseManager',
+    'BlockingFirebaseManager',
     'DeviceType',
     'DeviceStatus',
     'EnergyTransactionType',
@@ -32,4 +54,13 @@ __all__ = [
     'House',
     'Notification',
     'EnergyTransaction',
+    'CompactModel',
+    'compact_class',
+    'CompactDevice',
+    'CompactLight',
+    'CompactWindow',
+    'CompactDoor',
+    'CompactFireDetector',
+    'CompactAC_Fan',
+    'CompactRoom',
 ]
\ No newline at end of file
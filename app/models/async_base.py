@@ -0,0 +1,189 @@
+from typing import Dict, Any, List, Optional, AsyncIterator
+import asyncio
+import functools
+import inspect
+import threading
+import firebase_admin
+from google.cloud.firestore import AsyncClient
+from .base import FirebaseManager, DOCUMENT_ID_FIELD, cursor_projection
+
+class AsyncFirebaseManager:
+    """
+    Firestore access through the async client, with the same CRUD/query
+    surface as `FirebaseManager`.
+
+    Independent reads can run concurrently, e.g. all rooms of a house are
+    fetched with one `asyncio.gather` instead of one round trip after the
+    other. The document cache is shared with the sync `FirebaseManager`.
+    The client binds to the event loop it is first used in; sync code should
+    go through `blocking()`, which runs everything on one background loop.
+    """
+
+    def __init__(self, client: Optional[AsyncClient] = None, cache=None):
+        if client is None or cache is None:
+            sync_manager = FirebaseManager()  # initializes the Firebase app
+            cache = cache if cache is not None else sync_manager.cache
+        if client is None:
+            app = firebase_admin.get_app()
+            client = AsyncClient(project=app.project_id, credentials=app.credential.get_credential())
+        self.db = client
+        self.cache = cache
+        self._blocking = None
+
+    async def create_document(self, collection: str, data: Dict[str, Any]) -> str:
+        """Create a new document in a collection"""
+        try:
+            doc_ref = self.db.collection(collection).document()
+            await doc_ref.set(data)
+            return doc_ref.id
+        except Exception as e:
+            print(f"Error creating document: {e}")
+            raise
+
+    async def get_document(self, collection: str, doc_id: str, use_cache: bool = True) -> Dict[str, Any]:
+        """Get a document by ID, served from the document cache when possible"""
+        if use_cache:
+            cached = self.cache.get(collection, doc_id)
+            if cached is not None:
+                return cached
+        try:
+            generation = self.cache.generation
+            doc = await self.db.collection(collection).document(doc_id).get()
+            if not doc.exists:
+                return None
+            data = doc.to_dict()
+            self.cache.put(collection, doc_id, data, generation)
+            return data
+        except Exception as e:
+            print(f"Error getting document: {e}")
+            raise
+
+    async def get_documents(self, collection: str, doc_ids: List[str]) -> List[Optional[Dict[str, Any]]]:
+        """Get several documents concurrently, in the order of `doc_ids`"""
+        return list(await asyncio.gather(*(self.get_document(collection, doc_id) for doc_id in doc_ids)))
+
+    async def update_document(self, collection: str, doc_id: str, data: Dict[str, Any]) -> bool:
+        """Update an existing document"""
+        try:
+            await self.db.collection(collection).document(doc_id).update(data)
+            return True
+        except Exception as e:
+            print(f"Error updating document: {e}")
+            raise
+        finally:
+            self.cache.invalidate(collection, doc_id)
+
+    async def delete_document(self, collection: str, doc_id: str) -> bool:
+        """Delete a document"""
+        try:
+            await self.db.collection(collection).document(doc_id).delete()
+            return True
+        except Exception as e:
+            print(f"Error deleting document: {e}")
+            raise
+        finally:
+            self.cache.invalidate(collection, doc_id)
+
+    def _query(self, collection: str, filters: list = None, order_by: str = None, select: List[str] = None):
+        query = self.db.collection(collection)
+        if filters:
+            for field, op, value in filters:
+                query = query.where(field, op, value)
+        if order_by:
+            query = query.order_by(order_by)
+        if select:
+            query = query.select(select)
+        return query
+
+    async def query_collection(self, collection: str, filters: list = None, order_by: str = None):
+        """Query a collection with optional filters and ordering"""
+        try:
+            return [doc.to_dict() async for doc in self._query(collection, filters, order_by).stream()]
+        except Exception as e:
+            print(f"Error querying collection: {e}")
+            raise
+
+    async def stream_collection(self, collection: str, filters: list = None, order_by: str = None,
+                                select: List[str] = None, limit: int = None, start_after=None,
+                                page_size: int = 500, include_id: bool = False) -> AsyncIterator[Dict[str, Any]]:
+        """Async counterpart of `FirebaseManager.stream_collection`"""
+        hidden = []
+        if select:
+            select, hidden = cursor_projection(select, filters, order_by)
+        query = self._query(collection, filters, order_by or DOCUMENT_ID_FIELD, select)
+        cursor = start_after
+        if isinstance(cursor, str):
+            cursor = await self.db.collection(collection).document(cursor).get()
+
+        remaining = limit
+        while remaining is None or remaining > 0:
+            size = page_size if remaining is None else min(page_size, remaining)
+            page = query.limit(size)
+            if cursor is not None:
+                page = page.start_after(cursor)
+            count = 0
+            async for snapshot in page.stream():
+                data = snapshot.to_dict()
+                for field in hidden:
+                    data.pop(field, None)
+                if include_id:
+                    data['id'] = snapshot.id
+                count += 1
+                cursor = snapshot
+                yield data
+            if count < size:
+                return
+            if remaining is not None:
+                remaining -= count
+
+    async def get_house_rooms(self, house_id: str) -> List[Dict[str, Any]]:
+        """All rooms of a house, found by their house_id like `FirebaseManager.get_house_rooms`"""
+        return await self.query_collection('rooms', [('house_id', '==', house_id)])
+
+    def blocking(self) -> 'BlockingFirebaseManager':
+        """Sync view of this manager for code that can't await"""
+        if self._blocking is None:
+            self._blocking = BlockingFirebaseManager(self)
+        return self._blocking
+
+class AsyncBridge:
+    """Event loop running in a daemon thread, for calling coroutines from sync code"""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name='firestore-async-bridge', daemon=True)
+        self._thread.start()
+
+    def run(self, coro, timeout: Optional[float] = None):
+        """Run a coroutine on the bridge loop and wait for its result"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+class BlockingFirebaseManager:
+    """
+    Sync facade over `AsyncFirebaseManager`: every coroutine method becomes
+    a blocking call executed on a shared background event loop, so existing
+    sync callers keep working while the calls themselves can fan out.
+    """
+
+    def __init__(self, manager: AsyncFirebaseManager, bridge: Optional[AsyncBridge] = None):
+        self._manager = manager
+        self._bridge = bridge or AsyncBridge()
+
+    def stream_collection(self, *args, **kwargs):
+        """Collects the async stream into a list (the whole result is held in memory)"""
+        async def collect():
+            return [doc async for doc in self._manager.stream_collection(*args, **kwargs)]
+        return self._bridge.run(collect())
+
+    def __getattr__(self, name):
+        attr = getattr(self._manager, name)
+        if not inspect.iscoroutinefunction(attr):
+            return attr
+
+        @functools.wraps(attr)
+        def call(*args, **kwargs):
+            return self._bridge.run(attr(*args, **kwargs))
+        return call
@@ -1,10 +1,35 @@
-from dataclasses import dataclass, asdict, field
-from typing import Dict, Any
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Iterator, Optional, Tuple
 from datetime import datetime
 from enum import Enum
 import firebase_admin
 from firebase_admin import credentials, firestore
 import os
+from .batch import BatchWriter, WriteOp, WriteResult
+from .cache import DocumentCache
+from .mirror import FirestoreMirror
+from .history import TimeSeriesStore, Timestamp, history_fields
+from .serialization import serializer_for, deserializer_for
+
+# Firestore's pseudo-field for the document ID, used to order pages when no order_by is given
+DOCUMENT_ID_FIELD = '__name__'
+
+# Filter operators after which Firestore orders the query by the filtered field
+INEQUALITY_OPERATORS = frozenset(('<', '<=', '>', '>=', '!=', 'not-in'))
+
+def cursor_projection(select: List[str], filters: list = None, order_by: str = None) -> Tuple[List[str], List[str]]:
+    """
+    Fields to project for `select` so that a returned snapshot can be used
+    as a page cursor, which needs the value of every field the query is
+    ordered by: `order_by` and the fields of inequality filters.
+    Returns the projection and the fields added to it, to drop from results.
+    """
+    ordered = [order_by] + [field for field, op, _ in filters or () if op in INEQUALITY_OPERATORS]
+    added = []
+    for field in ordered:
+        if field and field != DOCUMENT_ID_FIELD and field not in select and field not in added:
+            added.append(field)
+    return list(select) + added, added
 
 class EnergyTransactionType(str, Enum):
     SOLAR_TO_BATTERY = "solar_to_battery"
@@ -31,21 +56,13 @@ class FirebaseModel:
     id: str = field(default="")
 
     def to_dict(self) -> dict:
-        def convert_value(v):
-            if isinstance(v, Enum):
-                return v.value
-            if isinstance(v, datetime):
-                return v.isoformat()
-            if isinstance(v, FirebaseModel):
-                return v.to_dict()
-            if isinstance(v, list):
-                return [convert_value(i) for i in v]
-            if isinstance(v, dict):
-                return {k: convert_value(v) for k, v in v.items()}
-            return v
-
-        data = asdict(self)
-        return {k: convert_value(v) for k, v in data.items() if v is not None}
+        """Firestore representation; None values and history fields are left out (see `save_history`)"""
+        return serializer_for(type(self))(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]):
+        """Build a model from a Firestore document, restoring Enums, datetimes and nested models"""
+        return deserializer_for(cls)(data)
     
 class FirebaseManager:
     _instance = None
@@ -67,7 +84,27 @@ class FirebaseManager:
         
         # Get Firestore client
         self.db = firestore.client()
+        self.cache = DocumentCache(max_size=int(os.getenv('FIRESTORE_CACHE_SIZE', '1024')))
+        self.mirror = None
+        self.history = TimeSeriesStore(self.db)
         self._initialized = True
+
+        if os.getenv('FIRESTORE_MIRROR', 'false').lower() == 'true':
+            self.enable_mirror(wait=False)
+
+    def enable_mirror(self, wait: bool = True, timeout: float = 30.0) -> FirestoreMirror:
+        """Keep houses, rooms and devices in a live in-memory replica (see `FirestoreMirror`)"""
+        if self.mirror is None:
+            self.mirror = FirestoreMirror(self.db)
+            self.mirror.start()
+        if wait and not self.mirror.wait_until_ready(timeout):
+            print("Firestore mirror is not ready yet, reads fall back to Firestore")
+        return self.mirror
+
+    def disable_mirror(self):
+        if self.mirror is not None:
+            self.mirror.stop()
+            self.mirror = None
     
     def init_database(self):
         """Initialize database collections and example data"""
@@ -99,11 +136,22 @@ class FirebaseManager:
             print(f"Error creating document: {e}")
             raise
     
-    def get_document(self, collection: str, doc_id: str) -> Dict[str, Any]:
-        """Get a document by ID"""
+    def get_document(self, collection: str, doc_id: str, use_cache: bool = True) -> Dict[str, Any]:
+        """Get a document by ID, served from the mirror or the document cache when possible"""
+        if self.mirror is not None and self.mirror.mirrors(collection):
+            return self.mirror.get(collection, doc_id)
+        if use_cache:
+            cached = self.cache.get(collection, doc_id)
+            if cached is not None:
+                return cached
         try:
+            generation = self.cache.generation
             doc = self.db.collection(collection).document(doc_id).get()
-            return doc.to_dict() if doc.exists else None
+            if not doc.exists:
+                return None
+            data = doc.to_dict()
+            self.cache.put(collection, doc_id, data, generation)
+            return data
         except Exception as e:
             print(f"Error getting document: {e}")
             raise
@@ -116,6 +164,9 @@ class FirebaseManager:
         except Exception as e:
             print(f"Error updating document: {e}")
             raise
+        finally:
+            # After the write, so a concurrent read of the old data is not cached
+            self.cache.invalidate(collection, doc_id)
     
     def delete_document(self, collection: str, doc_id: str) -> bool:
         """Delete a document"""
@@ -125,6 +176,9 @@ class FirebaseManager:
         except Exception as e:
             print(f"Error deleting document: {e}")
             raise
+        finally:
+            # After the write, so a concurrent read of the old data is not cached
+            self.cache.invalidate(collection, doc_id)
     
     def query_collection(self, collection: str, filters: list = None, order_by: str = None):
         """Query a collection with optional filters and ordering"""
@@ -142,4 +196,146 @@ class FirebaseManager:
         except Exception as e:
             print(f"Error querying collection: {e}")
             raise
-    
\ No newline at end of file
+
+    def iter_pages(self, collection: str, filters: list = None, order_by: str = None,
+                   select: List[str] = None, limit: int = None, start_after=None,
+                   page_size: int = 500, include_id: bool = False) -> Iterator[Tuple[List[Dict[str, Any]], Any]]:
+        """
+        Query a collection one page at a time
+
+        Yields (documents, cursor) for each page of at most `page_size`
+        documents; pass the last cursor as `start_after` to resume later.
+        `select` restricts the fields transferred, `limit` caps the total
+        number of documents. `start_after` may be a cursor, a document ID or
+        a dict of the `order_by` field values.
+        """
+        try:
+            query = self.db.collection(collection)
+
+            if filters:
+                for field, op, value in filters:
+                    query = query.where(field, op, value)
+
+            # Cursors need a deterministic order
+            query = query.order_by(order_by or DOCUMENT_ID_FIELD)
+
+            hidden = []
+            if select:
+                projection, hidden = cursor_projection(select, filters, order_by)
+                query = query.select(projection)
+
+            cursor = start_after
+            if isinstance(cursor, str):
+                cursor = self.db.collection(collection).document(cursor).get()
+
+            remaining = limit
+            while remaining is None or remaining > 0:
+                size = page_size if remaining is None else min(page_size, remaining)
+                page = query.limit(size)
+                if cursor is not None:
+                    page = page.start_after(cursor)
+
+                docs = []
+                for snapshot in page.stream():
+                    data = snapshot.to_dict()
+                    for field in hidden:
+                        data.pop(field, None)
+                    if include_id:
+                        data['id'] = snapshot.id
+                    docs.append(data)
+                    cursor = snapshot
+                if docs:
+                    yield docs, cursor
+                if len(docs) < size:
+                    return
+                if remaining is not None:
+                    remaining -= len(docs)
+        except Exception as e:
+            print(f"Error querying collection: {e}")
+            raise
+
+    def stream_collection(self, collection: str, filters: list = None, order_by: str = None,
+                          select: List[str] = None, limit: int = None, start_after=None,
+                          page_size: int = 500, include_id: bool = False) -> Iterator[Dict[str, Any]]:
+        """
+        Query a collection lazily, holding at most one page in memory
+
+        Same arguments as `iter_pages`, yields the documents one by one.
+        """
+        for docs, _ in self.iter_pages(collection, filters, order_by, select, limit,
+                                       start_after, page_size, include_id):
+            yield from docs
+
+    def batch_writer(self, on_result=None, **kwargs) -> BatchWriter:
+        """Create a writer that groups writes into batched commits (see `BatchWriter`)"""
+        def handle_result(result: WriteResult):
+            if result.op.kind != 'create':
+                self.cache.invalidate(result.op.collection, result.doc_id)
+            if on_result:
+                on_result(result)
+        return BatchWriter(self.db, on_result=handle_result, **kwargs)
+
+    def bulk_write(self, ops: List[WriteOp], on_result=None, **kwargs) -> List[WriteResult]:
+        """Apply creates, updates and deletes in batches of up to 500 operations"""
+        results = []
+        def collect(result: WriteResult):
+            results.append(result)
+            if on_result:
+                on_result(result)
+        with self.batch_writer(on_result=collect, flush_interval=None, **kwargs) as writer:
+            for op in ops:
+                writer.add(op)
+        return results
+
+    def append_history(self, collection: str, doc_id: str, series: str,
+                       samples: List[Dict[str, Any]]) -> List[WriteResult]:
+        """Add samples to a history series of a document (see `TimeSeriesStore`)"""
+        return self.history.append(collection, doc_id, series, samples)
+
+    def query_history(self, collection: str, doc_id: str, series: str,
+                      start: Optional[Timestamp] = None, end: Optional[Timestamp] = None) -> List[Dict[str, Any]]:
+        """Samples of a history series between `start` and `end`, oldest first"""
+        try:
+            return self.history.query(collection, doc_id, series, start, end)
+        except Exception as e:
+            print(f"Error querying history: {e}")
+            raise
+
+    def delete_history(self, collection: str, doc_id: str, series: str,
+                       before: Optional[Timestamp] = None) -> List[WriteResult]:
+        """Drop a history series, or only its buckets older than `before`"""
+        return self.history.delete(collection, doc_id, series, before)
+
+    def save_history(self, collection: str, model: FirebaseModel) -> List[WriteResult]:
+        """Move the samples held in a model's history fields to their series and clear the fields"""
+        results = []
+        for series in history_fields(type(model)):
+            samples = getattr(model, series)
+            if samples:
+                series_results = self.append_history(collection, model.id, series, samples)
+                results.extend(series_results)
+                if all(result.success for result in series_results):
+                    setattr(model, series, [])
+        return results
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters of the document cache"""
+        return self.cache.stats()
+
+    def get_house_rooms(self, house_id: str) -> List[Dict[str, Any]]:
+        """All rooms of a house"""
+        if self.mirror is not None and self.mirror.mirrors('rooms'):
+            return self.mirror.rooms_of_house(house_id)
+        return self.query_collection('rooms', [('house_id', '==', house_id)])
+
+    def get_room_devices(self, room_id: str) -> List[Dict[str, Any]]:
+        """All devices of a room"""
+        if self.mirror is not None and self.mirror.mirrors('devices'):
+            return self.mirror.devices_in_room(room_id)
+        return self.query_collection('devices', [('room_id', '==', room_id)])
+
+    def get_devices_by_type(self, device_type: str) -> List[Dict[str, Any]]:
+        """All devices of a given type"""
+        if self.mirror is not None and self.mirror.mirrors('devices'):
+            return self.mirror.devices_of_type(device_type)
+        return self.query_collection('devices', [('device_type', '==', device_type)])
@@ -0,0 +1,173 @@
+from dataclasses import dataclass
+from typing import Dict, Any, List, Optional, Callable
+import threading
+import time
+from google.api_core import exceptions as google_exceptions
+
+# Firestore rejects write batches with more operations than this
+MAX_BATCH_SIZE = 500
+
+# Retries of each operation replayed alone after its batch was rejected
+REPLAY_RETRIES = 1
+
+RETRYABLE_ERRORS = (
+    google_exceptions.Aborted,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.InternalServerError,
+    google_exceptions.ResourceExhausted,
+    google_exceptions.ServiceUnavailable,
+)
+
+@dataclass
+class WriteOp:
+    kind: str  # 'create', 'set', 'update' or 'delete'
+    collection: str
+    doc_id: Optional[str] = None  # generated for creates when empty
+    data: Optional[Dict[str, Any]] = None
+    merge: bool = False  # only for 'set'
+
+@dataclass
+class WriteResult:
+    op: WriteOp
+    doc_id: str
+    success: bool
+    error: Optional[str] = None
+
+class BatchWriter:
+    """
+    Groups Firestore writes into WriteBatch commits of up to 500 operations.
+
+    Operations are queued and committed when the batch is full, when
+    `flush_interval` seconds have passed since the first queued operation,
+    or on `flush()`/leaving the `with` block. Failed commits are retried
+    with exponential backoff; a batch rejected for a non-transient reason is
+    replayed one operation at a time (with at most `REPLAY_RETRIES` retries
+    each) so every operation gets its own result. A batch still failing
+    after `max_retries` retries fails as a whole.
+
+    Results go to `on_result` and are returned by `flush()`; the writer only
+    counts them (`written`, `failed`). Commits run one at a time in queueing
+    order, but queueing only waits for a commit in progress (and its
+    backoff) when it fills a batch.
+    """
+
+    def __init__(self, db, max_batch_size: int = MAX_BATCH_SIZE,
+                 flush_interval: Optional[float] = 1.0,
+                 max_retries: int = 5, backoff: float = 0.5,
+                 on_result: Optional[Callable[[WriteResult], None]] = None):
+        if not 0 < max_batch_size <= MAX_BATCH_SIZE:
+            raise ValueError(f"max_batch_size must be between 1 and {MAX_BATCH_SIZE}")
+        self.db = db
+        self.max_batch_size = max_batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.on_result = on_result
+        self.commits = 0
+        self.written = 0
+        self.failed = 0
+        self._pending: List[WriteOp] = []
+        self._lock = threading.Lock()  # guards _pending and _timer
+        self._commit_lock = threading.RLock()  # keeps commits in order; on_result may queue more writes
+        self._timer: Optional[threading.Timer] = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    # Queueing
+
+    def create(self, collection: str, data: Dict[str, Any], doc_id: Optional[str] = None) -> str:
+        """Queue a new document and return its (pre-allocated) ID"""
+        op = WriteOp('create', collection, doc_id, data)
+        self.add(op)
+        return op.doc_id
+
+    def set(self, collection: str, doc_id: str, data: Dict[str, Any], merge: bool = False):
+        self.add(WriteOp('set', collection, doc_id, data, merge))
+
+    def update(self, collection: str, doc_id: str, data: Dict[str, Any]):
+        self.add(WriteOp('update', collection, doc_id, data))
+
+    def delete(self, collection: str, doc_id: str):
+        self.add(WriteOp('delete', collection, doc_id))
+
+    def add(self, op: WriteOp):
+        if op.kind == 'create' and not op.doc_id:
+            op.doc_id = self.db.collection(op.collection).document().id
+        with self._lock:
+            self._pending.append(op)
+            full = len(self._pending) >= self.max_batch_size
+            if not full and self.flush_interval and self._timer is None:
+                self._timer = threading.Timer(self.flush_interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if full:
+            self.flush()
+
+    # Committing
+
+    def flush(self) -> List[WriteResult]:
+        """Commit everything queued so far and return the results of these operations"""
+        with self._commit_lock:
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                pending, self._pending = self._pending, []
+            # Committed without holding _lock, so retries don't block queueing
+            results = []
+            for start in range(0, len(pending), self.max_batch_size):
+                results.extend(self._commit(pending[start:start + self.max_batch_size]))
+            for result in results:
+                if result.success:
+                    self.written += 1
+                else:
+                    self.failed += 1
+                if self.on_result:
+                    self.on_result(result)
+            return results
+
+    def close(self) -> List[WriteResult]:
+        return self.flush()
+
+    def _commit(self, ops: List[WriteOp], max_retries: Optional[int] = None) -> List[WriteResult]:
+        try:
+            self._commit_with_retry(ops, self.max_retries if max_retries is None else max_retries)
+            return [WriteResult(op, op.doc_id, True) for op in ops]
+        except Exception as e:
+            if len(ops) == 1 or isinstance(e, RETRYABLE_ERRORS):
+                print(f"Error writing {len(ops)} document(s): {e}")
+                return [WriteResult(op, op.doc_id, False, str(e)) for op in ops]
+        # The batch is atomic: find out which operation failed by replaying them alone
+        results = []
+        for op in ops:
+            results.extend(self._commit([op], min(self.max_retries, REPLAY_RETRIES)))
+        return results
+
+    def _commit_with_retry(self, ops: List[WriteOp], max_retries: int):
+        batch = self.db.batch()
+        for op in ops:
+            ref = self.db.collection(op.collection).document(op.doc_id)
+            if op.kind == 'create':
+                batch.create(ref, op.data)
+            elif op.kind == 'set':
+                batch.set(ref, op.data, merge=op.merge)
+            elif op.kind == 'update':
+                batch.update(ref, op.data)
+            elif op.kind == 'delete':
+                batch.delete(ref)
+            else:
+                raise ValueError(f"Unknown write operation: {op.kind}")
+
+        for attempt in range(max_retries + 1):
+            try:
+                batch.commit()
+                self.commits += 1
+                return
+            except RETRYABLE_ERRORS:
+                if attempt == max_retries:
+                    raise
+                time.sleep(self.backoff * (2 ** attempt))
@@ -0,0 +1,111 @@
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple, Callable
+import copy
+import threading
+import time
+
+# Seconds a cached document stays valid, per collection
+DEFAULT_TTLS = {
+    'users': 300.0,
+    'houses': 300.0,
+    'rooms': 300.0,
+    'devices': 60.0,
+    'batteries': 30.0,
+    'solar_panels': 60.0,
+}
+
+class DocumentCache:
+    """
+    In-process LRU cache of Firestore documents keyed by (collection, doc_id).
+
+    Entries expire after the TTL of their collection (`default_ttl` for
+    collections without one, no caching when the TTL is 0) and the least
+    recently used entry is evicted once `max_size` documents are cached.
+    Documents are copied in and out so callers can't alter cached data.
+    """
+
+    def __init__(self, max_size: int = 1024, ttls: Optional[Dict[str, float]] = None,
+                 default_ttl: float = 30.0, clock: Callable[[], float] = time.monotonic):
+        self.max_size = max_size
+        self.ttls = dict(DEFAULT_TTLS if ttls is None else ttls)
+        self.default_ttl = default_ttl
+        self.clock = clock
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0  # bumped on every invalidation
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def ttl_for(self, collection: str) -> float:
+        return self.ttls.get(collection, self.default_ttl)
+
+    def get(self, collection: str, doc_id: str) -> Optional[Dict[str, Any]]:
+        """Cached copy of a document, or None on a miss"""
+        key = (collection, doc_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, data = entry
+            if self.clock() >= expires_at:
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return copy.deepcopy(data)
+
+    @property
+    def generation(self) -> int:
+        """Take this before reading from Firestore and pass it to `put`"""
+        return self._generation
+
+    def put(self, collection: str, doc_id: str, data: Dict[str, Any], generation: Optional[int] = None):
+        """
+        Cache a document; skipped when anything was invalidated since
+        `generation` was taken, as the data read may already be stale
+        """
+        ttl = self.ttl_for(collection)
+        if ttl <= 0 or self.max_size <= 0:
+            return
+        key = (collection, doc_id)
+        entry = (self.clock() + ttl, copy.deepcopy(data))
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, collection: str, doc_id: str):
+        with self._lock:
+            self._generation += 1
+            self._entries.pop((collection, doc_id), None)
+
+    def invalidate_collection(self, collection: str):
+        with self._lock:
+            self._generation += 1
+            for key in [key for key in self._entries if key[0] == collection]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            size = len(self._entries)
+        lookups = self.hits + self.misses
+        return {
+            'size': size,
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,156 @@
+from dataclasses import MISSING, fields, is_dataclass
+from typing import Any, Dict
+import threading
+from .base import FirebaseModel
+from .serialization import compile_serializer, compile_deserializer
+from .device import Device, Light, Window, Door, FireDetector, AC_Fan
+from .room import Room
+
+# Containers allocated on first access instead of in __init__
+_LAZY_FACTORIES = (list, dict)
+
+_compact_classes: Dict[type, type] = {}
+_lock = threading.RLock()  # compiling a class compiles its parents first
+
+
+class CompactModel:
+    """
+    Base of the `__slots__` variants of the models built by `compact_class`.
+
+    Instances have no `__dict__`, and list/dict fields stay None until they
+    are first read, so an object with empty containers only pays for its
+    slots. They serialize like the model they mirror and convert to and
+    from it with `from_model`/`to_model`.
+    """
+    __slots__ = ()
+    model: type = None
+    _field_names: tuple = ()
+    _lazy: Dict[str, Any] = {}
+
+    @classmethod
+    def from_model(cls, model: FirebaseModel) -> 'CompactModel':
+        """Compact copy of a model; non-empty containers are shared, not copied"""
+        return cls(**{name: getattr(model, name) for name in cls._field_names})
+
+    def to_model(self) -> FirebaseModel:
+        values = {name: self._raw(name) for name in self._field_names}
+        for name, factory in self._lazy.items():
+            if values[name] is None:
+                values[name] = factory()
+        return self.model(**values)
+
+    def _raw(self, name: str):
+        """Value of a field without allocating a lazy container"""
+        return getattr(self, f'_{name}') if name in self._lazy else getattr(self, name)
+
+    def __eq__(self, other):
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return all(_or_empty(self, other, name) for name in self._field_names)
+
+    def __repr__(self):
+        values = ', '.join(f'{name}={self._raw(name)!r}' for name in self._field_names
+                           if self._raw(name) is not None)
+        return f'{self.__class__.__name__}({values})'
+
+
+def _or_empty(a: CompactModel, b: CompactModel, name: str) -> bool:
+    x, y = a._raw(name), b._raw(name)
+    if name in a._lazy:
+        # an unallocated container equals an empty one
+        return (x or None) == (y or None)
+    return x == y
+
+
+def _lazy_property(name: str, factory):
+    slot = f'_{name}'
+
+    def get(self):
+        value = getattr(self, slot)
+        if value is None:
+            value = factory()
+            setattr(self, slot, value)
+        return value
+
+    def put(self, value):
+        setattr(self, slot, value)
+
+    return property(get, put, doc=f'{name}, allocated on first access')
+
+
+def _compile_init(model_cls, lazy: Dict[str, Any]):
+    """__init__ with the model's signature, storing lazy containers as None"""
+    args, body = [], []
+    namespace = {'_MISSING': MISSING}
+    for f in fields(model_cls):
+        if not f.init:
+            continue
+        if f.name in lazy:
+            args.append(f'{f.name}=None')
+            body.append(f'    self._{f.name} = {f.name} or None')
+        elif f.default_factory is not MISSING:
+            namespace[f'_factory_{f.name}'] = f.default_factory
+            args.append(f'{f.name}=_MISSING')
+            body.append(f'    self.{f.name} = _factory_{f.name}() if {f.name} is _MISSING else {f.name}')
+        else:
+            if f.default is not MISSING:
+                namespace[f'_default_{f.name}'] = f.default
+                args.append(f'{f.name}=_default_{f.name}')
+            else:
+                args.append(f.name)
+            body.append(f'    self.{f.name} = {f.name}')
+    source = f"def __init__(self, {', '.join(args)}):\n" + '\n'.join(body or ['    pass'])
+    exec(source, namespace)
+    return namespace['__init__']
+
+
+def compact_class(model_cls) -> type:
+    """The `__slots__` variant of a model class, built on first use and cached"""
+    compact = _compact_classes.get(model_cls)
+    if compact is not None:
+        return compact
+    if not (is_dataclass(model_cls) and issubclass(model_cls, FirebaseModel)):
+        raise TypeError(f"{model_cls.__name__} is not a FirebaseModel dataclass")
+
+    with _lock:
+        compact = _compact_classes.get(model_cls)
+        if compact is not None:
+            return compact
+
+        parent_model = model_cls.__bases__[0]
+        if is_dataclass(parent_model) and issubclass(parent_model, FirebaseModel):
+            parent = compact_class(parent_model)
+            inherited = {f.name for f in fields(parent_model)}
+        else:
+            parent, inherited = CompactModel, set()
+
+        lazy = {f.name: f.default_factory for f in fields(model_cls)
+                if f.init and f.default_factory in _LAZY_FACTORIES}
+        own = [f.name for f in fields(model_cls) if f.init and f.name not in inherited]
+        namespace = {
+            '__slots__': tuple(f'_{name}' if name in lazy else name for name in own),
+            '__module__': __name__,
+            '__doc__': f'Slotted variant of `{model_cls.__name__}`',
+            '__init__': _compile_init(model_cls, lazy),
+            'model': model_cls,
+            '_field_names': tuple(f.name for f in fields(model_cls) if f.init),
+            '_lazy': lazy,
+        }
+        for name in own:
+            if name in lazy:
+                namespace[name] = _lazy_property(name, lazy[name])
+
+        compact = type(f'Compact{model_cls.__name__}', (parent,), namespace)
+        compact.to_dict = compile_serializer(model_cls, lazy)
+        compact.from_dict = staticmethod(compile_deserializer(model_cls, compact))
+        _compact_classes[model_cls] = compact
+        return compact
+
+
+CompactDevice = compact_class(Device)
+CompactLight = compact_class(Light)
+CompactWindow = compact_class(Window)
+CompactDoor = compact_class(Door)
+CompactFireDetector = compact_class(FireDetector)
+CompactAC_Fan = compact_class(AC_Fan)
+CompactRoom = compact_class(Room)
@@ -1,4 +1,4 @@
-from base import FirebaseManager
+from .base import FirebaseManager
 from datetime import datetime
 
 def init_test_data():
@@ -15,44 +15,50 @@ def init_test_data():
         "notification_ids": []
     }
     
-    user_id = firebase_manager.create_document("users", test_user_data)
+    # Everything is written in a single batched commit; IDs are allocated up front
+    with firebase_manager.batch_writer(flush_interval=None) as writer:
+        user_id = writer.create("users", test_user_data)
     
-    # Create a test house
-    test_house_data = {
-        "address": "123 Test Street",
-        "owner_id": user_id,
-        "construction_year": 2020,
-        "total_area": 200.0,
-        "room_ids": [],
-        "current_energy_source": "grid"
-    }
+        # Create a test house
+        test_house_data = {
+            "address": "123 Test Street",
+            "owner_id": user_id,
+            "construction_year": 2020,
+            "total_area": 200.0,
+            "room_ids": [],
+            "current_energy_source": "grid"
+        }
     
-    house_id = firebase_manager.create_document("houses", test_house_data)
+        house_id = writer.create("houses", test_house_data)
     
-    # Update user with house ID
-    firebase_manager.update_document("users", user_id, {
-        "house_ids": [house_id]
-    })
+        # Update user with house ID
+        writer.update("users", user_id, {
+            "house_ids": [house_id]
+        })
     
-    # Create test rooms
-    rooms = ["Living Room", "Kitchen", "Bedroom", "Bathroom"]
-    room_ids = []
+        # Create test rooms
+        rooms = ["Living Room", "Kitchen", "Bedroom", "Bathroom"]
+        room_ids = []
     
-    for room_name in rooms:
-        room_data = {
-            "name": room_name,
-            "house_id": house_id,
-            "floor": 1,
-            "device_ids": [],
-            "room_type": "room"
-        }
-        room_id = firebase_manager.create_document("rooms", room_data)
-        room_ids.append(room_id)
+        for room_name in rooms:
+            room_data = {
+                "name": room_name,
+                "house_id": house_id,
+                "floor": 1,
+                "device_ids": [],
+                "room_type": "room"
+            }
+            room_id = writer.create("rooms", room_data)
+            room_ids.append(room_id)
     
-    # Update house with room IDs
-    firebase_manager.update_document("houses", house_id, {
-        "room_ids": room_ids
-    })
+        # Update house with room IDs
+        writer.update("houses", house_id, {
+            "room_ids": room_ids
+        })
+
+    if writer.failed:
+        print(f"{writer.failed} test documents could not be written")
+        return
     
     print("Test data initialized successfully!")
     
@@ -2,6 +2,7 @@ from dataclasses import dataclass, field
 from typing import List, Dict, Optional
 from datetime import datetime
 from .base import FirebaseModel, DeviceType, DeviceStatus
+from .history import history_field
 
 @dataclass
 class Device(FirebaseModel):
@@ -33,7 +34,7 @@ class Window(Device):
 @dataclass
 class Door(Device):
     is_locked: bool = True
-    access_log: List[Dict] = field(default_factory=list)
+    access_log: List[Dict] = history_field()
 
 @dataclass
 class CleaningRobot(Device):
@@ -60,7 +61,7 @@ class Battery(FirebaseModel):
     efficiency: Optional[float] = None  # charging efficiency percentage
     last_charged: Optional[datetime] = None
     house_id: str = ""  # Reference to House
-    charging_history: List[Dict] = field(default_factory=list)
+    charging_history: List[Dict] = history_field()
     discharge_rate: Optional[float] = None  # kWh per hour
  
 
@@ -81,7 +82,7 @@ class SolarPanel(FirebaseModel):
     
     # Performance metrics
     total_energy_generated: float = 0.0  # in kWh
-    daily_generation: List[Dict] = field(default_factory=list)  # List of daily generation records
+    daily_generation: List[Dict] = history_field()  # List of daily generation records
     peak_power_output: float = 0.0  # maximum recorded power output in watts
     current_power_output: float = 0.0  # current power output in watts
     
@@ -91,8 +92,8 @@ class SolarPanel(FirebaseModel):
     soiling_level: Optional[float] = None  # cleanliness level (0-100%)
     
     # Maintenance info
-    cleaning_history: List[Dict] = field(default_factory=list)
-    inspection_history: List[Dict] = field(default_factory=list)
+    cleaning_history: List[Dict] = history_field()
+    inspection_history: List[Dict] = history_field()
     warranty_info: Dict = field(default_factory=dict)
     
     # Performance degradation
@@ -0,0 +1,146 @@
+from dataclasses import field, fields
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Union
+from firebase_admin import firestore
+from .batch import BatchWriter, WriteOp, WriteResult
+
+# Marks a model field whose samples live in a subcollection instead of the parent document
+HISTORY_METADATA = 'history'
+TIMESTAMP_KEY = 'timestamp'
+
+# Bucket size of every history series, by field name
+SERIES_GRANULARITY = {
+    'temperature_history': 'hour',
+    'humidity_history': 'hour',
+    'energy_consumption': 'hour',
+    'water_usage_history': 'day',
+    'access_log': 'day',
+    'charging_history': 'day',
+    'energy_consumption_history': 'day',
+    'energy_production_history': 'day',
+    'energy_sharing_history': 'day',
+    'daily_generation': 'month',
+    'cleaning_history': 'month',
+    'inspection_history': 'month',
+    'maintenance_history': 'month',
+    'carbon_footprint': 'month',
+}
+DEFAULT_GRANULARITY = 'day'
+
+# Bucket document IDs; they sort chronologically
+_BUCKET_FORMATS = {
+    'hour': '%Y-%m-%dT%H',
+    'day': '%Y-%m-%d',
+    'month': '%Y-%m',
+}
+
+Timestamp = Union[datetime, str]
+
+def history_field():
+    """A List[Dict] field kept out of the parent document (see `TimeSeriesStore`)"""
+    return field(default_factory=list, metadata={HISTORY_METADATA: True})
+
+@lru_cache(maxsize=None)
+def history_fields(model_cls) -> frozenset:
+    """Names of the history fields of a model class"""
+    return frozenset(f.name for f in fields(model_cls) if f.metadata.get(HISTORY_METADATA))
+
+def granularity_of(series: str) -> str:
+    return SERIES_GRANULARITY.get(series, DEFAULT_GRANULARITY)
+
+def _to_datetime(value: Timestamp) -> datetime:
+    return value if isinstance(value, datetime) else datetime.fromisoformat(value)
+
+def _to_utc(value: Timestamp) -> datetime:
+    """`value` as a naive UTC datetime; naive values are taken to be UTC already"""
+    value = _to_datetime(value)
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def _to_iso(value: Timestamp) -> str:
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def bucket_key(timestamp: Timestamp, granularity: str) -> str:
+    """ID of the bucket document holding samples taken at `timestamp` (buckets are in UTC)"""
+    return _to_utc(timestamp).strftime(_BUCKET_FORMATS[granularity])
+
+def bucket_start(timestamp: Timestamp, granularity: str) -> datetime:
+    fmt = _BUCKET_FORMATS[granularity]
+    return datetime.strptime(_to_utc(timestamp).strftime(fmt), fmt)
+
+class TimeSeriesStore:
+    """
+    History samples stored as `{collection}/{doc_id}/{series}/{bucket}`.
+
+    Each bucket document covers one hour, day or month (see
+    `SERIES_GRANULARITY`) and holds `start` and a `samples` array, so the
+    parent document stays the same size however long the history gets and a
+    range query only reads the buckets it overlaps. Samples are dicts with a
+    `timestamp` (datetime or ISO string, set to now when missing); they are
+    added with ArrayUnion, so writing the same sample twice stores it once.
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    def _path(self, collection: str, doc_id: str, series: str) -> str:
+        return f"{collection}/{doc_id}/{series}"
+
+    def append(self, collection: str, doc_id: str, series: str, samples: List[Dict[str, Any]],
+               granularity: Optional[str] = None) -> List[WriteResult]:
+        """Add samples to a series, one write per bucket they fall in"""
+        granularity = granularity or granularity_of(series)
+        buckets: Dict[str, List[Dict[str, Any]]] = {}
+        for sample in samples:
+            sample = dict(sample)
+            timestamp = sample.get(TIMESTAMP_KEY) or datetime.now(timezone.utc)
+            sample[TIMESTAMP_KEY] = _to_iso(timestamp)
+            buckets.setdefault(bucket_key(timestamp, granularity), []).append(sample)
+
+        path = self._path(collection, doc_id, series)
+        results = []
+        with BatchWriter(self.db, flush_interval=None, on_result=results.append) as writer:
+            for key, bucket_samples in buckets.items():
+                writer.add(WriteOp('set', path, key, {
+                    'start': bucket_start(bucket_samples[0][TIMESTAMP_KEY], granularity).isoformat(),
+                    'samples': firestore.ArrayUnion(bucket_samples),
+                }, merge=True))
+        return results
+
+    def query(self, collection: str, doc_id: str, series: str, start: Optional[Timestamp] = None,
+              end: Optional[Timestamp] = None, granularity: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Samples with start <= timestamp <= end, oldest first"""
+        granularity = granularity or granularity_of(series)
+        query = self.db.collection(self._path(collection, doc_id, series))
+        if start is not None:
+            query = query.where('start', '>=', bucket_start(start, granularity).isoformat())
+        if end is not None:
+            query = query.where('start', '<=', _to_utc(end).isoformat())
+        query = query.order_by('start')
+
+        # Timestamps may carry different UTC offsets, so compare them as UTC datetimes, not strings
+        low = _to_utc(start) if start is not None else None
+        high = _to_utc(end) if end is not None else None
+        samples = []
+        for snapshot in query.stream():
+            timed = [(_to_utc(sample[TIMESTAMP_KEY]), sample) for sample in snapshot.to_dict().get('samples', [])]
+            for timestamp, sample in sorted(timed, key=lambda item: item[0]):
+                if (low is None or timestamp >= low) and (high is None or timestamp <= high):
+                    samples.append(sample)
+        return samples
+
+    def delete(self, collection: str, doc_id: str, series: str, before: Optional[Timestamp] = None,
+               granularity: Optional[str] = None) -> List[WriteResult]:
+        """Delete a series, or only the buckets that end before `before`"""
+        query = self.db.collection(self._path(collection, doc_id, series))
+        if before is not None:
+            cutoff = bucket_start(before, granularity or granularity_of(series))
+            query = query.where('start', '<', cutoff.isoformat())
+        path = self._path(collection, doc_id, series)
+        results = []
+        with BatchWriter(self.db, flush_interval=None, on_result=results.append) as writer:
+            for snapshot in query.select([]).stream():
+                writer.delete(path, snapshot.id)
+        return results
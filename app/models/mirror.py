@@ -0,0 +1,127 @@
+from typing import Dict, Any, List, Optional, Set, Iterable
+import copy
+import threading
+
+MIRRORED_COLLECTIONS = ('houses', 'rooms', 'devices')
+
+class FirestoreMirror:
+    """
+    Live in-memory replica of the houses, rooms and devices collections.
+
+    `on_snapshot` listeners keep every document of the mirrored collections
+    in memory, together with indexes of rooms by house_id, devices by
+    room_id and devices by device_type, so lookups such as "all devices in
+    room X" are dictionary reads with no network round trip. Lookups return
+    copies of the documents, exactly as Firestore reads would (no `id`
+    field added), so callers may modify them.
+    """
+
+    def __init__(self, db, collections: Iterable[str] = MIRRORED_COLLECTIONS):
+        self.db = db
+        self.collections = tuple(collections)
+        self._docs: Dict[str, Dict[str, Dict[str, Any]]] = {c: {} for c in self.collections}
+        self._rooms_by_house: Dict[str, Set[str]] = {}
+        self._devices_by_room: Dict[str, Set[str]] = {}
+        self._devices_by_type: Dict[str, Set[str]] = {}
+        self._lock = threading.RLock()
+        self._ready = {c: threading.Event() for c in self.collections}
+        self._watches = []
+
+    # Lifecycle
+
+    def start(self):
+        for collection in self.collections:
+            watch = self.db.collection(collection).on_snapshot(
+                lambda docs, changes, read_time, collection=collection:
+                    self._on_snapshot(collection, changes)
+            )
+            self._watches.append(watch)
+
+    def stop(self):
+        for watch in self._watches:
+            watch.unsubscribe()
+        self._watches = []
+        for event in self._ready.values():
+            event.clear()
+
+    def wait_until_ready(self, timeout: Optional[float] = None) -> bool:
+        """Wait for the initial snapshot of every mirrored collection"""
+        return all(event.wait(timeout) for event in self._ready.values())
+
+    @property
+    def is_ready(self) -> bool:
+        return all(event.is_set() for event in self._ready.values())
+
+    def mirrors(self, collection: str) -> bool:
+        """Whether `collection` can be served from the mirror right now"""
+        event = self._ready.get(collection)
+        return event is not None and event.is_set()
+
+    # Snapshot handling
+
+    def _on_snapshot(self, collection: str, changes):
+        with self._lock:
+            for change in changes:
+                doc_id = change.document.id
+                if change.type.name == 'REMOVED':
+                    self._remove(collection, doc_id)
+                else:
+                    self._remove(collection, doc_id)
+                    self._add(collection, doc_id, change.document.to_dict() or {})
+        self._ready[collection].set()
+
+    def _index_entries(self, collection: str, data: Dict[str, Any]):
+        if collection == 'rooms':
+            yield self._rooms_by_house, data.get('house_id')
+        elif collection == 'devices':
+            yield self._devices_by_room, data.get('room_id')
+            yield self._devices_by_type, data.get('device_type')
+
+    def _add(self, collection: str, doc_id: str, data: Dict[str, Any]):
+        self._docs[collection][doc_id] = data
+        for index, key in self._index_entries(collection, data):
+            if key:
+                index.setdefault(key, set()).add(doc_id)
+
+    def _remove(self, collection: str, doc_id: str):
+        data = self._docs[collection].pop(doc_id, None)
+        if data is None:
+            return
+        for index, key in self._index_entries(collection, data):
+            ids = index.get(key)
+            if ids is not None:
+                ids.discard(doc_id)
+                if not ids:
+                    del index[key]
+
+    # Lookups
+
+    def get(self, collection: str, doc_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return copy.deepcopy(self._docs[collection].get(doc_id))
+
+    def _collect(self, collection: str, index: Dict[str, Set[str]], key: str) -> List[Dict[str, Any]]:
+        docs = self._docs[collection]
+        with self._lock:
+            return [copy.deepcopy(docs[doc_id]) for doc_id in index.get(key, ()) if doc_id in docs]
+
+    def rooms_of_house(self, house_id: str) -> List[Dict[str, Any]]:
+        return self._collect('rooms', self._rooms_by_house, house_id)
+
+    def devices_in_room(self, room_id: str) -> List[Dict[str, Any]]:
+        return self._collect('devices', self._devices_by_room, room_id)
+
+    def devices_of_type(self, device_type: str) -> List[Dict[str, Any]]:
+        return self._collect('devices', self._devices_by_type, device_type)
+
+    def devices_of_house(self, house_id: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            room_ids = list(self._rooms_by_house.get(house_id, ()))
+            return [device for room_id in room_ids for device in self.devices_in_room(room_id)]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'ready': self.is_ready,
+                **{collection: len(docs) for collection, docs in self._docs.items()},
+            }
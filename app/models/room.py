@@ -1,6 +1,7 @@
 from dataclasses import dataclass, field
 from typing import List, Dict, Optional
 from .base import FirebaseModel
+from .history import history_field
 
 @dataclass
 class Room(FirebaseModel):
@@ -10,10 +11,10 @@ class Room(FirebaseModel):
     device_ids: List[str] = field(default_factory=list)  # References to Devices
     house_id: str = ""  # Reference to House
     room_type: str = "room"  # For inheritance
-    temperature_history: List[Dict] = field(default_factory=list)
-    humidity_history: List[Dict] = field(default_factory=list)
+    temperature_history: List[Dict] = history_field()
+    humidity_history: List[Dict] = history_field()
     occupancy_patterns: List[Dict] = field(default_factory=list)
-    energy_consumption: List[Dict] = field(default_factory=list)
+    energy_consumption: List[Dict] = history_field()
 
 @dataclass
 class Garage(Room):
@@ -24,13 +25,13 @@ class Garage(Room):
 @dataclass
 class Bathroom(Room):
     has_ventilation: bool = True
-    water_usage_history: List[Dict] = field(default_factory=list)
+    water_usage_history: List[Dict] = history_field()
 
 @dataclass
 class Kitchen(Room):
     appliance_inventory: List[Dict] = field(default_factory=list)
-    water_usage_history: List[Dict] = field(default_factory=list)
+    water_usage_history: List[Dict] = history_field()
 
 @dataclass
 class Toilet(Room):
-    water_usage_history: List[Dict] = field(default_factory=list)
+    water_usage_history: List[Dict] = history_field()
@@ -0,0 +1,157 @@
+from dataclasses import fields, is_dataclass
+from datetime import datetime
+from enum import Enum
+from typing import Any, Callable, Dict, List, Optional, Union, get_args, get_origin, get_type_hints
+import threading
+from .history import history_fields
+
+# Values Firestore stores as they are
+_PRIMITIVES = frozenset({str, int, float, bool, type(None)})
+
+_serializers: Dict[type, Callable[[Any], Dict[str, Any]]] = {}
+_deserializers: Dict[type, Callable[[Dict[str, Any]], Any]] = {}
+_lock = threading.RLock()  # compiling a deserializer compiles those of nested models
+
+
+def convert_value(v):
+    """Convert any value to what Firestore stores (Enum -> value, datetime -> ISO string, ...)"""
+    cls = v.__class__
+    if cls in _PRIMITIVES:
+        return v
+    if isinstance(v, Enum):
+        return v.value
+    if isinstance(v, datetime):
+        return v.isoformat()
+    if isinstance(v, (list, tuple)):
+        return [i if i.__class__ in _PRIMITIVES else convert_value(i) for i in v]
+    if isinstance(v, dict):
+        return {k: i if i.__class__ in _PRIMITIVES else convert_value(i) for k, i in v.items()}
+    if is_dataclass(v):
+        to_dict = getattr(v, 'to_dict', None)
+        return to_dict() if to_dict is not None else serializer_for(cls)(v)
+    return v
+
+
+def _unsaved_history(obj, name: str):
+    raise ValueError(
+        f"{type(obj).__name__}.{name} holds {len(getattr(obj, name))} samples that to_dict() would drop; "
+        f"store them with FirebaseManager.save_history() first"
+    )
+
+
+def _unwrap_optional(hint):
+    if get_origin(hint) is Union:
+        args = [arg for arg in get_args(hint) if arg is not type(None)]
+        if len(args) == 1:
+            return args[0]
+    return hint
+
+
+def _is_enum(hint) -> bool:
+    return isinstance(hint, type) and issubclass(hint, Enum)
+
+
+def compile_serializer(cls, lazy: Optional[Dict[str, Callable[[], Any]]] = None) -> Callable[[Any], Dict[str, Any]]:
+    """
+    Generate `to_dict` for one dataclass: one statement per persisted field,
+    with the conversion picked from the field's type. A value of an
+    unexpected type still goes through `convert_value`.
+
+    `lazy` maps container fields stored in a `_<name>` attribute that is
+    None until first use to their factory (see `compact.py`).
+
+    History fields are not part of the document; `to_dict` raises
+    ValueError while one still holds samples, instead of dropping them.
+    """
+    lazy = lazy or {}
+    hints = get_type_hints(cls)
+    skipped = history_fields(cls)
+    lines = ['def to_dict(obj):', '    d = {}']
+    for f in fields(cls):
+        if f.name in skipped:
+            attribute = f'_{f.name}' if f.name in lazy else f.name
+            lines += [
+                f'    if obj.{attribute}:',
+                f'        _unsaved_history(obj, {f.name!r})',
+            ]
+            continue
+        hint = _unwrap_optional(hints.get(f.name, Any))
+        if _is_enum(hint):
+            value = 'v.value if isinstance(v, _Enum) else _convert(v)'
+        elif hint is datetime:
+            value = 'v.isoformat() if v.__class__ is _datetime else _convert(v)'
+        else:
+            value = 'v if v.__class__ in _PRIMITIVES else _convert(v)'
+        if f.name in lazy:
+            lines += [
+                f'    v = obj._{f.name}',
+                f'    d[{f.name!r}] = _factories[{f.name!r}]() if v is None else {value}',
+            ]
+            continue
+        lines += [
+            f'    v = obj.{f.name}',
+            '    if v is not None:',
+            f'        d[{f.name!r}] = {value}',
+        ]
+    lines.append('    return d')
+
+    namespace = {'_Enum': Enum, '_datetime': datetime, '_PRIMITIVES': _PRIMITIVES,
+                 '_convert': convert_value, '_factories': lazy,
+                 '_unsaved_history': _unsaved_history}
+    exec('\n'.join(lines), namespace)
+    return namespace['to_dict']
+
+
+def _decoder(hint) -> Optional[Callable[[Any], Any]]:
+    """Function turning a stored value back into `hint`, None when it is stored as is"""
+    hint = _unwrap_optional(hint)
+    if _is_enum(hint):
+        return hint
+    if hint is datetime:
+        return lambda v: v if isinstance(v, datetime) else datetime.fromisoformat(v)
+    if isinstance(hint, type) and is_dataclass(hint):
+        return deserializer_for(hint)
+    if get_origin(hint) in (list, List):
+        args = get_args(hint)
+        item = _decoder(args[0]) if args else None
+        if item is not None:
+            return lambda v: [i if i is None else item(i) for i in v]
+    return None
+
+
+def compile_deserializer(cls, target: Optional[Callable[..., Any]] = None) -> Callable[[Dict[str, Any]], Any]:
+    """Generate `from_dict` for one dataclass; `target` builds the object (the class itself by default)"""
+    target = target or cls
+    hints = get_type_hints(cls)
+    decoders = [(f.name, _decoder(hints.get(f.name, Any))) for f in fields(cls) if f.init]
+
+    def from_dict(data: Dict[str, Any]):
+        kwargs = {}
+        for name, decode in decoders:
+            if name in data:
+                v = data[name]
+                kwargs[name] = v if decode is None or v is None else decode(v)
+        return target(**kwargs)
+    return from_dict
+
+
+def serializer_for(cls) -> Callable[[Any], Dict[str, Any]]:
+    """The `to_dict` function of a dataclass, compiled on first use"""
+    serializer = _serializers.get(cls)
+    if serializer is None:
+        with _lock:
+            serializer = _serializers.get(cls)
+            if serializer is None:
+                serializer = _serializers[cls] = compile_serializer(cls)
+    return serializer
+
+
+def deserializer_for(cls) -> Callable[[Dict[str, Any]], Any]:
+    """The `from_dict` function of a dataclass, compiled on first use"""
+    deserializer = _deserializers.get(cls)
+    if deserializer is None:
+        with _lock:
+            deserializer = _deserializers.get(cls)
+            if deserializer is None:
+                deserializer = _deserializers[cls] = compile_deserializer(cls)
+    return deserializer
@@ -2,6 +2,7 @@ from dataclasses import dataclass, field
 from typing import List, Dict, Optional
 from datetime import datetime
 from .base import FirebaseModel, EnergyTransactionType
+from .history import history_field
 
 @dataclass
 class Notification(FirebaseModel):
@@ -31,9 +32,9 @@ class House(FirebaseModel):
     owner_id: str = ""  # Reference to User
     current_energy_source: str = "grid"  # 'battery', 'neighbor', 'grid'
     solar_panel_capacity: Optional[float] = None  # in kW
-    energy_consumption_history: List[Dict] = field(default_factory=list)
-    energy_production_history: List[Dict] = field(default_factory=list)
-    maintenance_history: List[Dict] = field(default_factory=list)
+    energy_consumption_history: List[Dict] = history_field()
+    energy_production_history: List[Dict] = history_field()
+    maintenance_history: List[Dict] = history_field()
     efficiency_score: Optional[float] = None
 
 @dataclass
@@ -48,6 +49,6 @@ class User(FirebaseModel):
     max_energy_share: Optional[float] = None  # maximum kWh willing to share
     min_battery_reserve: Optional[float] = None  # minimum battery % to keep
     energy_sharing_price: Optional[float] = None  # price per kWh for sharing
-    energy_sharing_history: List[Dict] = field(default_factory=list)
+    energy_sharing_history: List[Dict] = history_field()
     energy_consumption_patterns: List[Dict] = field(default_factory=list)
-    carbon_footprint: List[Dict] = field(default_factory=list)
\ No newline at end of file
+    carbon_footprint: List[Dict] = history_field()
\ No newline at end of file
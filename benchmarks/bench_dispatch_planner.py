@@ -0,0 +1,91 @@
+"""
+Time `DispatchPlanner.plan` for one house over a 7-day hourly horizon and
+compare the grid bill of `manage_energy` following the plan with the
+greedy priority rules, on the forecast weather, an evening-heavy load and
+a time-of-use tariff. Energy left in the batteries is credited at the
+export price. With V2H off the plan cuts the bill by about a third; with
+V2H on the greedy rules already use the EV for the evening peak and the
+plan only does slightly better.
+
+Usage:
+    python -m benchmarks.bench_dispatch_planner
+"""
+import time
+from datetime import datetime, timedelta
+import numpy as np
+
+from app.controller.dispatch_planner import (
+    DEFAULT_EXPORT_PRICE, DispatchPlanner, hourly_ghi, solar_energy
+)
+from app.controller.energy_controller import EnergyManagementSystem
+from app.controller.energy_market import DEFAULT_GRID_PRICE
+from app.models import Battery, Light
+from app.models.base import DeviceStatus
+from app.models.device import SolarPanel
+
+FORECAST = {'status': 'success', 'predictions': {f'Day {i + 1}': ghi for i, ghi in
+                                                 enumerate([260.0, 180.0, 90.0, 240.0, 300.0, 120.0, 210.0])}}
+START = datetime(2024, 6, 1)
+# time-of-use tariff: peak 17:00-22:00
+IMPORT_PRICE = np.tile(np.where((np.arange(24) >= 17) & (np.arange(24) < 22), 0.40, DEFAULT_GRID_PRICE), 7)
+
+
+def make_system(v2h):
+    load = Light(id='load', status=DeviceStatus.ACTIVE, power_consumption=0.0)
+    system = EnergyManagementSystem(
+        [load],
+        Battery(id='stationary', capacity=13.5, current_charge=5.0, efficiency=95.0, discharge_rate=5.0),
+        Battery(id='ev', type='car', capacity=60.0, current_charge=30.0, efficiency=92.0, discharge_rate=7.0),
+        SolarPanel(id='panel', rated_power=6000.0),
+    )
+    system.v2h_enabled = v2h
+    return system
+
+
+def consumption_profile():
+    hour = np.arange(24)
+    daily = 0.6 + 0.45 * ((hour >= 7) & (hour < 9)) + 1.8 * ((hour >= 18) & (hour < 23))
+    return np.tile(daily, 7)
+
+
+def simulate(system, produced, consumed):
+    """Run manage_energy hour by hour and return the grid bill"""
+    load = system.devices[0]
+    cost = 0.0
+    for t in range(len(produced)):
+        system.solar_panel.current_power_output = produced[t] * 1000
+        load.power_consumption = consumed[t] * 1000
+        system.update_device(load)
+        record = system.manage_energy(1.0, {}, timestamp=START + timedelta(hours=t, minutes=30))
+        for action in record['actions']:
+            if action['action'] == 'grid_supply':
+                cost += action['amount'] * IMPORT_PRICE[t]
+            elif action['action'] == 'export_grid':
+                cost -= action['amount'] * DEFAULT_EXPORT_PRICE
+    stored = system.stationary_battery.current_charge + system.ev_battery.current_charge
+    return cost - stored * DEFAULT_EXPORT_PRICE
+
+
+def main():
+    planner = DispatchPlanner(import_price=IMPORT_PRICE)
+    consumed = consumption_profile()
+    produced = solar_energy(SolarPanel(rated_power=6000.0), hourly_ghi(list(FORECAST['predictions'].values())))
+    planner.plan(make_system(False), FORECAST, consumed, START)  # warm up
+
+    for v2h in (False, True):
+        system = make_system(v2h)
+        runs = 20
+        start = time.perf_counter()
+        for _ in range(runs):
+            plan = planner.plan(system, FORECAST, consumed, START)
+        elapsed = (time.perf_counter() - start) / runs
+
+        greedy = simulate(make_system(v2h), produced, consumed)
+        system.dispatch_plan = plan
+        planned = simulate(system, produced, consumed)
+        print(f"V2H {'on ' if v2h else 'off'}: plan of {len(plan.stationary)} hourly steps in {elapsed * 1e3:.1f} ms, "
+              f"7-day grid bill greedy {greedy:.2f}, planned {planned:.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Measure `EnergyManagementSystem.manage_energy` steps per second with 10,
+100 and 1000 devices, with consumption read from the power index and
+summed again over every device (as before the index), and with one
+device switched at every step.
+
+Usage:
+    python -m benchmarks.bench_energy_management
+"""
+import time
+
+from app.controller.energy_controller import EnergyManagementSystem, _device_power
+from app.models import Battery, Light
+from app.models.base import DeviceStatus
+from app.models.device import SolarPanel
+
+
+def make_system(devices):
+    lights = [
+        Light(id=f'light-{i}', status=DeviceStatus.ACTIVE if i % 2 else DeviceStatus.INACTIVE,
+              power_consumption=3000.0 / devices * (0.5 + i % 10 / 10))  # about 1.5 kW in total
+        for i in range(devices)
+    ]
+    system = EnergyManagementSystem(
+        lights,
+        Battery(id='stationary', capacity=13.5, current_charge=6.0, efficiency=95.0),
+        Battery(id='ev', type='car', capacity=60.0, current_charge=35.0, efficiency=92.0),
+        SolarPanel(id='panel', current_power_output=2500.0),
+        history_size=1000,
+    )
+    system.v2h_enabled = True
+    system.energy_distributor.neighbor_sharing_enabled = True
+    return system
+
+
+def resumming(system):
+    """calculate_consumed_energy summing over the devices at every call"""
+    return lambda hours: sum(_device_power(device) for device in system.devices) / 1000 * hours
+
+
+def steps_per_second(system, steps=20000, toggle=False):
+    devices = system.devices
+    start = time.perf_counter()
+    for i in range(steps):
+        if toggle:
+            device = devices[i % len(devices)]
+            device.status = DeviceStatus.INACTIVE if device.status == DeviceStatus.ACTIVE else DeviceStatus.ACTIVE
+            system.update_device(device)
+        system.solar_panel.current_power_output = 4000.0 if i % 2 else 0.0
+        system.manage_energy(0.25, {}, lambda deficit: min(deficit, 0.5))
+    return steps / (time.perf_counter() - start)
+
+
+def main():
+    print(f"{'devices':>8s} {'re-summed':>12s} {'indexed':>12s} {'indexed+switch':>15s}  steps/s")
+    for devices in (10, 100, 1000):
+        legacy = make_system(devices)
+        legacy.calculate_consumed_energy = resumming(legacy)
+        indexed = make_system(devices)
+        assert legacy.calculate_consumed_energy(1.0) == indexed.calculate_consumed_energy(1.0)
+        print(f"{devices:8d} {steps_per_second(legacy):12.0f} {steps_per_second(indexed):12.0f} "
+              f"{steps_per_second(make_system(devices), toggle=True):15.0f}")
+    print(indexed.get_priority_stats())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Time one `EnergyMarket` step for a neighborhood of 10k houses: collecting
+the orders, clearing them, running `manage_energy` for every house and
+building the `EnergyTransaction` records.
+
+Usage:
+    python -m benchmarks.bench_energy_market [houses]
+"""
+import sys
+import time
+import numpy as np
+
+from app.controller.energy_controller import EnergyManagementSystem
+from app.controller.energy_market import EnergyMarket, clear_orders
+from app.models import Battery, Light, User
+from app.models.base import DeviceStatus
+from app.models.device import SolarPanel
+
+
+def make_market(houses, seed=0):
+    rng = np.random.default_rng(seed)
+    market = EnergyMarket([])
+    for i in range(houses):
+        load = Light(id=f'load-{i}', status=DeviceStatus.ACTIVE, power_consumption=float(rng.uniform(300, 3000)))
+        system = EnergyManagementSystem(
+            [load],
+            Battery(id=f'b{i}', capacity=10.0, current_charge=float(rng.uniform(1.0, 10.0)), efficiency=95.0),
+            None,
+            SolarPanel(id=f'p{i}', current_power_output=float(rng.choice([0.0, rng.uniform(1000, 6000)]))),
+            rollups=False,
+        )
+        system.energy_distributor.neighbor_sharing_enabled = True
+        user = User(
+            id=f'user-{i}',
+            max_energy_share=float(rng.choice([0.5, 1.0, 2.0])) if i % 3 else None,
+            min_battery_reserve=float(rng.choice([50.0, 90.0])) if i % 5 == 0 else None,
+            energy_sharing_price=float(rng.uniform(0.05, 0.3)) if i % 2 else None,
+        )
+        market.add_member(user, system)
+    return market
+
+
+def main():
+    houses = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    market = make_market(houses)
+
+    start = time.perf_counter()
+    asks, bids = market.collect_orders(1.0)
+    collected = time.perf_counter()
+    trades = clear_orders(asks, bids)
+    cleared = time.perf_counter()
+    print(f"{houses} houses: {len(asks)} asks, {len(bids)} bids -> {len(trades)} trades")
+    print(f"  collect orders   {(collected - start) * 1e3:8.1f} ms")
+    print(f"  clear            {(cleared - collected) * 1e3:8.1f} ms")
+
+    start = time.perf_counter()
+    step = market.step(1.0)
+    elapsed = time.perf_counter() - start
+    print(f"  full step        {elapsed * 1e3:8.1f} ms  (manage_energy for every house, "
+          f"{len(step.transactions)} transactions)")
+    print(f"  offered {step.offered:.1f} kWh, requested {step.requested:.1f} kWh, cleared {step.cleared:.1f} kWh, "
+          f"volume {step.volume:.2f}")
+
+    shared = sum(a['amount'] for r in step.records for a in r['actions'] if a['action'] == 'share_neighbors')
+    borrowed = sum(a['amount'] for r in step.records for a in r['actions'] if a['action'] == 'borrow_neighbors')
+    assert abs(shared - step.cleared) < 1e-6 and abs(borrowed - step.cleared) < 1e-6, (shared, borrowed, step.cleared)
+    for trade in step.trades:
+        assert trade.price <= market.grid_price
+        share = market.members[trade.seller].user.max_energy_share
+        assert share is None or trade.amount <= share + 1e-9
+
+
+if __name__ == '__main__':
+    main()
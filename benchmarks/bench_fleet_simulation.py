@@ -0,0 +1,70 @@
+"""
+Time a year of 15-minute `FleetSimulation` steps for a fleet of houses.
+Its equivalence with `manage_energy` is checked by
+tests/test_fleet_simulation.py.
+
+Usage:
+    python -m benchmarks.bench_fleet_simulation [houses]
+"""
+import sys
+import time
+import numpy as np
+
+from app.controller.energy_controller import EnergyManagementSystem
+from app.controller.fleet_simulation import FleetSimulation
+from app.models.device import Battery, SolarPanel
+
+STEP_HOURS = 0.25
+YEAR_STEPS = 365 * 24 * 4
+
+
+def make_profiles(steps, houses, seed=0):
+    """Produced and consumed kWh per step: a clear-sky solar curve and a noisy base load"""
+    rng = np.random.default_rng(seed)
+    hour = (np.arange(steps) * STEP_HOURS) % 24
+    sun = np.clip(np.sin((hour - 6) / 12 * np.pi), 0, None)[:, None]
+    peak = rng.uniform(1.0, 8.0, houses)  # kW
+    produced = sun * peak * rng.uniform(0.3, 1.0, (steps, houses)) * STEP_HOURS
+    consumed = rng.gamma(2.0, 0.6, (steps, houses)) * STEP_HOURS
+    return produced, consumed
+
+
+def make_systems(houses, seed=0):
+    rng = np.random.default_rng(seed)
+    systems = []
+    for i in range(houses):
+        capacity = float(rng.choice([5.0, 10.0, 13.5]))
+        stationary = Battery(id=f'b{i}', capacity=capacity, current_charge=capacity * float(rng.uniform(0.1, 0.9)),
+                             efficiency=float(rng.choice([90.0, 95.0, 100.0])))
+        ev = None
+        if i % 3:
+            ev_capacity = float(rng.choice([40.0, 60.0, 75.0]))
+            ev = Battery(id=f'ev{i}', type='car', capacity=ev_capacity,
+                         current_charge=ev_capacity * float(rng.uniform(0.2, 0.9)), efficiency=92.0)
+        system = EnergyManagementSystem([], stationary, ev, SolarPanel(id=f'p{i}'))
+        system.v2h_enabled = i % 2 == 0
+        system.energy_distributor.neighbor_sharing_enabled = i % 4 == 0
+        systems.append(system)
+    return systems
+
+
+def neighbor_offer(deficit):
+    """Neighbors cover up to 0.3 kWh of a deficit"""
+    return np.minimum(deficit, 0.3)
+
+
+def main():
+    houses = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    fleet = FleetSimulation.from_systems(make_systems(houses))
+    produced, consumed = make_profiles(YEAR_STEPS, houses)
+    start = time.perf_counter()
+    result = fleet.run(produced, consumed, record_soc=True, request_energy_from_neighbor=neighbor_offer)
+    elapsed = time.perf_counter() - start
+    print(f"{houses} houses x {YEAR_STEPS} steps: {elapsed:.2f} s "
+          f"({elapsed / YEAR_STEPS * 1e6:.1f} us/step, {houses * YEAR_STEPS / elapsed / 1e6:.1f}M house-steps/s)")
+    for action, total in result.fleet_totals().items():
+        print(f"  {action:22s} {total:14.1f} kWh")
+
+
+if __name__ == '__main__':
+    main()
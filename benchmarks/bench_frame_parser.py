@@ -0,0 +1,63 @@
+"""
+Frames per second parsed from raw Arduino lines: the former
+`json.loads` + ISO timestamp path, `FrameParser` on JSON lines (orjson
+when installed, schema validation) and on binary lines, as nested frames
+and as flat `FrameRecord`s.
+
+Usage:
+    python -m benchmarks.bench_frame_parser [count]
+"""
+import json
+import sys
+import time
+from datetime import datetime
+
+from app.controller.frame_parser import FrameParser, orjson
+from app.controller.transports import SimulatedTransport
+
+
+def lines_of(binary, count):
+    transport = SimulatedTransport(binary=binary, seed=0)
+    transport.open()
+    lines = [line.rstrip(b'\n') for line in transport._lines]
+    return [lines[i % len(lines)] for i in range(count)]
+
+
+def legacy_parse(line):
+    data_dict = json.loads(line.decode('utf-8').strip())
+    data_dict['timestamp'] = datetime.now().isoformat()
+    return data_dict
+
+
+def throughput(fn, lines, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for line in lines:
+            fn(line)
+        best = min(best, time.perf_counter() - start)
+    return len(lines) / best
+
+
+def main(count=50000):
+    json_lines = lines_of(False, count)
+    binary_lines = lines_of(True, count)
+    parser = FrameParser()
+    unchecked = FrameParser(schema=None)
+    cases = [
+        ('json.loads (before)', legacy_parse, json_lines),
+        ('JSON, no validation', unchecked.parse, json_lines),
+        ('JSON, validated', parser.parse, json_lines),
+        ('JSON -> FrameRecord', parser.parse_record, json_lines),
+        ('binary -> frame', parser.parse, binary_lines),
+        ('binary -> FrameRecord', parser.parse_record, binary_lines),
+    ]
+    print(f"orjson: {'yes' if orjson is not None else 'no'}")
+    print(f"line size: JSON {sum(map(len, json_lines)) / count:.0f} B, "
+          f"binary {sum(map(len, binary_lines)) / count:.0f} B")
+    for name, fn, lines in cases:
+        print(f"{name:24s} {throughput(fn, lines):10.0f} frames/s")
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:2]])
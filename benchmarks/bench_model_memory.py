@@ -0,0 +1,38 @@
+"""
+Bytes per instance of the dataclass models and of their `__slots__`
+variants (see `app/models/compact.py`), measured with tracemalloc over
+many freshly built objects with default (empty) containers.
+
+Usage:
+    python -m benchmarks.bench_model_memory [count]
+"""
+import gc
+import sys
+import tracemalloc
+
+from app.models import Light, Door, AC_Fan, Room
+from app.models.compact import compact_class
+
+
+def bytes_per_instance(factory, count):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objects = [factory(i) for i in range(count)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    # the list holding them is not part of the objects
+    return (after - before - sys.getsizeof(objects)) / len(objects)
+
+
+def main(count=10000):
+    print(f"{'model':8s} {'dataclass':>10s} {'slots':>10s} {'saved':>7s}")
+    for model in (Light, Door, AC_Fan, Room):
+        compact = compact_class(model)
+        regular = bytes_per_instance(lambda i: model(id=str(i)), count)
+        slotted = bytes_per_instance(lambda i: compact(id=str(i)), count)
+        print(f"{model.__name__:8s} {regular:10.0f} {slotted:10.0f} {1 - slotted / regular:7.0%}")
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:2]])
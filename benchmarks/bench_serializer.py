@@ -0,0 +1,90 @@
+"""
+Compare the asdict-based `FirebaseModel.to_dict` with the compiled
+per-class serializer on a `SolarPanel`, a `House` and a `User` carrying a
+year of `energy_consumption_patterns`. History fields are empty on both
+sides: they are stored with `save_history`, not in the document, so a
+populated history would only time the copy `asdict` makes of it.
+
+Usage:
+    python -m benchmarks.bench_serializer
+"""
+import time
+from dataclasses import asdict
+from datetime import datetime, timedelta
+from enum import Enum
+
+from app.models import FirebaseModel, House, User
+from app.models.device import SolarPanel
+from app.models.history import history_fields
+
+
+def legacy_to_dict(model):
+    """`to_dict` as it was: asdict (a deep copy), then a second pass converting values"""
+    def convert_value(v):
+        if isinstance(v, Enum):
+            return v.value
+        if isinstance(v, datetime):
+            return v.isoformat()
+        if isinstance(v, FirebaseModel):
+            return v.to_dict()
+        if isinstance(v, list):
+            return [convert_value(i) for i in v]
+        if isinstance(v, dict):
+            return {k: convert_value(v) for k, v in v.items()}
+        return v
+
+    history = history_fields(type(model))
+    data = asdict(model)
+    return {k: convert_value(v) for k, v in data.items() if v is not None and k not in history}
+
+
+def make_models(days=365):
+    start = datetime(2024, 1, 1)
+    panel = SolarPanel(
+        id='panel-1', panel_model='SP-400', rated_power=400.0, efficiency=20.5,
+        installation_date=start, last_maintenance=start,
+        warranty_info={'years': 25, 'expires': start + timedelta(days=25 * 365)},
+    )
+    house = House(
+        id='house-1', address='123 Test Street', total_area=200.0,
+        room_ids=[f'room-{i}' for i in range(40)], battery_ids=['b1', 'b2'],
+    )
+    user = User(
+        id='user-1', username='test_user', email='test@example.com', created_at=start,
+        house_ids=['house-1'], neighbor_ids=[f'user-{i}' for i in range(2, 50)],
+        energy_consumption_patterns=[
+            {'timestamp': start + timedelta(days=d), 'kwh': 12.5, 'peak_hour': 19} for d in range(days)
+        ],
+    )
+    return panel, house, user
+
+
+def timeit(fn, model, repeat=5, number=200):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn(model)
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def main():
+    panel, house, user = make_models()
+    # (name, model, legacy iterations)
+    cases = [
+        ('SolarPanel', panel, 2000),
+        ('House', house, 2000),
+        ('User, 1y patterns', user, 50),
+    ]
+    for name, model, number in cases:
+        assert legacy_to_dict(model) == model.to_dict()
+        assert type(model).from_dict(model.to_dict()).to_dict() == model.to_dict()
+        legacy = timeit(legacy_to_dict, model, number=number)
+        fast = timeit(lambda m: m.to_dict(), model, number=2000)
+        print(f"{name:24s} asdict: {legacy * 1e6:10.1f} us   compiled: {fast * 1e6:7.1f} us   "
+              f"speedup: {legacy / fast:7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+Compare the row-wise and the vectorized `process_solar_data` preprocessing
+on a synthetic 1-year, 5-minute-resolution NSRDB dataset.
+
+Usage:
+    python -m benchmarks.bench_solar_processing
+"""
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app', 'controller', 'GHI_AI_model'))
+import ghi_fun
+
+
+def make_dataset(year=2019, freq='5min'):
+    """
+    Build a raw frame with the NSRDB column layout
+    """
+    stamps = pd.date_range(f'{year}-01-01', f'{year + 1}-01-01', freq=freq, inclusive='left')
+    rng = np.random.default_rng(0)
+    n = len(stamps)
+    df = pd.DataFrame({
+        "Year": stamps.year, "Month": stamps.month, "Day": stamps.day,
+        "Hour": stamps.hour, "Minute": stamps.minute,
+    })
+    for column in ghi_fun.DROPPED_COLUMNS + ["Temperature", "Pressure",
+                                             "Relative Humidity", "Wind Speed", "GHI"]:
+        df[column] = rng.random(n) * 1000
+    return df
+
+
+def legacy_prepare(df):
+    """
+    Preprocessing as it was done with a row-wise apply
+    """
+    df = df.drop(ghi_fun.DROPPED_COLUMNS, axis=1)
+    datetime_cols = ghi_fun.DATETIME_COLUMNS
+    df["date_time"] = df[datetime_cols].apply(
+        lambda row: "-".join(row.values.astype(str)), axis=1)
+    df['date_time'] = pd.to_datetime(df['date_time'], format='%Y-%m-%d-%H-%M')
+    df = df.drop(datetime_cols, axis=1)
+    df = df.set_index('date_time')
+    ghi = df.pop('GHI')
+    df['GHI'] = ghi
+    return df
+
+
+def timeit(fn, df, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(df)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    df = make_dataset()
+    legacy_time, legacy = timeit(legacy_prepare, df, repeat=1)
+    fast_time, fast = timeit(ghi_fun.prepare_solar_data, df)
+
+    assert legacy.index.equals(fast.index)
+    assert list(legacy.columns) == list(fast.columns)
+    assert np.allclose(legacy.values, fast.values, rtol=1e-6)
+
+    print(f"rows: {len(df)}")
+    print(f"row-wise apply : {legacy_time * 1000:9.1f} ms  ({legacy.memory_usage().sum() / 1e6:.1f} MB)")
+    print(f"vectorized     : {fast_time * 1000:9.1f} ms  ({fast.memory_usage().sum() / 1e6:.1f} MB)")
+    print(f"speedup        : {legacy_time / fast_time:9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
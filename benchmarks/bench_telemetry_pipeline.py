@@ -0,0 +1,46 @@
+"""
+Measure the end-to-end throughput of the telemetry path:
+simulated Arduino -> serial reader thread -> ring buffer -> background_thread
+-> Socket.IO emit -> connected client.
+
+Usage:
+    python -m benchmarks.bench_telemetry_pipeline [rate] [seconds]
+"""
+import sys
+import threading
+import time
+
+from flask import Flask
+
+from app import background_thread, socketio
+from app.controller.arduino_controler import ArduinoController
+from app.controller.transports import SimulatedTransport
+
+
+def main(rate=5000.0, duration=5.0):
+    transport = SimulatedTransport(rate=rate, seed=0)
+    ArduinoController.set_transport(transport)
+
+    flask_app = Flask(__name__)
+    socketio.init_app(flask_app)
+    client = socketio.test_client(flask_app)
+
+    threading.Thread(target=background_thread, daemon=True).start()
+    received = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < duration:
+        time.sleep(0.1)
+        received += sum(1 for packet in client.get_received() if packet['name'] in ('arduino_data', 'arduino_patch'))
+    elapsed = time.perf_counter() - start
+
+    stats = ArduinoController.reader_stats()
+    print(f"target rate     : {rate:10.0f} frames/s")
+    print(f"produced        : {transport.frames_sent:10d} frames")
+    print(f"read            : {stats['lines_read']:10d} lines ({stats['bytes_read'] / elapsed / 1e6:.2f} MB/s)")
+    print(f"delivered       : {received:10d} events ({received / elapsed:.0f} events/s)")
+    print(f"ring overwritten: {stats['ring_overwritten']:10d}")
+
+
+if __name__ == '__main__':
+    args = [float(a) for a in sys.argv[1:3]]
+    main(*args)
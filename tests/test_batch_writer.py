@@ -0,0 +1,71 @@
+import threading
+import time
+
+from google.api_core import exceptions as google_exceptions
+
+from app.models.batch import BatchWriter
+
+
+class Batch:
+    def __init__(self, db):
+        self.db = db
+        self.ops = []
+
+    def set(self, ref, data, merge=False):
+        self.ops.append(ref)
+
+    def commit(self):
+        self.db.commit(self.ops)
+
+
+class Client:
+    """Firestore stand-in whose first commits fail with a transient error"""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.committed = []
+        self.attempted = threading.Event()
+
+    def collection(self, name):
+        return self
+
+    def document(self, doc_id=None):
+        return doc_id
+
+    def batch(self):
+        return Batch(self)
+
+    def commit(self, ops):
+        self.attempted.set()
+        if self.failures:
+            self.failures -= 1
+            raise google_exceptions.ServiceUnavailable('busy')
+        self.committed.append(list(ops))
+
+
+def test_queueing_does_not_wait_for_a_retrying_commit():
+    db = Client(failures=1)
+    writer = BatchWriter(db, flush_interval=0.01, backoff=0.5)
+
+    writer.set('devices', 'a', {'status': 'on'})
+    assert db.attempted.wait(2)  # the timer flush is now backing off
+    started = time.monotonic()
+    writer.set('devices', 'b', {'status': 'on'})
+    assert time.monotonic() - started < 0.2
+
+    writer.close()
+    assert db.committed[0] == ['a']
+    assert ['b'] in db.committed
+    assert writer.written == 2 and writer.failed == 0
+
+
+def test_results_are_reported_not_kept():
+    db = Client()
+    reported = []
+    with BatchWriter(db, max_batch_size=2, flush_interval=None, on_result=reported.append) as writer:
+        for i in range(5):
+            writer.set('devices', f'd{i}', {'status': 'on'})
+
+    assert db.committed == [['d0', 'd1'], ['d2', 'd3'], ['d4']]
+    assert [result.doc_id for result in reported] == [f'd{i}' for i in range(5)]
+    assert writer.written == 5
@@ -0,0 +1,96 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+from app.controller.dispatch_planner import DispatchPlan, forecast_means, hourly_ghi, optimize_battery
+from app.controller.energy_controller import EnergyManagementSystem
+from app.models.device import Battery, SolarPanel
+
+START = datetime(2024, 6, 1)
+
+
+def test_optimize_battery_stays_between_reserve_and_capacity():
+    rng = np.random.default_rng(0)
+    net = rng.normal(0.0, 3.0, 72)  # kWh per hour, negative for surplus
+    battery = Battery(capacity=10.0, current_charge=5.0, efficiency=90.0, discharge_rate=4.0)
+
+    drawn, charge = optimize_battery(net, battery, reserve=0.2, import_price=0.4)
+
+    assert charge.min() >= 2.0 - 1e-9
+    assert charge.max() <= 10.0 + 1e-9
+    assert np.all(np.abs(np.diff(np.concatenate([[5.0], charge]))) <= 4.0 + 1e-9)
+    # charged only from surplus, discharged only into a deficit
+    assert np.all(drawn <= np.clip(-net, 0, None) + 1e-9)
+    assert np.all(-drawn <= np.clip(net, 0, None) + 1e-9)
+
+
+def test_optimize_battery_starting_below_reserve_does_not_discharge():
+    battery = Battery(capacity=10.0, current_charge=1.0)
+
+    drawn, charge = optimize_battery(np.full(24, 1.0), battery, reserve=0.2)
+
+    assert np.all(drawn == 0.0)
+    assert np.all(charge == 1.0)
+
+
+def test_hourly_ghi_keeps_daily_means():
+    daily = [250.0, 80.0, 0.0]
+
+    for step_hours in (1.0, 0.25):
+        ghi = hourly_ghi(daily, step_hours).reshape(len(daily), -1)
+        assert ghi.mean(axis=1) == pytest.approx(daily)
+        assert ghi.min() >= 0.0
+        hours = np.arange(ghi.shape[1]) * step_hours
+        assert np.all(ghi[:, hours < 5] == 0.0)
+
+
+def test_forecast_means_orders_days_and_rejects_errors():
+    forecast = {'status': 'success', 'predictions': {'Day 10': 3.0, 'Day 2': 2.0, 'Day 1': 1.0}}
+    assert forecast_means(forecast).tolist() == [1.0, 2.0, 3.0]
+
+    with pytest.raises(ValueError, match='no data'):
+        forecast_means({'status': 'error', 'message': 'no data'})
+
+
+def make_system():
+    system = EnergyManagementSystem(
+        [], Battery(id='stationary', capacity=10.0, current_charge=5.0), None,
+        SolarPanel(id='panel', current_power_output=3000.0),  # 3 kWh surplus per hour
+    )
+    system.dispatch_plan = DispatchPlan(
+        start=START, step_hours=1.0,
+        stationary=np.array([1.0, 1.0]), ev=np.zeros(2),  # charge 1 kW for two hours
+        stationary_charge=np.array([6.0, 7.0]), ev_charge=np.zeros(2),
+        expected_grid=np.array([-2.0, -2.0]), expected_cost=0.0,
+    )
+    return system
+
+
+def amounts(record):
+    return {action['action']: action['amount'] for action in record['actions']}
+
+
+def test_manage_energy_follows_plan_inside_its_window():
+    system = make_system()
+
+    record = system.manage_energy(1.0, {}, timestamp=START + timedelta(minutes=30))
+
+    assert amounts(record) == pytest.approx({'charge_stationary': 1.0, 'export_grid': 2.0})
+    assert system.stationary_battery.current_charge == pytest.approx(6.0)
+
+
+def test_manage_energy_is_greedy_outside_the_plan():
+    system = make_system()
+
+    record = system.manage_energy(1.0, {}, timestamp=START + timedelta(hours=2, minutes=30))
+
+    assert amounts(record) == pytest.approx({'charge_stationary': 3.0})
+    assert system.stationary_battery.current_charge == pytest.approx(8.0)
+
+
+def test_plan_lookup_mixes_naive_and_aware_times():
+    plan = make_system().dispatch_plan
+
+    assert plan.flows(START.replace(tzinfo=timezone.utc) + timedelta(hours=1)) == (1.0, 0.0)
+    assert plan.flows(START.replace(tzinfo=timezone(timedelta(hours=2)))) is None  # 22:00 UTC the day before
@@ -0,0 +1,32 @@
+import pytest
+
+pytest.importorskip('pytest_benchmark')
+
+from app.controller.energy_controller import EnergyManagementSystem
+from app.models.device import Battery, DeviceStatus, Light, SolarPanel
+
+
+def make_system(devices):
+    lights = [
+        Light(id=f'light-{i}', status=DeviceStatus.ACTIVE if i % 2 else DeviceStatus.INACTIVE,
+              power_consumption=3000.0 / devices * (0.5 + i % 10 / 10))  # about 1.5 kW in total
+        for i in range(devices)
+    ]
+    system = EnergyManagementSystem(
+        lights,
+        Battery(id='stationary', capacity=13.5, current_charge=6.0, efficiency=95.0),
+        Battery(id='ev', type='car', capacity=60.0, current_charge=35.0, efficiency=92.0),
+        SolarPanel(id='panel', current_power_output=2500.0),
+    )
+    system.v2h_enabled = True
+    system.energy_distributor.neighbor_sharing_enabled = True
+    return system
+
+
+@pytest.mark.parametrize('devices', [10, 100, 1000])
+def test_manage_energy_step(benchmark, devices):
+    system = make_system(devices)
+
+    record = benchmark(system.manage_energy, 0.25, {}, lambda deficit: min(deficit, 0.5))
+
+    assert record['actions']
@@ -0,0 +1,116 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.controller.energy_controller import EnergyHistory, EnergyManagementSystem, V2HController
+from app.models.device import Battery, DeviceStatus, Light, SolarPanel
+
+
+def make_system(devices=()):
+    return EnergyManagementSystem(
+        list(devices),
+        Battery(id='stationary', capacity=10.0, current_charge=5.0),
+        Battery(id='ev', type='car', capacity=60.0, current_charge=40.0),
+        SolarPanel(id='panel'),
+    )
+
+
+def light(id, watts, on=True):
+    return Light(id=id, power_consumption=watts, status=DeviceStatus.ACTIVE if on else DeviceStatus.INACTIVE)
+
+
+def test_consumed_energy_counts_active_devices():
+    system = make_system([light('a', 1000.0), light('b', 500.0), light('c', 2000.0, on=False)])
+
+    assert system.calculate_consumed_energy(0.5) == pytest.approx(0.75)
+
+
+def test_update_device_tracks_status_changes():
+    a = light('a', 1000.0)
+    system = make_system([a])
+
+    a.status = DeviceStatus.INACTIVE
+    assert system.active_power == 1000.0  # a snapshot until re-indexed
+    system.update_device(a)
+    assert system.active_power == 0.0
+
+    system.update_device(light('b', 300.0))
+    assert [device.id for device in system.devices] == ['a', 'b']
+    assert system.active_power == 300.0
+
+
+def test_update_device_replaces_device_with_same_id():
+    system = make_system([light('a', 1000.0), light('b', 200.0)])
+
+    replacement = light('a', 400.0)
+    system.update_device(replacement)
+
+    assert len(system.devices) == 2
+    assert system.devices[0] is replacement
+    assert system.active_power == 600.0
+
+
+def test_remove_device_drops_its_power():
+    b = light('b', 200.0)
+    system = make_system([light('a', 1000.0), b])
+
+    system.remove_device(b)
+    system.remove_device(b)  # already gone
+
+    assert [device.id for device in system.devices] == ['a']
+    assert system.active_power == 1000.0
+    assert system.calculate_consumed_energy(1.0) == pytest.approx(1.0)
+
+
+def test_duplicate_device_ids_are_rejected():
+    with pytest.raises(ValueError):
+        make_system([light('a', 100.0), light('a', 200.0)])
+
+
+def test_charge_battery_stops_at_capacity():
+    system = make_system()
+    battery = Battery(id='b', capacity=10.0, current_charge=9.0, efficiency=50.0)
+
+    assert system.charge_battery(battery, 5.0) == pytest.approx(2.0)
+    assert battery.current_charge == pytest.approx(10.0)
+    assert system.charge_battery(battery, 5.0) == 0.0
+
+
+def test_discharge_battery_keeps_stationary_reserve():
+    system = make_system()
+    battery = system.stationary_battery
+
+    assert system.discharge_battery(battery, 10.0) == pytest.approx(3.0)
+    assert battery.current_charge == pytest.approx(2.0)
+    assert system.discharge_battery(battery, 1.0) == 0.0
+
+
+def test_discharge_battery_keeps_ev_driving_reserve():
+    system = make_system()
+    ev = system.ev_battery
+
+    assert system.discharge_battery(ev, 30.0, is_ev=True) == pytest.approx(10.0)
+    assert ev.current_charge == pytest.approx(30.0)
+    assert system.discharge_battery(ev, 1.0, is_ev=True) == 0.0
+
+
+def test_v2h_controller_requires_charge_above_minimum():
+    controller = V2HController(min_soc=0.5)
+
+    assert controller.check_safety_conditions(Battery(capacity=60.0, current_charge=40.0))
+    assert not controller.check_safety_conditions(Battery(capacity=60.0, current_charge=30.0))
+    assert not controller.check_safety_conditions(Battery(capacity=0.0, current_charge=0.0))
+
+
+def test_spilled_history_keeps_datetime_timestamps(tmp_path):
+    history = EnergyHistory(maxlen=2, spill_path=str(tmp_path / 'history.jsonl'))
+    start = datetime(2024, 6, 1, 12, 0)
+    for i in range(5):
+        history.append({'timestamp': start + timedelta(minutes=15 * i), 'energy_balance': float(i)})
+
+    records = list(history.iter_all())
+    history.close()
+
+    assert history.spilled == 3
+    assert [record['timestamp'] for record in records] == [start + timedelta(minutes=15 * i) for i in range(5)]
+    assert [record['energy_balance'] for record in records] == [0.0, 1.0, 2.0, 3.0, 4.0]
@@ -0,0 +1,107 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from app.controller.energy_controller import EnergyManagementSystem
+from app.controller.energy_market import EnergyMarket, clear_orders
+from app.models.device import Battery, DeviceStatus, Light, SolarPanel
+from app.models.user import User
+
+NOON = datetime(2024, 6, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def make_house(solar_watts=0.0, load_watts=0.0, charge=10.0):
+    """A house without EV whose 10 kWh battery holds `charge` kWh"""
+    system = EnergyManagementSystem(
+        [Light(id='load', status=DeviceStatus.ACTIVE, power_consumption=load_watts)],
+        Battery(id='battery', capacity=10.0, current_charge=charge),
+        None,
+        SolarPanel(id='panel', current_power_output=solar_watts),
+        rollups=False,
+    )
+    system.energy_distributor.neighbor_sharing_enabled = True
+    return system
+
+
+def seller(**settings):
+    return User(id='seller', **settings), make_house(solar_watts=3000.0)  # 3 kWh surplus per hour
+
+
+def buyer(id='buyer', load_watts=2000.0):
+    return User(id=id), make_house(load_watts=load_watts, charge=1.0)  # battery too low to discharge
+
+
+def make_market(*members):
+    market = EnergyMarket([])
+    for user, system in members:
+        market.add_member(user, system)
+    return market
+
+
+def shared(record):
+    return sum(action['amount'] for action in record['actions'] if action['action'] == 'share_neighbors')
+
+
+def test_ask_above_best_bid_does_not_clear():
+    assert clear_orders([(0.30, 0, 1.0)], [(0.25, 1, 1.0)]) == []
+
+    market = make_market(seller(energy_sharing_price=0.30), buyer())
+    step = market.step(1.0, timestamp=NOON)
+
+    assert step.offered == pytest.approx(3.0)
+    assert step.trades == [] and step.transactions == []
+    assert shared(step.records[0]) == 0.0
+
+
+def test_seller_below_min_battery_reserve_does_not_ask():
+    user, system = seller(min_battery_reserve=90.0)
+    system.stationary_battery.current_charge = 8.5  # 85%, full enough not to be charged
+
+    asks, bids = make_market((user, system), buyer()).collect_orders(1.0, NOON)
+
+    assert asks == []
+    assert len(bids) == 1
+
+
+def test_max_energy_share_caps_the_ask():
+    market = make_market(seller(max_energy_share=1.0), buyer())
+
+    step = market.step(1.0, timestamp=NOON)
+
+    assert step.offered == pytest.approx(1.0)
+    assert sum(trade.amount for trade in step.trades) == pytest.approx(1.0)
+    assert shared(step.records[0]) == pytest.approx(1.0)
+
+
+def test_trades_are_scaled_to_what_the_seller_delivers(monkeypatch):
+    user, system = seller()
+    # over-report the surplus: 4 kWh offered, only 3 kWh produced
+    monkeypatch.setattr(system, 'neighbor_balance', lambda hours, timestamp=None: 4.0)
+    market = make_market((user, system), buyer('b1'), buyer('b2'))
+
+    step = market.step(1.0, timestamp=NOON)
+
+    assert step.cleared == pytest.approx(3.0)
+    assert [trade.amount for trade in step.trades] == pytest.approx([1.5, 1.5])
+    for record in step.records[1:]:
+        borrowed = [a['amount'] for a in record['actions'] if a['action'] == 'borrow_neighbors']
+        assert borrowed == pytest.approx([1.5])
+
+
+def test_transactions_record_the_trades():
+    market = make_market(seller(energy_sharing_price=0.1), buyer(load_watts=1000.0))
+
+    step = market.step(1.0, timestamp=NOON)
+
+    [transaction] = step.transactions
+    assert transaction.source_id == 'seller'
+    assert transaction.destination_id == 'buyer'
+    assert transaction.amount == pytest.approx(1.0)
+    assert transaction.cost == pytest.approx(0.1)
+    assert transaction.timestamp == NOON
+
+
+def test_step_defaults_to_an_aware_utc_timestamp():
+    step = make_market(seller(), buyer()).step(1.0)
+
+    assert step.transactions[0].timestamp.tzinfo is not None
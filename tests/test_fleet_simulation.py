@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from app.controller.energy_controller import EnergyManagementSystem
+from app.controller.fleet_simulation import ACTIONS, FleetSimulation
+from app.models.device import Battery, SolarPanel
+
+STEP_HOURS = 0.25
+NEIGHBOR_OFFER = 0.3  # kWh neighbors cover per step
+
+
+def make_systems(houses, rng):
+    systems = []
+    for i in range(houses):
+        capacity = float(rng.choice([5.0, 10.0, 13.5]))
+        stationary = Battery(id=f'b{i}', capacity=capacity, current_charge=capacity * float(rng.uniform(0.1, 0.9)),
+                             efficiency=float(rng.choice([90.0, 95.0, 100.0])))
+        ev = None
+        if i % 3:
+            ev_capacity = float(rng.choice([40.0, 60.0, 75.0]))
+            ev = Battery(id=f'ev{i}', type='car', capacity=ev_capacity,
+                         current_charge=ev_capacity * float(rng.uniform(0.2, 0.9)), efficiency=92.0)
+        system = EnergyManagementSystem([], stationary, ev, SolarPanel(id=f'p{i}'), rollups=False)
+        system.v2h_enabled = i % 2 == 0
+        system.energy_distributor.neighbor_sharing_enabled = i % 4 == 0
+        systems.append(system)
+    return systems
+
+
+def make_profiles(steps, houses, rng):
+    """Produced and consumed kWh per step: a clear-sky solar curve and a noisy base load"""
+    hour = (np.arange(steps) * STEP_HOURS) % 24
+    sun = np.clip(np.sin((hour - 6) / 12 * np.pi), 0, None)[:, None]
+    produced = sun * rng.uniform(1.0, 8.0, houses) * rng.uniform(0.3, 1.0, (steps, houses)) * STEP_HOURS
+    consumed = rng.gamma(2.0, 0.6, (steps, houses)) * STEP_HOURS
+    return produced, consumed
+
+
+@pytest.mark.parametrize('seed', [0, 1])
+def test_fleet_matches_manage_energy_house_by_house(seed):
+    rng = np.random.default_rng(seed)
+    houses, steps = 24, 400
+    systems = make_systems(houses, rng)
+    fleet = FleetSimulation.from_systems(systems)
+    produced, consumed = make_profiles(steps, houses, rng)
+
+    for t in range(steps):
+        moved = fleet.step(produced[t], consumed[t], lambda deficit: np.minimum(deficit, NEIGHBOR_OFFER))
+        for i, system in enumerate(systems):
+            # feed the scalar controller the same energy balance as the fleet
+            system.calculate_produced_energy = lambda hours, e=produced[t, i]: e
+            system.calculate_consumed_energy = lambda hours, e=consumed[t, i]: e
+            record = system.manage_energy(STEP_HOURS, {}, lambda deficit: min(deficit, NEIGHBOR_OFFER))
+            scalar = dict.fromkeys(ACTIONS, 0.0)
+            for action in record['actions']:
+                scalar[action['action']] += action['amount']
+            for action in ACTIONS:
+                assert scalar[action] == moved[action][i], (t, i, action)
+            assert system.stationary_battery.current_charge == fleet.battery_charge[i], (t, i)
+            if system.ev_battery:
+                assert system.ev_battery.current_charge == fleet.ev_charge[i], (t, i)
@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('tensorflow')
+
+from app.controller.GHI_AI_model import ghi_fun
+
+
+class LengthSensitiveModel:
+    """Stand-in for the Keras model whose output depends on every input step, like the LSTM"""
+
+    def predict(self, x, verbose=0):
+        steps = np.arange(1, x.shape[1] + 1, dtype=np.float32)
+        weighted = np.tanh(x[..., -1] * steps / x.shape[1]).sum(axis=1)
+        return np.stack([weighted, weighted / x.shape[1]], axis=1)
+
+    def predict_on_batch(self, x):
+        return self.predict(x)
+
+
+def per_day_predictions(model, df):
+    """The forecast as computed before batching: one `predict_model` call per day"""
+    test = np.array(np.split(df, len(df) / 4))
+    return {f"Day {i}": float(ghi_fun.predict_model(model, test, i).mean()) for i in range(1, 8)}
+
+
+def test_batched_forecast_matches_per_day_forecast():
+    rng = np.random.default_rng(0)
+    datasets = [rng.uniform(0, 1, size=(400, 5)).astype(np.float32) for _ in range(3)]
+    model = LengthSensitiveModel()
+
+    batched = ghi_fun.predict_solar_radiation_batch(model, datasets)
+
+    for data, predictions in zip(datasets, batched):
+        expected = per_day_predictions(model, data)
+        assert predictions.keys() == expected.keys()
+        for day, value in expected.items():
+            assert predictions[day] == pytest.approx(value, rel=1e-6)
@@ -0,0 +1,64 @@
+from datetime import datetime, timedelta, timezone
+
+from app.models.history import TimeSeriesStore, bucket_key
+
+CET = timezone(timedelta(hours=1))
+
+
+class Snapshot:
+    def __init__(self, data):
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+class Buckets:
+    """A bucket subcollection supporting the range filter on `start`"""
+
+    def __init__(self, buckets, filters=()):
+        self.buckets = buckets
+        self.filters = list(filters)
+
+    def where(self, field, op, value):
+        return Buckets(self.buckets, self.filters + [(op, value)])
+
+    def order_by(self, field):
+        return self
+
+    def stream(self):
+        matches = {'>=': lambda a, b: a >= b, '<=': lambda a, b: a <= b}
+        return [Snapshot(bucket) for bucket in sorted(self.buckets, key=lambda b: b['start'])
+                if all(matches[op](bucket['start'], value) for op, value in self.filters)]
+
+
+class Client:
+    def __init__(self, buckets):
+        self.buckets = buckets
+
+    def collection(self, path):
+        return Buckets(self.buckets)
+
+
+def test_query_compares_timestamps_across_utc_offsets():
+    samples = [
+        {'timestamp': '2024-05-01T10:10:00', 'value': 1},  # naive, taken as UTC
+        {'timestamp': '2024-05-01T11:20:00+01:00', 'value': 2},  # 10:20 UTC
+        {'timestamp': '2024-05-01T10:40:00+00:00', 'value': 3},
+        {'timestamp': '2024-05-01T12:50:00+01:00', 'value': 4},  # 11:50 UTC
+    ]
+    store = TimeSeriesStore(Client([
+        {'start': '2024-05-01T10:00:00', 'samples': samples[:3]},
+        {'start': '2024-05-01T11:00:00', 'samples': samples[3:]},
+    ]))
+
+    found = store.query('rooms', 'r1', 'temperature_history',
+                        start=datetime(2024, 5, 1, 11, 15, tzinfo=CET),  # 10:15 UTC
+                        end=datetime(2024, 5, 1, 10, 45, tzinfo=timezone.utc))
+
+    assert [sample['value'] for sample in found] == [2, 3]
+
+
+def test_buckets_are_keyed_in_utc():
+    assert bucket_key(datetime(2024, 5, 1, 0, 30, tzinfo=CET), 'day') == '2024-04-30'
+    assert bucket_key('2024-05-01T00:30:00', 'day') == '2024-05-01'
@@ -0,0 +1,154 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from app.models.async_base import AsyncFirebaseManager
+from app.models.base import DOCUMENT_ID_FIELD, FirebaseManager
+from app.models.cache import DocumentCache
+
+OPERATORS = {'>=': lambda a, b: a >= b, '>': lambda a, b: a > b, '==': lambda a, b: a == b}
+
+
+class Snapshot:
+    def __init__(self, id, data):
+        self.id = id
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+class Query:
+    """The part of a Firestore query used for paging, with its cursor rules"""
+
+    def __init__(self, docs, filters=(), order=None, fields=None, size=None, after=None):
+        self.docs, self.filters, self.order = docs, list(filters), order
+        self.fields, self.size, self.after = fields, size, after
+
+    def _copy(self, **changes):
+        state = dict(docs=self.docs, filters=self.filters, order=self.order,
+                     fields=self.fields, size=self.size, after=self.after)
+        state.update(changes)
+        return type(self)(**state)
+
+    def where(self, field, op, value):
+        return self._copy(filters=self.filters + [(field, op, value)])
+
+    def order_by(self, field):
+        return self._copy(order=field)
+
+    def select(self, fields):
+        return self._copy(fields=list(fields))
+
+    def limit(self, size):
+        return self._copy(size=size)
+
+    def _order_fields(self):
+        # Firestore orders by inequality-filtered fields too, then by document ID
+        fields = [field for field, op, _ in self.filters if op != '==']
+        if self.order and self.order not in fields:
+            fields.append(self.order)
+        return [field for field in fields if field != DOCUMENT_ID_FIELD]
+
+    def _key(self, id, data):
+        return tuple(data[field] for field in self._order_fields()) + (id,)
+
+    def start_after(self, snapshot):
+        for field in self._order_fields():
+            if field not in snapshot._data:
+                raise ValueError(f"{field!r} is not contained in the data")
+        return self._copy(after=self._key(snapshot.id, snapshot._data))
+
+    def _results(self):
+        matches = [(id, data) for id, data in self.docs.items()
+                   if all(OPERATORS[op](data[field], value) for field, op, value in self.filters)]
+        matches.sort(key=lambda item: self._key(*item))
+        if self.after is not None:
+            matches = [item for item in matches if self._key(*item) > self.after]
+        for id, data in matches[:self.size]:
+            if self.fields is not None:
+                data = {field: data[field] for field in self.fields if field in data}
+            yield Snapshot(id, data)
+
+    def stream(self):
+        return list(self._results())
+
+
+class AsyncQuery(Query):
+    async def stream(self):
+        for snapshot in self._results():
+            yield snapshot
+
+
+class Client:
+    def __init__(self, docs, query=Query):
+        self.docs = docs
+        self.query = query
+
+    def collection(self, name):
+        return self.query(self.docs)
+
+
+def make_docs(count=7):
+    start = datetime(2024, 1, 1)
+    return {f'd{i}': {'name': f'device {i}', 'created_at': start + timedelta(hours=count - i), 'power': i}
+            for i in range(count)}
+
+
+def sync_manager(docs):
+    manager = object.__new__(FirebaseManager)
+    manager.db = Client(docs)
+    return manager
+
+
+def stream_async(docs, **kwargs):
+    async def collect():
+        manager = AsyncFirebaseManager(client=Client(docs, AsyncQuery), cache=DocumentCache())
+        return [doc async for doc in manager.stream_collection('devices', **kwargs)]
+    return asyncio.run(collect())
+
+
+def test_pages_of_projection_ordered_by_unselected_field():
+    docs = make_docs()
+    manager = sync_manager(docs)
+
+    pages = list(manager.iter_pages('devices', order_by='created_at', select=['name'], page_size=3))
+
+    assert [len(page) for page, _ in pages] == [3, 3, 1]
+    names = [doc for page, _ in pages for doc in page]
+    assert names == [{'name': f'device {i}'} for i in reversed(range(7))]
+
+    _, cursor = pages[0]
+    resumed = list(manager.stream_collection('devices', order_by='created_at', select=['name'],
+                                             start_after=cursor, page_size=3))
+    assert resumed == names[3:]
+
+
+def test_pages_of_projection_with_inequality_filter():
+    docs = make_docs()
+
+    streamed = list(sync_manager(docs).stream_collection(
+        'devices', filters=[('power', '>=', 2)], select=['name'], page_size=2))
+
+    assert streamed == [{'name': f'device {i}'} for i in range(2, 7)]
+
+
+def test_async_stream_of_projection_ordered_by_unselected_field():
+    docs = make_docs()
+
+    streamed = stream_async(docs, order_by='created_at', select=['name'], page_size=3)
+
+    assert streamed == [{'name': f'device {i}'} for i in reversed(range(7))]
+
+
+def test_async_house_rooms_match_on_house_id():
+    docs = {
+        'r1': {'name': 'kitchen', 'house_id': 'h1'},
+        'r2': {'name': 'garage', 'house_id': 'h2'},
+        'r3': {'name': 'bedroom', 'house_id': 'h1'},
+    }
+
+    async def rooms():
+        manager = AsyncFirebaseManager(client=Client(docs, AsyncQuery), cache=DocumentCache())
+        return await manager.get_house_rooms('h1')
+
+    assert sorted(room['name'] for room in asyncio.run(rooms())) == ['bedroom', 'kitchen']
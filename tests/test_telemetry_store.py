@@ -0,0 +1,50 @@
+import json
+import time
+
+from app.controller.frame_parser import EXAMPLE_FRAME_PATH
+from app.controller.serial_io import FrameRing
+from app.controller.telemetry_store import TelemetrySink, TelemetryStore
+
+
+def run_sink(store, lines):
+    ring = FrameRing(capacity=len(lines))
+    sink = TelemetrySink(store, ring.subscribe(), batch_size=32, flush_interval=0.05)
+    sink.start()
+    for line in lines:
+        ring.append(line)
+    deadline = time.monotonic() + 5
+    while sink.frames_stored < len(lines) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    sink.stop()
+    sink.join()
+    return sink
+
+
+def test_sink_stores_one_row_per_frame(tmp_path):
+    # every replayed frame carries the same timestamp, as with the simulator
+    with open(EXAMPLE_FRAME_PATH) as f:
+        line = json.dumps(json.load(f)).encode('utf-8')
+    store = TelemetryStore(str(tmp_path / 'telemetry.db'))
+
+    sink = run_sink(store, [line] * 100)
+
+    assert sink.frames_stored == 100
+    rows = store.query('house1', 'temperature', room='room1')
+    assert len(rows) == 100
+    assert all(a[0] < b[0] for a, b in zip(rows, rows[1:]))
+
+
+def test_sink_keeps_frame_timestamps(tmp_path):
+    with open(EXAMPLE_FRAME_PATH) as f:
+        frame = json.load(f)
+    lines = []
+    for i in range(10):
+        frame['timestamp'] = f'2024-11-24T10:30:{i:02d}Z'
+        lines.append(json.dumps(frame).encode('utf-8'))
+    store = TelemetryStore(str(tmp_path / 'telemetry.db'))
+
+    run_sink(store, lines)
+
+    rows = store.query('house1', 'temperature', room='room1')
+    start = 1732444200.0  # 2024-11-24T10:30:00Z
+    assert [ts for ts, _ in rows] == [start + i for i in range(10)]